@@ -1,15 +1,45 @@
 from src.agent import VoiceAssistant
+from src.pipeline import AsyncVoicePipeline
 import logging
+import logging.handlers
+import os
+import queue
+
+logger = logging.getLogger(__name__)
+
+def configure_logging():
+    """Leveled logging through a queue so hot paths never wait on the console"""
+    log_queue = queue.SimpleQueue()
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, console)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    listener.start()
+    return listener
 
 def main():
+    listener = configure_logging()
     try:
-        print("Starting Personal AI Assistant...")
+        logger.info("Starting Personal AI Assistant...")
         assistant = VoiceAssistant()
-        assistant.run()
+        pipeline_config = assistant.config.get("pipeline", {})
+        if pipeline_config.get("mode") == "async":
+            AsyncVoicePipeline(
+                assistant,
+                queue_size=pipeline_config.get("queue_size", 2),
+                barge_in=pipeline_config.get("barge_in", False),
+                barge_in_margin_db=pipeline_config.get("barge_in_margin_db", 20.0)
+            ).run()
+        else:
+            assistant.run()
     except KeyboardInterrupt:
-        print("\nShutting down assistant...")
+        logger.info("Shutting down assistant...")
     except Exception as e:
-        print(f"Error: {e}")
+        logger.error(f"Error: {e}")
+    finally:
+        listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""Audio output check: what a WAV sink records vs. what was queued.
+
+Queues --chunks tone chunks with --gap-ms pauses between them (as when
+synthesis lags behind playback) into a WavFileOutput, then checks that the
+file holds exactly the queued audio and that no underruns were counted.
+The same chunks go through a real-time NullOutput, where the gaps do show
+up as underruns:
+
+    python -m benchmarks.audio_output --chunks 5 --gap-ms 500
+"""
+import argparse
+import os
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+from src.audio_output import NullOutput, WavFileOutput
+
+
+def feed(output, chunks, sample_rate, gap_seconds):
+    output.start()
+    try:
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(gap_seconds)
+            output.play(chunk, sample_rate)
+        output.drain()
+    finally:
+        output.stop()
+    return output.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5)
+    parser.add_argument("--chunk-ms", type=float, default=300)
+    parser.add_argument("--gap-ms", type=float, default=500)
+    parser.add_argument("--sample-rate", type=int, default=24000)
+    args = parser.parse_args()
+
+    rate = args.sample_rate
+    frames = int(args.chunk_ms / 1000 * rate)
+    tone = (0.3 * np.sin(2 * np.pi * 440 * np.arange(frames) / rate)).astype(np.float32)
+    chunks = [tone] * args.chunks
+    queued = frames * args.chunks
+
+    with tempfile.TemporaryDirectory(prefix="audio-output-") as workdir:
+        path = os.path.join(workdir, "out.wav")
+        stats = feed(WavFileOutput(path, sample_rate=rate), chunks, rate, args.gap_ms / 1000)
+        with wave.open(path, "rb") as f:
+            recorded = f.getnframes()
+    print(f"wav       queued {queued} frames, recorded {recorded}, {stats}")
+    if recorded != queued or stats["underruns"]:
+        raise SystemExit("WAV output does not match the queued audio")
+
+    stats = feed(NullOutput(sample_rate=rate), chunks, rate, args.gap_ms / 1000)
+    print(f"realtime  {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""End-to-end turn latency and throughput with every external dependency stubbed.
+
+Drives a real VoiceAssistant through a scripted multi-turn conversation:
+utterances (WAV fixtures, or synthetic voiced clips) are played in real
+time into a fake audio device, a stub engine stands in for Porcupine, the
+LLM and embeddings are served by the local fake OpenAI server, and
+Whisper and Coqui are replaced by stand-ins with a configurable cost. VAD,
+endpointing, retrieval, the conversation log, sentence streaming and the
+serial / async engines are the production code.
+
+Per-stage p50/p95/p99 (from the turn traces), response latency (end of
+speech to first audio) and throughput are printed and written as JSON so
+runs can be compared across commits:
+
+    python -m benchmarks.e2e --turns 8 --mode async --output results/e2e.json
+    python -m benchmarks.e2e --fixtures fixtures/utterances/ --first-token-ms 600
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.fake_openai_server import start_server
+from benchmarks.vad_fixtures import voiced_signal
+from src.audio_output import NullOutput
+from src.audio_source import AudioSource, load_wav
+from src.embeddings import CachedEmbeddings, HashingEmbeddingBackend
+from src.tracing import NULL_TRACE, load_traces, percentile, stage_percentiles
+from src.tts import TextToSpeech
+
+
+SCRIPT = [
+    "What's the weather like today?",
+    "Should I take a jacket this evening?",
+    "Remind me what we talked about yesterday.",
+    "Play something relaxing.",
+    "How long will it take to drive to work?",
+    "Thanks, that's all for now.",
+]
+
+
+class ScriptedAudioSource(AudioSource):
+    """Fake input device: room tone in real time, with utterances spliced in on demand"""
+
+    def __init__(self, sample_rate=16000, blocksize=512, buffer_seconds=60, noise_level=60, seed=0):
+        super().__init__(sample_rate, blocksize, buffer_seconds)
+        self.noise_level = noise_level
+        self.rng = np.random.default_rng(seed)
+        self.pending = collections.deque()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def say(self, samples):
+        """Queue an int16 clip to be "spoken" starting with the next block"""
+        with self.lock:
+            self.pending.append(np.asarray(samples, dtype=np.int16).reshape(-1))
+
+    def start(self):
+        super().start()
+        self.thread = threading.Thread(target=self.feed, name="scripted-audio", daemon=True)
+        self.thread.start()
+
+    def feed(self):
+        block_seconds = self.blocksize / self.sample_rate
+        next_time = time.monotonic()
+        speaking = np.zeros(0, dtype=np.int16)
+        while self.running:
+            if not len(speaking):
+                with self.lock:
+                    if self.pending:
+                        speaking = self.pending.popleft()
+            block = self.rng.normal(0, self.noise_level, self.blocksize)
+            if len(speaking):
+                chunk, speaking = speaking[:self.blocksize], speaking[self.blocksize:]
+                block[:len(chunk)] += chunk
+            self.push(np.clip(block, -32768, 32767).astype(np.int16))
+            next_time += block_seconds
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+
+class StubWakeWordEngine:
+    """Porcupine-shaped engine that fires once per arm() call"""
+
+    def __init__(self, sample_rate=16000, frame_length=512):
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.armed = threading.Event()
+        self.detections = 0
+
+    def arm(self):
+        self.armed.set()
+
+    def process(self, pcm):
+        if self.armed.is_set():
+            self.armed.clear()
+            self.detections += 1
+            return 0
+        return -1
+
+
+class ScriptedSpeechToText:
+    """Whisper stand-in: returns the transcript of each clip after a simulated decode"""
+
+    def __init__(self, real_time_factor=0.1):
+        self.real_time_factor = real_time_factor
+        self.transcripts = collections.deque()
+
+    def expect(self, text):
+        self.transcripts.append(text)
+
+    def transcribe(self, audio, sample_rate=16000):
+        time.sleep(len(audio) / sample_rate * self.real_time_factor)
+        return self.transcripts.popleft() if self.transcripts else ""
+
+
+class SimulatedTextToSpeech(TextToSpeech):
+    """Coqui stand-in: synthesis costs synth_ms_per_char; playback goes through a
+    real-time NullOutput, so it lasts as long as the audio"""
+
+    def __init__(self, synth_ms_per_char=4.0, chars_per_second=15.0, sample_rate=22050):
+        self.model_name = "simulated"
+        self.speaker = None
+        self.speed = 1.0
+        self.cache = None
+        self.synth_ms_per_char = synth_ms_per_char
+        self.chars_per_second = chars_per_second
+        self.sample_rate = sample_rate
+        self.output = NullOutput(sample_rate=48000)
+        self.output.start()
+
+    def synthesize_uncached(self, text):
+        time.sleep(len(text) * self.synth_ms_per_char / 1000)
+        return np.zeros(int(len(text) / self.chars_per_second * self.sample_rate), dtype=np.float32)
+
+
+class StubRetriever:
+    """Used with --no-retrieval, when langchain/Chroma aren't installed"""
+
+    def __init__(self):
+        # Still gives the response cache something to embed with
+        self.embeddings = CachedEmbeddings(HashingEmbeddingBackend())
+
+    def get_relevant_history(self, query, k=3, trace=NULL_TRACE, query_vector=None, embed=None):
+        return []
+
+
+def load_utterances(fixtures, sample_rate, turns):
+    """[(int16 clip, transcript)] for the scripted turns.
+
+    WAV fixtures use a sidecar .txt for the transcript (else the file name);
+    without fixtures each script line becomes a voiced clip of matching length.
+    """
+    if fixtures:
+        if os.path.isdir(fixtures):
+            paths = sorted(os.path.join(fixtures, f) for f in os.listdir(fixtures) if f.endswith(".wav"))
+        else:
+            paths = [fixtures]
+        clips = []
+        for path in paths:
+            samples, rate = load_wav(path)
+            if rate != sample_rate:
+                print(f"Skipping {path}: {rate}Hz (need {sample_rate}Hz)")
+                continue
+            transcript_path = os.path.splitext(path)[0] + ".txt"
+            if os.path.exists(transcript_path):
+                with open(transcript_path, "r", encoding="utf-8") as f:
+                    transcript = f.read().strip()
+            else:
+                transcript = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+            clips.append((samples, transcript))
+        if not clips:
+            raise SystemExit(f"No usable {sample_rate}Hz WAV fixtures in {fixtures}")
+    else:
+        clips = []
+        for i, line in enumerate(SCRIPT):
+            # Roughly 14 characters per second of speech
+            seconds = min(4.0, max(0.8, len(line) / 14))
+            voiced = voiced_signal(seconds, sample_rate, pitch_hz=120 + 10 * i)
+            lead = np.zeros(int(0.2 * sample_rate))
+            clips.append((np.concatenate([lead, voiced]).astype(np.int16), line))
+    return [clips[i % len(clips)] for i in range(turns)]
+
+
+def benchmark_config(config_path, workdir, args):
+    """The assistant config with tracing, caches and history redirected into workdir"""
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config["stream_responses"] = args.stream
+    config["pipeline"] = dict(config.get("pipeline", {}), mode=args.mode)
+    config["tracing"] = {"path": os.path.join(workdir, "traces", "turns.jsonl")}
+    # The scripted STT hands back whole transcripts, so streaming decode has nothing to agree on
+    config["stt"] = dict(config.get("stt", {}), streaming=False)
+    # The stub wake word engine fires on cue, not on sound, so every frame must reach it
+    config["idle"] = {"gate": {"enabled": False}, "page_out_after_seconds": None}
+    config["embeddings"] = dict(
+        config.get("embeddings", {}),
+        backend="openai",
+        cache_path=os.path.join(workdir, "cache", "embeddings.sqlite3"),
+        # Skip tiktoken chunking, which downloads its vocabulary on first use
+        openai=dict(config.get("embeddings", {}).get("openai", {}), check_embedding_ctx_length=False),
+    )
+    path = os.path.join(workdir, "assistant_config.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return path, config
+
+
+def response_latencies(records):
+    """End of speech (start of the vad_end span) to the first playback, per turn, in ms"""
+    latencies = []
+    for record in records:
+        spans = record.get("spans", [])
+        speech_end = [span["start_ms"] for span in spans if span["stage"] == "vad_end"]
+        playback = [span["start_ms"] for span in spans if span["stage"] == "playback"]
+        if speech_end and playback:
+            latencies.append(min(playback) - speech_end[0])
+    return latencies
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_conversation(args, workdir):
+    # Imported after OPENAI_* are set; load_dotenv() never overrides them
+    from src.agent import VoiceAssistant
+    from src.pipeline import AsyncVoicePipeline
+
+    config_path, config = benchmark_config(os.path.abspath(args.config), workdir, args)
+    utterances = load_utterances(args.fixtures, 16000, args.turns)
+
+    source = ScriptedAudioSource()
+    engine = StubWakeWordEngine()
+    stt = ScriptedSpeechToText(real_time_factor=args.stt_rtf)
+    tts = SimulatedTextToSpeech(synth_ms_per_char=args.synth_ms_per_char)
+    overrides = {"stt": lambda: stt, "tts": lambda: tts}
+    if args.no_retrieval:
+        overrides["retriever"] = StubRetriever
+
+    cwd = os.getcwd()
+    os.chdir(workdir)  # history/ and chroma_db/ land in the scratch directory
+    try:
+        assistant = VoiceAssistant(
+            audio_source=source, config_path=config_path, wake_word_engine=engine, overrides=overrides
+        )
+        # Don't measure model loading; that's the startup report's job
+        assistant.loader.all_loaded.wait()
+
+        remaining = collections.deque(utterances)
+        capture = assistant.capture_utterance
+
+        def scripted_capture(start=None, trace=NULL_TRACE):
+            # Each capture hears the next scripted line; once the script is done
+            # the device goes quiet for good and the engine shuts down.
+            if not remaining:
+                source.stop()
+            else:
+                samples, transcript = remaining.popleft()
+                stt.expect(transcript)
+                source.say(samples)
+            return capture(start=start, trace=trace)
+
+        assistant.capture_utterance = scripted_capture
+        engine.arm()
+        started = time.monotonic()
+        if args.mode == "async":
+            pipeline = config["pipeline"]
+            AsyncVoicePipeline(
+                assistant,
+                queue_size=pipeline.get("queue_size", 2),
+                barge_in=False,
+            ).run()
+        else:
+            assistant.run()
+        wall_seconds = time.monotonic() - started
+    finally:
+        os.chdir(cwd)
+    return config["tracing"]["path"], wall_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config/assistant_config.json")
+    parser.add_argument("--fixtures", help="WAV file or directory of 16 kHz WAV utterances")
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--mode", choices=["serial", "async"], default="async")
+    parser.add_argument("--batch", dest="stream", action="store_false",
+                        help="serial mode only: wait for the whole reply before speaking")
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=30)
+    parser.add_argument("--embedding-ms", type=float, default=50)
+    parser.add_argument("--stt-rtf", type=float, default=0.1, help="simulated Whisper real-time factor")
+    parser.add_argument("--synth-ms-per-char", type=float, default=4)
+    parser.add_argument("--no-retrieval", action="store_true", help="skip Chroma (e.g. langchain not installed)")
+    parser.add_argument("--output", default="benchmarks/results/e2e.json")
+    args = parser.parse_args()
+
+    server, base_url = start_server(
+        first_token_ms=args.first_token_ms, token_ms=args.token_ms, embedding_ms=args.embedding_ms
+    )
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_BASE"] = base_url  # langchain's spelling
+    os.environ["OPENAI_API_KEY"] = "fake"
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="e2e-") as workdir:
+            trace_path, wall_seconds = run_conversation(args, workdir)
+            records = load_traces(trace_path)
+    finally:
+        server.shutdown()
+
+    latencies = sorted(response_latencies(records))
+    cache_hits = sum(1 for record in records if record.get("cache_hit"))
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "settings": vars(args),
+        "turns": len(records),
+        "wall_seconds": round(wall_seconds, 3),
+        "turns_per_minute": round(len(records) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "response_latency_ms": {
+            "n": len(latencies),
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+        },
+        "response_cache_hits": cache_hits,
+        "stages_ms": stage_percentiles(records),
+    }
+
+    print(f"{results['turns']} turns in {wall_seconds:.1f}s ({results['turns_per_minute']} turns/min, "
+          f"{args.mode}, commit {(results['commit'] or 'unknown')[:10]})")
+    print(f"{'stage':<17} {'n':>4} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    rows = dict(results["stages_ms"], response=results["response_latency_ms"])
+    for stage, stats in rows.items():
+        print(f"{stage:<17} {stats['n']:>4} {stats['p50']:>10.1f} {stats['p95']:>10.1f} {stats['p99']:>10.1f}")
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Embedding cache benchmark.
+
+Replays a query workload with repeats through CachedEmbeddings and reports
+hit rate and per-call latency for cold (empty cache) and warm passes. Runs
+fully offline with the "hashing" or "local" backend.
+
+    python -m benchmarks.embedding_cache --backend hashing --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from src.embeddings import BACKENDS, CachedEmbeddings, EmbeddingCache
+
+
+PHRASES = [
+    "what time is it",
+    "what's the weather like today",
+    "set a timer for ten minutes",
+    "remind me to call mom tomorrow",
+    "what did we talk about yesterday",
+    "play some music",
+    "how far is the moon",
+    "tell me a joke",
+]
+
+
+def make_workload(count, unique_ratio, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        if rng.random() < unique_ratio:
+            queries.append(f"[user]: {rng.choice(PHRASES)} number {i}")
+        else:
+            queries.append(f"[user]: {rng.choice(PHRASES)}")
+    return queries
+
+
+def run_pass(embeddings, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="hashing")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--unique-ratio", type=float, default=0.2)
+    parser.add_argument("--max-entries", type=int, default=100000)
+    args = parser.parse_args()
+
+    queries = make_workload(args.queries, args.unique_ratio)
+    backend = BACKENDS[args.backend]()
+    print(f"Backend: {backend.model_name}, {len(queries)} queries, {len(set(queries))} unique")
+
+    uncached = CachedEmbeddings(backend, cache=None)
+    print(f"no cache   {run_pass(uncached, queries)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = EmbeddingCache(os.path.join(tmp, "embeddings.sqlite3"), max_entries=args.max_entries)
+        cached = CachedEmbeddings(backend, cache)
+        print(f"cold cache {run_pass(cached, queries)} {cached.stats()}")
+        cached.hits = cached.misses = 0
+        print(f"warm cache {run_pass(cached, queries)} {cached.stats()}")
+        print(f"cache entries: {len(cache)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Minimal OpenAI-compatible chat completions and embeddings server for offline testing.
+
+Streams a canned reply word by word with a configurable time to first
+token and per-token delay, and answers embedding requests with
+deterministic hashed vectors after a configurable delay, so streaming and
+retrieval code paths can be exercised without network access. A fraction of
+requests can be failed (error_rate) or stalled (slow_rate, slow_ms) to
+exercise timeouts, retries and hedging:
+
+    python -m benchmarks.fake_openai_server --port 8399 --first-token-ms 400
+    OPENAI_BASE_URL=http://127.0.0.1:8399/v1 OPENAI_API_KEY=x python app.py
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.embeddings import HashingEmbeddingBackend
+
+
+DEFAULT_REPLY = (
+    "Sure, I can help with that. The weather today looks mild with a light breeze. "
+    "You might want a jacket this evening though. Is there anything else you need?"
+)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def inject_faults(self):
+        """Apply configured failures/stalls; True if an error response was sent"""
+        options = self.server.options
+        with self.server.lock:
+            fail = self.server.rng.random() < options["error_rate"]
+            slow = self.server.rng.random() < options["slow_rate"]
+        if fail:
+            self.read_json()
+            status = options["error_status"]
+            self.send_json({"error": {"message": f"Injected failure ({status})", "type": "server_error"}}, status=status)
+            return True
+        if slow:
+            time.sleep(options["slow_ms"] / 1000)
+        return False
+
+    def do_POST(self):
+        if self.inject_faults():
+            return
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self.chat_completions(self.read_json())
+        elif self.path.rstrip("/").endswith("/embeddings"):
+            self.embeddings(self.read_json())
+        else:
+            self.send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def embeddings(self, request):
+        options = self.server.options
+        inputs = request.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        # Token-id inputs (tiktoken-chunked clients) are hashed by their repr
+        texts = [text if isinstance(text, str) else repr(text) for text in inputs]
+        time.sleep(options["embedding_ms"] / 1000)
+        vectors = self.server.embedder.embed(texts)
+        data = []
+        for i, vector in enumerate(vectors):
+            if request.get("encoding_format") == "base64":
+                embedding = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            else:
+                embedding = [float(x) for x in vector]
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        self.send_json({
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        })
+
+    def chat_completions(self, request):
+        options = self.server.options
+        reply = options["reply"]
+        model = request.get("model", "fake-model")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        time.sleep(options["first_token_ms"] / 1000)
+
+        if not request.get("stream"):
+            time.sleep(options["token_ms"] * len(reply.split()) / 1000)
+            self.send_json({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(delta, finish_reason=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            send_chunk({"role": "assistant", "content": ""})
+            words = reply.split(" ")
+            for i, word in enumerate(words):
+                send_chunk({"content": word if i == 0 else " " + word})
+                time.sleep(options["token_ms"] / 1000)
+            send_chunk({}, finish_reason="stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client hung up mid-stream (e.g. it lost a hedged race)
+            pass
+
+
+def start_server(host="127.0.0.1", port=0, reply=DEFAULT_REPLY, first_token_ms=300, token_ms=30,
+                 embedding_ms=50, embedding_dim=1536, error_rate=0.0, error_status=500,
+                 slow_rate=0.0, slow_ms=3000, seed=None):
+    """Start the server on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.options = {
+        "reply": reply,
+        "first_token_ms": first_token_ms,
+        "token_ms": token_ms,
+        "embedding_ms": embedding_ms,
+        "error_rate": error_rate,
+        "error_status": error_status,
+        "slow_rate": slow_rate,
+        "slow_ms": slow_ms,
+    }
+    server.rng = random.Random(seed)
+    server.lock = threading.Lock()
+    server.embedder = HashingEmbeddingBackend(dim=embedding_dim)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8399)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=30)
+    parser.add_argument("--embedding-ms", type=float, default=50)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests stalled by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=3000)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.host, args.port, args.reply, args.first_token_ms, args.token_ms,
+                                    args.embedding_ms, args.embedding_dim, args.error_rate, args.error_status,
+                                    args.slow_rate, args.slow_ms, args.seed)
+    print(f"Fake OpenAI server listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Idle-mode benchmark: wake word listening with and without the energy gate.
+
+Plays room tone in real time with a few wake words spliced in. Each wake
+word opens with a soft lead-in that stays under the gate's threshold, and
+the stub engine only fires if it hears that lead-in before the loud part,
+so a wake word counts as detected only when the look-back replayed its
+start. The engine burns --engine-cost-ms of CPU per frame, like Porcupine
+on a slow board. A stand-in model (--model-mb, --load-seconds) is paged
+out after --page-out-after seconds of idle and reloaded on wake:
+
+    python -m benchmarks.idle --seconds 60 --wake-at 20 45 --page-out-after 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.vad_fixtures import voiced_signal
+from src.audio_source import ArraySource
+from src.idle import IdleMonitor
+from src.startup import ComponentLoader
+from src.wake_word import WakeWordDetector
+
+
+NOISE_RMS = 60
+LEAD_IN_RMS = 120  # ~6 dB over the room: below the gate's margin, well above the engine's noise test
+
+
+def make_signal(seconds, wake_at, sample_rate=16000, lead_in_seconds=0.25, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = rng.normal(0, NOISE_RMS, int(seconds * sample_rate))
+    for at in wake_at:
+        start = int(at * sample_rate)
+        lead_in = rng.normal(0, LEAD_IN_RMS, int(lead_in_seconds * sample_rate))
+        voiced = voiced_signal(0.6, sample_rate)
+        samples[start:start + len(lead_in)] += lead_in
+        samples[start + len(lead_in):start + len(lead_in) + len(voiced)] += voiced
+    return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+class CostlyEngine:
+    """Porcupine-shaped engine that fires on a soft lead-in followed by loud sound"""
+
+    def __init__(self, cost_ms, sample_rate=16000, frame_length=512, lead_in_frames=4, loud_frames=5):
+        self.cost = cost_ms / 1000
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.lead_in_frames = lead_in_frames
+        self.loud_frames = loud_frames
+        self.soft = 0
+        self.loud = 0
+
+    def process(self, pcm):
+        deadline = time.thread_time() + self.cost
+        while time.thread_time() < deadline:
+            pass
+        rms = np.sqrt(np.mean(pcm.astype(np.float32) ** 2))
+        if rms > 1000:
+            self.loud += 1
+            if self.soft >= self.lead_in_frames and self.loud >= self.loud_frames:
+                self.soft = self.loud = 0
+                return 0
+        elif rms > 80 and not self.loud:
+            self.soft += 1
+        else:
+            self.soft = self.loud = 0
+        return -1
+
+
+def run(gated, args):
+    source = ArraySource(make_signal(args.seconds, args.wake_at))
+    engine = CostlyEngine(args.engine_cost_ms)
+    detector = WakeWordDetector(source, engine=engine, gate={"enabled": gated, "lookback_ms": args.lookback_ms})
+
+    def load_model():
+        time.sleep(args.load_seconds)
+        return np.ones(int(args.model_mb * 2 ** 20), dtype=np.uint8)
+
+    loader = ComponentLoader()
+    components = {"model": loader.load("model", load_model)}
+    components["model"].get()
+    monitor = IdleMonitor(components, detector, {"page_out_after_seconds": args.page_out_after, "page_out": ["model"]})
+
+    source.start()
+    detections = 0
+    monitor.enter()
+    while not source.finished.is_set():
+        if detector.listen():
+            detections += 1
+            monitor.wake()
+            components["model"].get()
+            monitor.enter()
+        else:
+            monitor.tick()
+    monitor.wake()
+    source.stop()
+    components["model"].get()
+    time.sleep(0.1)  # let the reload thread log wake-to-ready
+    return dict(monitor.stats(), detections=detections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--wake-at", type=float, nargs="+", default=[12.0, 24.0])
+    parser.add_argument("--engine-cost-ms", type=float, default=2.0)
+    parser.add_argument("--lookback-ms", type=float, default=500)
+    parser.add_argument("--page-out-after", type=float, default=5.0)
+    parser.add_argument("--model-mb", type=float, default=200)
+    parser.add_argument("--load-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'detected':>9} {'idle CPU %':>11} {'engine frames':>14} {'page-outs':>10} {'wake->ready s':>14}")
+    for gated in (False, True):
+        result = run(gated, args)
+        frames = result["detector"]
+        total = frames["frames_processed"] + frames["frames_gated"]
+        print(f"{'gated' if gated else 'ungated':<8} {result['detections']:>5}/{len(args.wake_at):<3} "
+              f"{result['idle_cpu_percent']:>11.2f} {frames['frames_processed']:>7}/{total:<6} "
+              f"{result['page_outs']:>10} {str(result['wake_to_ready_seconds']):>14}")
+
+
+if __name__ == "__main__":
+    main()
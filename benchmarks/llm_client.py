@@ -0,0 +1,76 @@
+"""Success rate and time to first token: plain OpenAI client vs. ResilientChatClient.
+
+Sends the same sequence of streamed requests through each client against
+the fake OpenAI server with injected failures and stalls:
+
+    python -m benchmarks.llm_client --requests 200 --error-rate 0.05 --slow-rate 0.05 --slow-ms 2000
+"""
+import argparse
+import time
+
+from openai import OpenAI
+
+from benchmarks.fake_openai_server import start_server
+from src.llm_client import ResilientChatClient
+from src.tracing import percentile
+
+
+def run(label, client, requests, request):
+    latencies = []
+    failures = 0
+    for _ in range(requests):
+        start = time.monotonic()
+        try:
+            stream = client.chat.completions.create(stream=True, **request)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    latencies.append(time.monotonic() - start)
+                    break
+            stream.close()
+        except Exception:
+            failures += 1
+    latencies.sort()
+    print(f"{label:<10} ok {requests - failures:>4}/{requests}  first token p50 "
+          f"{percentile(latencies, 0.50) * 1000:7.1f} ms  p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms")
+    if hasattr(client, "stats"):
+        print(f"{'':<10} {client.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=2000)
+    args = parser.parse_args()
+
+    request = {"model": "fake-model", "messages": [{"role": "user", "content": "hi"}]}
+    config = {
+        "timeout_seconds": 10,
+        "first_token_seconds": 5,
+        "max_retries": 2,
+        "backoff_base_seconds": 0.05,
+        "hedge": {"enabled": False},
+    }
+    hedged_config = dict(config, hedge={"enabled": True, "min_samples": 10, "default_delay_seconds": 0.5})
+    clients = [
+        ("plain", lambda base_url: OpenAI(base_url=base_url, api_key="fake", max_retries=0)),
+        ("retries", lambda base_url: ResilientChatClient(config, api_key="fake", base_url=base_url)),
+        ("hedged", lambda base_url: ResilientChatClient(hedged_config, api_key="fake", base_url=base_url)),
+    ]
+    for label, make_client in clients:
+        # Same seed per client so each sees the same fault pattern
+        server, base_url = start_server(
+            first_token_ms=args.first_token_ms, token_ms=5, error_rate=args.error_rate,
+            slow_rate=args.slow_rate, slow_ms=args.slow_ms, seed=0
+        )
+        try:
+            run(label, make_client(base_url), args.requests, request)
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Server load test: throughput and tail latency as concurrent clients increase.
+
+For each concurrency level a fresh AssistantServer is started in-process
+with stand-in models: Whisper costs --stt-batch-ms per batch plus
+--stt-clip-ms per clip (so micro-batching pays off the way it does on a
+real model), TTS costs --synth-ms-per-char, and the LLM and embeddings are
+served by the local fake OpenAI server. Every client streams room tone in
+real time over its own WebSocket, speaks a voiced clip, and waits for the
+reply before speaking again. Response latency is end of speech to the
+first audio message, as seen by the client:
+
+    python -m benchmarks.load_test --concurrency 1 2 4 8 16 --turns 4
+    python -m benchmarks.load_test --url ws://127.0.0.1:8765 --concurrency 4  # a running server
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.e2e import SCRIPT, SimulatedTextToSpeech, StubRetriever
+from benchmarks.fake_openai_server import start_server
+from benchmarks.vad_fixtures import voiced_signal
+from src.tracing import percentile
+
+
+SAMPLE_RATE = 16000
+CHUNK = 320  # 20 ms per message, like a capture callback
+
+
+class SimulatedBatchSpeechToText:
+    """Whisper stand-in for transcribe_batch(): a fixed cost per batch plus a cost per clip"""
+
+    def __init__(self, batch_ms, clip_ms):
+        self.batch_seconds = batch_ms / 1000
+        self.clip_seconds = clip_ms / 1000
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def transcribe_batch(self, audios, languages):
+        time.sleep(self.batch_seconds + self.clip_seconds * len(audios))
+        with self.lock:
+            start, self.count = self.count, self.count + len(audios)
+        return [(SCRIPT[(start + i) % len(SCRIPT)], "en") for i in range(len(audios))]
+
+
+def server_config(config_path, workdir):
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config["tracing"] = {"path": None}
+    config["server"] = dict(
+        config.get("server", {}),
+        history_dir=os.path.join(workdir, "history"),
+        index_dir=os.path.join(workdir, "index"),
+        max_clients=1024
+    )
+    config["embeddings"] = dict(
+        config.get("embeddings", {}),
+        backend="openai",
+        cache_path=os.path.join(workdir, "cache", "embeddings.sqlite3"),
+        openai=dict(config.get("embeddings", {}).get("openai", {}), check_embedding_ctx_length=False),
+    )
+    path = os.path.join(workdir, "assistant_config.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return path
+
+
+def start_local_server(config_path, args):
+    """AssistantServer on its own event loop thread; returns (server, url, stop)"""
+    from src.server import AssistantServer
+    overrides = {
+        "stt": lambda: SimulatedBatchSpeechToText(args.stt_batch_ms, args.stt_clip_ms),
+        "tts": lambda: SimulatedTextToSpeech(synth_ms_per_char=args.synth_ms_per_char),
+    }
+    if args.no_retrieval:
+        overrides["retriever"] = lambda session: StubRetriever()
+    server = AssistantServer(config_path, overrides=overrides)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def serve():
+        started = asyncio.Event()
+        task = asyncio.ensure_future(server.serve("127.0.0.1", 0, started))
+        await started.wait()
+        ready.set()
+        await task
+
+    def run():
+        try:
+            loop.run_until_complete(serve())
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        for task in asyncio.all_tasks(loop):
+            loop.call_soon_threadsafe(task.cancel)
+        thread.join(timeout=5)
+
+    return server, f"ws://127.0.0.1:{server.bound_port}", stop
+
+
+async def client(url, client_id, turns, utterance, results, rng):
+    from websockets.asyncio.client import connect
+    async with connect(url, max_size=2 ** 24) as websocket:
+        await websocket.send(json.dumps({"type": "hello", "client_id": client_id, "sample_rate": SAMPLE_RATE}))
+        json.loads(await websocket.recv())
+
+        speech = []  # chunks of the utterance still to send
+        speech_end = None
+        reply_done = asyncio.Event()
+
+        async def stream():
+            nonlocal speech_end
+            next_time = time.monotonic()
+            while True:
+                chunk = rng.normal(0, 60, CHUNK)
+                if speech:
+                    chunk += speech.pop(0)
+                    if not speech:
+                        speech_end = time.monotonic()
+                await websocket.send(np.clip(chunk, -32768, 32767).astype(np.int16).tobytes())
+                next_time += CHUNK / SAMPLE_RATE
+                await asyncio.sleep(max(0.0, next_time - time.monotonic()))
+
+        async def receive():
+            turn = {}
+            async for message in websocket:
+                if isinstance(message, bytes):
+                    continue
+                event = json.loads(message)
+                now = time.monotonic()
+                if event["type"] == "transcript":
+                    turn["transcript_ms"] = (now - speech_end) * 1000
+                elif event["type"] == "audio" and "response_ms" not in turn:
+                    turn["response_ms"] = (now - speech_end) * 1000
+                elif event["type"] == "reply_end":
+                    turn["reply_ms"] = (now - speech_end) * 1000
+                    results.append(turn)
+                    turn = {}
+                    reply_done.set()
+
+        streamer = asyncio.ensure_future(stream())
+        receiver = asyncio.ensure_future(receive())
+        try:
+            await asyncio.sleep(rng.uniform(0.3, 1.0))  # clients don't all start talking at once
+            for _ in range(turns):
+                reply_done.clear()
+                padded = np.concatenate([utterance, np.zeros(-len(utterance) % CHUNK)])
+                speech.extend(padded.reshape(-1, CHUNK))
+                await asyncio.wait_for(reply_done.wait(), timeout=60)
+                await asyncio.sleep(rng.uniform(0.2, 0.6))
+        finally:
+            streamer.cancel()
+            receiver.cancel()
+
+
+async def run_level(url, concurrency, turns, utterance):
+    results = []
+    started = time.monotonic()
+    await asyncio.gather(*(
+        client(url, f"load-{concurrency}-{i}", turns, utterance, results, np.random.default_rng(i))
+        for i in range(concurrency)
+    ))
+    return results, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="config/assistant_config.json")
+    parser.add_argument("--url", help="test a running server instead of an in-process one with stand-in models")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--turns", type=int, default=3, help="turns per client")
+    parser.add_argument("--utterance-seconds", type=float, default=1.5)
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=30)
+    parser.add_argument("--stt-batch-ms", type=float, default=150, help="simulated Whisper cost per batch")
+    parser.add_argument("--stt-clip-ms", type=float, default=30, help="simulated Whisper cost per clip in a batch")
+    parser.add_argument("--synth-ms-per-char", type=float, default=4)
+    parser.add_argument("--no-retrieval", action="store_true", help="skip the per-client history index")
+    args = parser.parse_args()
+
+    utterance = voiced_signal(args.utterance_seconds, SAMPLE_RATE)
+    fake = None
+    if not args.url:
+        fake, base_url = start_server(first_token_ms=args.first_token_ms, token_ms=args.token_ms)
+        os.environ["OPENAI_BASE_URL"] = base_url
+        os.environ["OPENAI_API_BASE"] = base_url
+        os.environ["OPENAI_API_KEY"] = "fake"
+
+    print(f"{'clients':>7} {'turns':>6} {'turns/s':>8} {'resp p50':>9} {'p95':>7} {'p99':>7} "
+          f"{'stt p95':>8} {'stt batch':>10}")
+    try:
+        for concurrency in args.concurrency:
+            with tempfile.TemporaryDirectory(prefix="load-") as workdir:
+                url, server, stop = args.url, None, None
+                if url is None:
+                    server, url, stop = start_local_server(server_config(os.path.abspath(args.config), workdir), args)
+                try:
+                    results, wall = asyncio.run(run_level(url, concurrency, args.turns, utterance))
+                finally:
+                    if stop is not None:
+                        stop()
+            response = sorted(turn["response_ms"] for turn in results if "response_ms" in turn)
+            transcript = sorted(turn["transcript_ms"] for turn in results if "transcript_ms" in turn)
+            batch = server.stt_batcher.stats()["mean_batch"] if server is not None else float("nan")
+            print(f"{concurrency:>7} {len(results):>6} {len(results) / wall:>8.2f} "
+                  f"{percentile(response, 0.50):>9.0f} {percentile(response, 0.95):>7.0f} "
+                  f"{percentile(response, 0.99):>7.0f} {percentile(transcript, 0.95):>8.0f} {batch:>10.2f}")
+    finally:
+        if fake is not None:
+            fake.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Time-to-first-audio: batch reply vs. sentence-streamed reply.
+
+Runs against the local fake OpenAI server with a simulated synthesizer
+(cost proportional to text length) and a simulated player, so no model,
+audio device or network is needed:
+
+    python -m benchmarks.streaming_tts --first-token-ms 400 --synth-ms-per-char 4
+"""
+import argparse
+import time
+
+from openai import OpenAI
+
+from benchmarks.fake_openai_server import start_server
+from src.streaming import play_pipelined, stream_completion_sentences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=25)
+    parser.add_argument("--synth-ms-per-char", type=float, default=4)
+    parser.add_argument("--play-ms-per-char", type=float, default=12)
+    args = parser.parse_args()
+
+    server, base_url = start_server(first_token_ms=args.first_token_ms, token_ms=args.token_ms)
+    client = OpenAI(base_url=base_url, api_key="fake")
+    request = {"model": "fake-model", "messages": [{"role": "user", "content": "hi"}]}
+
+    def synthesize(text):
+        time.sleep(len(text) * args.synth_ms_per_char / 1000)
+        return text
+
+    def run(label, chunks):
+        start = time.perf_counter()
+        first_audio = []
+
+        def play(text):
+            if not first_audio:
+                first_audio.append(time.perf_counter() - start)
+            time.sleep(len(text) * args.play_ms_per_char / 1000)
+
+        play_pipelined(chunks(), synthesize, play)
+        total = time.perf_counter() - start
+        print(f"{label:<10} first audio {first_audio[0] * 1000:7.1f} ms   done {total * 1000:7.1f} ms")
+
+    def batch():
+        response = client.chat.completions.create(**request)
+        yield response.choices[0].message.content
+
+    def streamed():
+        yield from stream_completion_sentences(client, **request)
+
+    run("batch", batch)
+    run("streaming", streamed)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
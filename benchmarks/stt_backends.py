@@ -0,0 +1,127 @@
+"""Speech-to-text backends compared: load time, real-time factor and word error rate.
+
+Each candidate is backend:model[:compute_type]. Every WAV fixture is
+transcribed once per candidate and thread count; the reference transcript
+comes from a sidecar .txt (else the file name, underscores as spaces):
+
+    python -m benchmarks.stt_backends fixtures/utterances/ \\
+        --candidates whisper:base faster-whisper:base:int8 faster-whisper:small:int8 --threads 2 4
+"""
+import argparse
+import os
+import time
+
+from src.audio_source import load_wav
+from src.stt import SpeechToText, normalize_word
+
+
+def load_fixtures(path, sample_rate=16000):
+    """[(name, int16 samples, reference transcript)]"""
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith(".wav"))
+    else:
+        paths = [path]
+    fixtures = []
+    for wav_path in paths:
+        samples, rate = load_wav(wav_path)
+        if rate != sample_rate:
+            print(f"Skipping {wav_path}: {rate}Hz (need {sample_rate}Hz)")
+            continue
+        transcript_path = os.path.splitext(wav_path)[0] + ".txt"
+        if os.path.exists(transcript_path):
+            with open(transcript_path, "r", encoding="utf-8") as f:
+                reference = f.read().strip()
+        else:
+            reference = os.path.splitext(os.path.basename(wav_path))[0].replace("_", " ")
+        fixtures.append((os.path.basename(wav_path), samples, reference))
+    if not fixtures:
+        raise SystemExit(f"No usable {sample_rate}Hz WAV fixtures in {path}")
+    return fixtures
+
+
+def words_of(text):
+    return [word for word in (normalize_word(w) for w in text.split()) if word]
+
+
+def edit_distance(reference, hypothesis):
+    """Word-level Levenshtein distance"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+
+def parse_candidate(spec, threads):
+    backend, _, rest = spec.partition(":")
+    model, _, compute_type = rest.partition(":")
+    options = {"model": model or "base", "threads": threads}
+    if compute_type:
+        options["compute_type"] = compute_type
+    return {"backend": backend, backend: options}
+
+
+def run(config, fixtures):
+    start = time.monotonic()
+    stt = SpeechToText(dict(config, warmup_seconds=0))
+    load_seconds = time.monotonic() - start
+    start = time.monotonic()
+    stt.warm_up(1.0)
+    warmup_seconds = time.monotonic() - start
+
+    audio_seconds = decode_seconds = 0.0
+    errors = reference_words = 0
+    for name, samples, reference in fixtures:
+        start = time.monotonic()
+        text = stt.transcribe(samples)
+        elapsed = time.monotonic() - start
+        expected = words_of(reference)
+        distance = edit_distance(expected, words_of(text))
+        audio_seconds += len(samples) / stt.sample_rate
+        decode_seconds += elapsed
+        errors += distance
+        reference_words += len(expected)
+        print(f"    {name:<30} rtf {elapsed / (len(samples) / stt.sample_rate):5.2f}  "
+              f"errors {distance}/{len(expected)}  {text.strip()!r}")
+    return {
+        "model": stt.backend.model_name,
+        "load_s": round(load_seconds, 2),
+        "warmup_s": round(warmup_seconds, 2),
+        "rtf": round(decode_seconds / audio_seconds, 3),
+        "wer": round(errors / max(1, reference_words), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", help="WAV file or directory of 16 kHz WAV files")
+    parser.add_argument("--candidates", nargs="+", default=["whisper:base", "faster-whisper:base:int8"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[4])
+    parser.add_argument("--language", default="en", help="pinned language, or 'auto' to detect per clip")
+    parser.add_argument("--beam-size", type=int, default=1)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures)
+    results = []
+    for spec in args.candidates:
+        for threads in args.threads:
+            config = dict(
+                parse_candidate(spec, threads), language=args.language,
+                decode_options={"beam_size": args.beam_size}
+            )
+            print(f"{spec} ({threads} threads)")
+            try:
+                results.append((spec, threads, run(config, fixtures)))
+            except ImportError as e:
+                print(f"    skipped: {e}")
+
+    print(f"\n{'candidate':<28} {'threads':>7} {'load s':>7} {'warmup s':>9} {'RTF':>6} {'WER':>6}")
+    for spec, threads, result in results:
+        print(f"{spec:<28} {threads:>7} {result['load_s']:>7.2f} {result['warmup_s']:>9.2f} "
+              f"{result['rtf']:>6.3f} {result['wer']:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
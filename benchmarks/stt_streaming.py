@@ -0,0 +1,74 @@
+"""Transcript latency after end of speech: batch Whisper vs. streaming.
+
+Each WAV fixture is played at real time into a StreamingTranscriber (on
+CPU), exactly as the recorder would feed it. Latency is measured from the
+moment the last sample is delivered to the moment the final transcript is
+available, and compared with transcribing the whole file afterwards:
+
+    python -m benchmarks.stt_streaming fixtures/utterances/ --model base
+"""
+import argparse
+import os
+import statistics
+import time
+
+from src.audio_source import load_wav
+from src.stt import STT_BACKENDS, SpeechToText, StreamingTranscriber
+
+
+def run_streaming(stt, samples, sample_rate, step, frame_ms=20):
+    transcriber = StreamingTranscriber(stt, sample_rate=sample_rate, step=step).start()
+    frame = int(sample_rate * frame_ms / 1000)
+    next_time = time.monotonic()
+    for start in range(0, len(samples), frame):
+        transcriber.feed(samples[start:start + frame])
+        next_time += frame / sample_rate
+        time.sleep(max(0.0, next_time - time.monotonic()))
+    end_of_speech = time.monotonic()
+    text = transcriber.finish()
+    return time.monotonic() - end_of_speech, text, transcriber.decodes
+
+
+def run_batch(stt, samples):
+    start = time.monotonic()
+    text = stt.transcribe(samples)
+    return time.monotonic() - start, text.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", help="WAV file or directory of 16 kHz WAV files")
+    parser.add_argument("--backend", choices=sorted(STT_BACKENDS), default="whisper")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--step", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if os.path.isdir(args.fixtures):
+        paths = sorted(os.path.join(args.fixtures, f) for f in os.listdir(args.fixtures) if f.endswith(".wav"))
+    else:
+        paths = [args.fixtures]
+
+    # Warmed up at load, so the first fixture isn't penalised
+    stt = SpeechToText({"backend": args.backend, args.backend: {"model": args.model}})
+
+    batch_latency, stream_latency = [], []
+    for path in paths:
+        samples, sample_rate = load_wav(path)
+        if sample_rate != 16000:
+            print(f"Skipping {path}: {sample_rate}Hz (need 16000Hz)")
+            continue
+        batch_seconds, batch_text = run_batch(stt, samples)
+        stream_seconds, stream_text, decodes = run_streaming(stt, samples, sample_rate, args.step)
+        batch_latency.append(batch_seconds)
+        stream_latency.append(stream_seconds)
+        print(f"{os.path.basename(path)} ({len(samples) / sample_rate:.1f}s audio)")
+        print(f"  batch     {batch_seconds * 1000:8.0f} ms  {batch_text!r}")
+        print(f"  streaming {stream_seconds * 1000:8.0f} ms  {stream_text!r} ({decodes} decodes)")
+
+    if batch_latency:
+        print(f"median latency after end of speech: batch {statistics.median(batch_latency) * 1000:.0f} ms, "
+              f"streaming {statistics.median(stream_latency) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
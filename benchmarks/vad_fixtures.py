@@ -0,0 +1,112 @@
+"""End-of-utterance latency over recorded WAV fixtures: legacy detector vs. VAD.
+
+Each fixture should be 16 kHz mono 16-bit speech followed by at least two
+seconds of room tone. For every file the script reports when each detector
+would have stopped recording, measured from the end of speech as seen by
+the VAD:
+
+    python -m benchmarks.vad_fixtures fixtures/utterances/
+    python -m benchmarks.vad_fixtures --make-fixture /tmp/synthetic.wav
+"""
+import argparse
+import os
+import wave
+
+import numpy as np
+
+from src.audio_source import load_wav
+from src.vad import EndpointDetector, VoiceActivityDetector
+
+
+def save_wav(path, samples, sample_rate):
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype(np.int16).tobytes())
+
+
+def voiced_signal(seconds, sample_rate=16000, pitch_hz=140):
+    """A harmonic tone with syllable-rate modulation that the VAD treats as speech"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voiced = sum(np.sin(2 * np.pi * pitch_hz * h * t) / h for h in range(1, 12))
+    voiced *= 0.5 * (1 + np.sin(2 * np.pi * 4 * t))  # syllable-rate modulation
+    return voiced / np.max(np.abs(voiced)) * 8000
+
+
+def make_fixture(path, sample_rate=16000, seed=0):
+    """Half a second of room tone, 1.5s of a voiced harmonic signal, 2.5s of room tone"""
+    rng = np.random.default_rng(seed)
+    voiced = voiced_signal(1.5, sample_rate)
+    noise = lambda seconds: rng.normal(0, 60, int(seconds * sample_rate))
+    samples = np.concatenate([noise(0.5), voiced + noise(1.5), noise(2.5)])
+    save_wav(path, np.clip(samples, -32768, 32767), sample_rate)
+
+
+def legacy_endpoint(samples, sample_rate, threshold=500, silence_duration=1.25):
+    """The original record_until_silence rule: 0.25s blocks, peak below threshold"""
+    block = sample_rate // 4
+    silent = 0
+    for start in range(0, len(samples) - block + 1, block):
+        if np.max(np.abs(samples[start:start + block])) < threshold:
+            silent += block
+            if silent >= silence_duration * sample_rate:
+                return (start + block) / sample_rate
+        else:
+            silent = 0
+    return None
+
+
+def vad_endpoint(samples, sample_rate, silence_duration):
+    vad = VoiceActivityDetector(sample_rate=sample_rate)
+    endpoint = EndpointDetector(vad, silence_duration=silence_duration, start_timeout=len(samples) / sample_rate)
+    frame = vad.frame_length
+    for start in range(0, len(samples) - frame + 1, frame):
+        state = endpoint.process(samples[start:start + frame])
+        if state == EndpointDetector.DONE:
+            return endpoint.speech_end_frame * frame / sample_rate, (start + frame) / sample_rate
+    return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="?", help="WAV file or directory of WAV files")
+    parser.add_argument("--silence-duration", type=float, default=0.5)
+    parser.add_argument("--make-fixture", help="write a synthetic fixture to this path and exit")
+    args = parser.parse_args()
+
+    if args.make_fixture:
+        make_fixture(args.make_fixture)
+        print(f"Wrote {args.make_fixture}")
+        return
+    if not args.fixtures:
+        parser.error("fixtures path required")
+
+    if os.path.isdir(args.fixtures):
+        paths = sorted(os.path.join(args.fixtures, f) for f in os.listdir(args.fixtures) if f.endswith(".wav"))
+    else:
+        paths = [args.fixtures]
+
+    print(f"{'file':<32} {'speech end':>10} {'legacy stop':>12} {'vad stop':>9} {'legacy tail':>12} {'vad tail':>9}")
+    tails = {"legacy": [], "vad": []}
+    for path in paths:
+        samples, sample_rate = load_wav(path)
+        speech_end, vad_stop = vad_endpoint(samples, sample_rate, args.silence_duration)
+        legacy_stop = legacy_endpoint(samples, sample_rate)
+        fmt = lambda value: f"{value:.2f}s" if value is not None else "-"
+        legacy_tail = legacy_stop - speech_end if legacy_stop is not None and speech_end is not None else None
+        vad_tail = vad_stop - speech_end if vad_stop is not None else None
+        if legacy_tail is not None:
+            tails["legacy"].append(legacy_tail)
+        if vad_tail is not None:
+            tails["vad"].append(vad_tail)
+        print(f"{os.path.basename(path):<32} {fmt(speech_end):>10} {fmt(legacy_stop):>12} "
+              f"{fmt(vad_stop):>9} {fmt(legacy_tail):>12} {fmt(vad_tail):>9}")
+
+    for name, values in tails.items():
+        if values:
+            print(f"mean {name} end-of-utterance tail: {np.mean(values):.2f}s over {len(values)} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Vector index benchmark: ShardedVectorStore vs. Chroma.
+
+Builds each index from synthetic embeddings spread over the last few years,
+then opens it in a fresh process and reports open time, query latency and
+resident memory. Chroma is skipped if chromadb is not installed.
+
+    python -m benchmarks.vector_store --sizes 10000 100000 1000000 --dim 1536
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.tracing import percentile
+from src.vector_store import ShardedVectorStore
+
+
+class SyntheticEmbeddings:
+    """Deterministic random unit vectors; text "chunk N" always maps to row N"""
+
+    def __init__(self, dim, seed=0):
+        self.dim = dim
+        self.seed = seed
+
+    def vector(self, index):
+        vector = np.random.default_rng((self.seed, index)).standard_normal(self.dim).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def embed_documents(self, texts):
+        return np.stack([self.vector(int(text.split()[-1])) for text in texts])
+
+    def embed_query(self, text):
+        return self.vector(int(text.split()[-1]))
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def corpus(size, months=36, batch=20000):
+    """(texts, metadatas, ids) batches spread evenly over the last months"""
+    now = datetime.now()
+    for start in range(0, size, batch):
+        indices = range(start, min(size, start + batch))
+        yield (
+            [f"chunk {i}" for i in indices],
+            [{"timestamp": (now - timedelta(days=30 * months * i / size)).isoformat(), "chunk_id": f"c{i}"}
+             for i in indices],
+            [f"c{i}" for i in indices],
+        )
+
+
+def open_store(backend, directory, dim, dtype):
+    embeddings = SyntheticEmbeddings(dim)
+    if backend == "sharded":
+        return ShardedVectorStore(embeddings, directory, dtype=dtype)
+    import chromadb
+    client = chromadb.PersistentClient(path=directory)
+    return client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+
+
+def build(backend, directory, size, dim, dtype):
+    store = open_store(backend, directory, dim, dtype)
+    embeddings = SyntheticEmbeddings(dim)
+    for texts, metadatas, ids in corpus(size):
+        if backend == "sharded":
+            store.add_texts(texts, metadatas, ids)
+        else:
+            for start in range(0, len(texts), 5000):
+                part = slice(start, start + 5000)
+                store.add(ids=ids[part], documents=texts[part], metadatas=metadatas[part],
+                          embeddings=embeddings.embed_documents(texts[part]).tolist())
+
+
+def measure(backend, directory, size, dim, dtype, queries, results):
+    """Runs in a fresh process so open time and RSS aren't skewed by the build"""
+    baseline = rss_mb()
+    start = time.perf_counter()
+    store = open_store(backend, directory, dim, dtype)
+    open_ms = (time.perf_counter() - start) * 1000
+
+    embeddings = SyntheticEmbeddings(dim)
+    rng = np.random.default_rng(1)
+    latencies = []
+    for index in rng.integers(0, size, queries):
+        # Nearby queries: a stored vector plus noise
+        query = embeddings.vector(int(index)) + 0.3 * rng.standard_normal(dim).astype(np.float32) / np.sqrt(dim)
+        start = time.perf_counter()
+        if backend == "sharded":
+            store.similarity_search_by_vector(query, k=4)
+        else:
+            store.query(query_embeddings=[query.tolist()], n_results=4)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    results.put({
+        "open_ms": round(open_ms, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "rss_mb": round(rss_mb() - baseline, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="int8")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", choices=["sharded", "chroma"], default=["sharded", "chroma"])
+    args = parser.parse_args()
+
+    backends = list(args.backends)
+    if "chroma" in backends:
+        try:
+            import chromadb  # noqa: F401
+        except ImportError:
+            print("chromadb not installed, skipping Chroma")
+            backends.remove("chroma")
+
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        for backend in backends:
+            with tempfile.TemporaryDirectory() as directory:
+                start = time.perf_counter()
+                build(backend, directory, size, args.dim, args.dtype)
+                build_s = time.perf_counter() - start
+                results = context.Queue()
+                process = context.Process(
+                    target=measure, args=(backend, directory, size, args.dim, args.dtype, args.queries, results)
+                )
+                process.start()
+                result = results.get()
+                process.join()
+                print(f"{backend:<8} {size:>8} chunks  build {build_s:7.1f} s  {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,148 @@
 from .wake_word import WakeWordDetector
-from .stt import SpeechToText
+from .stt import SpeechToText, StreamingTranscriber
 from .tts import TextToSpeech
-import sounddevice as sd
-import numpy as np
+import logging
+import threading
 import time
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
 import json
 from datetime import datetime
 from .conversation_retrieval import ConversationRetrieval
+from .conversation_log import ConversationLog, migrate_json_history
+from .streaming import SentenceSplitter, stream_completion_sentences
+from .audio_source import create_audio_source
+from .audio_output import create_audio_output
+from .vad import VoiceActivityDetector, EndpointDetector
+from .startup import ComponentLoader
+from .idle import IdleMonitor
+from .tracing import Tracer, NULL_TRACE
+from .context import ContextBuilder
+from .llm_client import ResilientChatClient
+from .response_cache import SemanticResponseCache, normalize_query
+
+logger = logging.getLogger(__name__)
 
 class VoiceAssistant:
-    def __init__(self):
-        # Load OpenAI API key
-        load_dotenv()
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        # Load assistant configuration
-        self.load_config()
-        
-        self.wake_word_detector = WakeWordDetector()
-        self.stt = SpeechToText()
-        self.tts = TextToSpeech()
-        self.silence_threshold = 500
-        
-        # Initialize conversation with system prompt
-        self.conversation_history = [self.config["system_prompt"]]
-        
-        # Create history directory if it doesn't exist
-        os.makedirs("history", exist_ok=True)
-        
+    def __init__(self, audio_source=None, config_path="config/assistant_config.json",
+                 wake_word_engine=None, overrides=None):
+        """audio_source, wake_word_engine and overrides (component name -> factory)
+        let tests and benchmarks swap in stand-ins for hardware and models."""
+        overrides = overrides or {}
+        # Wake word detection comes up first; the heavy models load in parallel
+        # in the background and each request only waits for what it uses.
+        self.loader = ComponentLoader()
+
+        with self.loader.phase("config"):
+            # Load OpenAI API key
+            load_dotenv()
+
+            # Load assistant configuration
+            self.load_config(config_path)
+
+        with self.loader.phase("audio + wake word"):
+            # One input stream shared by the wake word detector and the recorder
+            self.audio_source = audio_source or create_audio_source(self.config.get("audio_input"))
+            self.audio_source.start()
+            self.wake_word_detector = WakeWordDetector(
+                self.audio_source,
+                engine=wake_word_engine,
+                gate=self.config.get("idle", {}).get("gate")
+            )
+
+        factories = {
+            "openai": self.create_client,
+            "stt": lambda: SpeechToText(self.config.get("stt")),
+            "tts": lambda: TextToSpeech(
+                self.config.get("tts"),
+                output=create_audio_output(self.config.get("audio_output"))
+            ),
+            "retriever": lambda: ConversationRetrieval(
+                embedding_config=self.config.get("embeddings"),
+                retrieval_config=self.config.get("retrieval")
+            ),
+        }
+        factories.update(overrides)
+        self.components = {name: self.loader.load(name, factory) for name, factory in factories.items()}
+
+        # Energy-gated wake word listening; heavy models can be paged out while idle
+        self.idle = IdleMonitor(self.components, self.wake_word_detector, self.config.get("idle"))
+
+        with self.loader.phase("conversation log"):
+            # Create history directory if it doesn't exist
+            os.makedirs("history", exist_ok=True)
+
+            # Sessions are append-only JSONL logs; convert any legacy JSON sessions first
+            migrate_json_history("history")
+
+            self.start_conversation("history")
+
+        # Per-turn latency spans, exported as JSONL when tracing.path is set
+        self.tracer = Tracer(path=self.config.get("tracing", {}).get("path"))
+
+        threading.Thread(target=self.report_startup, daemon=True).start()
+        logger.info("Assistant initialized! (models are still loading in the background)")
+
+    def start_conversation(self, history_dir):
+        """Per-conversation state the turn logic relies on; the server's client sessions share it"""
+        # Recent turns plus a rolling summary of older ones, bounded in memory;
+        # the full session lives in the log below
+        self.context = ContextBuilder(
+            self.config["system_prompt"],
+            self.config.get("context"),
+            summarize=self.summarize_turns,
+            model=self.config["model"]
+        )
+
         # Generate unique filename for this session
-        self.conversation_file = f"history/conversation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        
-        self.retriever = ConversationRetrieval()
-        print("Assistant initialized!")
+        self.conversation_file = os.path.join(
+            history_dir, f"conversation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        )
+        self.conversation_log = ConversationLog(self.conversation_file, header=self.config["system_prompt"])
+
+        # Answers to repeated questions, matched by embedding similarity
+        cache_config = self.config.get("response_cache", {})
+        self.response_cache = SemanticResponseCache(cache_config) if cache_config.get("enabled") else None
+
+    def create_client(self):
+        # Pooled connections, deadlines, retries, hedging and a fallback model.
+        # Honours OPENAI_BASE_URL, so a local OpenAI-compatible server can stand in.
+        return ResilientChatClient(self.config.get("llm"), api_key=os.getenv("OPENAI_API_KEY"))
+
+    @property
+    def error_reply(self):
+        """Spoken when the LLM can't be reached, instead of silence"""
+        return self.config.get("error_reply", "Sorry, I'm having trouble thinking right now. Please try again.")
+
+    @property
+    def client(self):
+        return self.components["openai"].get()
+
+    @property
+    def stt(self):
+        return self.components["stt"].get()
+
+    @property
+    def tts(self):
+        return self.components["tts"].get()
+
+    @property
+    def retriever(self):
+        return self.components["retriever"].get()
+
+    def report_startup(self):
+        self.loader.all_loaded.wait()
+        logger.info(self.loader.report())
 
-    def load_config(self):
+    def load_config(self, config_path="config/assistant_config.json"):
         try:
-            config_path = "config/assistant_config.json"  # Make sure this path is correct
             with open(config_path, 'r') as f:
                 self.config = json.load(f)
-                print(f"Configuration loaded successfully from {config_path}")
+                logger.info(f"Configuration loaded successfully from {config_path}")
                 # Debug print to verify loaded content
-                print(f"System prompt: {self.config['system_prompt']['content'][:50]}...")
+                logger.debug(f"System prompt: {self.config['system_prompt']['content'][:50]}...")
         except Exception as e:
-            print(f"Error loading configuration: {e}")
+            logger.error(f"Error loading configuration: {e}")
             # Fallback to default configuration
             self.config = {
                 "system_prompt": {
@@ -56,140 +152,323 @@ class VoiceAssistant:
                 "model": "gpt-4-turbo-preview",
                 "temperature": 0.7
             }
-            print("Using default configuration")
+            logger.info("Using default configuration")
+
+    def gather_context(self, text, trace=NULL_TRACE):
+        """Check the response cache, then retrieve history; returns (cached answer, history, cache key).
+
+        Nothing is embedded for a confident lexical hit unless the response
+        cache has entries to compare against. The query is embedded at most
+        once and the vector is shared by the cache lookup and the retriever.
+        The cache key is a callable giving that vector (embedding on first
+        use), or None if the query mustn't be cached. On a cache hit history
+        is None.
+        """
+        cache = self.response_cache
+        # Follow-ups only make sense with the earlier turns, which the cache doesn't see
+        cacheable = cache is not None and cache.cacheable(text, in_conversation=self.context.turns > 0)
+        vector = []
+
+        def embed():
+            if not vector:
+                with trace.span("embedding"):
+                    vector.append(self.retriever.embeddings.embed_query(normalize_query(text)))
+            return vector[0]
+
+        if cacheable and len(cache):
+            answer = cache.get(embed())
+            trace.annotate(cache_hit=answer is not None)
+            if answer is not None:
+                return answer, None, embed
+        history = self.retriever.get_relevant_history(text, trace=trace, embed=embed)
+        return None, history, embed if cacheable else None
+
+    def cache_response(self, text, cache_key, answer, llm_seconds):
+        """Remember answer for a query gather_context() found cacheable"""
+        if self.response_cache is None or cache_key is None:
+            return
+
+        def put():
+            try:
+                self.response_cache.put(text, cache_key(), answer, llm_seconds)
+            except Exception as e:
+                logger.error(f"Error caching response: {e}")
+
+        # The query may not be embedded yet (a confident lexical hit), so keep it off the reply's path
+        threading.Thread(target=put, daemon=True).start()
+
+    def build_messages(self, text, relevant_history=None, trace=NULL_TRACE):
+        # Get relevant history for the current query (unless the caller already has it)
+        if relevant_history is None:
+            relevant_history = self.retriever.get_relevant_history(text, trace=trace)
+
+        # Recent turns, the rolling summary and retrieved history, within the token budget
+        messages, prompt_tokens = self.context.build(text, relevant_history)
+        logger.debug(f"Prompt: {len(messages)} messages, ~{prompt_tokens} tokens")
+        return messages
 
-    def process_with_gpt(self, text):
+    def record_exchange(self, text, assistant_message):
+        self.context.add_exchange(text, assistant_message)
+        for message in ({"role": "user", "content": text},
+                        {"role": "assistant", "content": assistant_message}):
+            # Only enqueued here; the log's writer thread does the I/O
+            self.conversation_log.append(message)
+
+    def summarize_turns(self, summary, messages):
+        """Fold older turns into the running summary (called off the critical path)"""
+        context_config = self.config.get("context", {})
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            "Update the summary of this conversation between a user and their voice assistant. "
+            "Keep names, facts, preferences and open requests; drop small talk. "
+            "Answer with the summary only.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        response = self.client.chat.completions.create(
+            model=context_config.get("summary_model") or self.config["model"],
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            max_tokens=context_config.get("summary_tokens", 250)
+        )
+        return response.choices[0].message.content
+
+    def process_with_gpt(self, text, trace=NULL_TRACE):
         try:
-            # Get relevant history for the current query
-            relevant_history = self.retriever.get_relevant_history(text)
-            
-            # Add context from relevant history
-            if relevant_history:
-                context_message = {
-                    "role": "system",
-                    "content": "Relevant conversation history:\n" + "\n".join(relevant_history)
-                }
-                messages = [
-                    self.config["system_prompt"],
-                    context_message,
-                    {"role": "user", "content": text}
-                ]
-            else:
-                messages = [
-                    self.config["system_prompt"],
-                    {"role": "user", "content": text}
-                ]
+            cached, relevant_history, cache_key = self.gather_context(text, trace)
+            if cached is not None:
+                self.record_exchange(text, cached)
+                return cached
+            messages = self.build_messages(text, relevant_history, trace=trace)
 
             # Get response from GPT
-            response = self.client.chat.completions.create(
+            start = time.monotonic()
+            with trace.span("llm_total"):
+                response = self.client.chat.completions.create(
+                    model=self.config["model"],
+                    messages=messages,
+                    temperature=self.config["temperature"]
+                )
+
+            assistant_message = response.choices[0].message.content
+            self.record_exchange(text, assistant_message)
+            self.cache_response(text, cache_key, assistant_message, time.monotonic() - start)
+
+            return assistant_message
+
+        except Exception as e:
+            logger.error(f"Error with GPT processing: {e}")
+            return self.error_reply
+
+    def stream_with_gpt(self, text, trace=NULL_TRACE):
+        """Yield the response sentence by sentence while GPT is still generating it"""
+        spoken = False
+        try:
+            cached, relevant_history, cache_key = self.gather_context(text, trace)
+            if cached is not None:
+                # Straight to TTS, still a sentence at a time
+                self.record_exchange(text, cached)
+                splitter = SentenceSplitter()
+                yield from splitter.feed(cached)
+                yield from splitter.flush()
+                return
+            messages = self.build_messages(text, relevant_history, trace=trace)
+            start = time.monotonic()
+
+            def on_complete(message):
+                self.record_exchange(text, message)
+                self.cache_response(text, cache_key, message, time.monotonic() - start)
+
+            for sentence in stream_completion_sentences(
+                self.client,
+                on_complete=on_complete,
+                trace=trace,
                 model=self.config["model"],
                 messages=messages,
                 temperature=self.config["temperature"]
-            )
-            
-            assistant_message = response.choices[0].message.content
-            self.conversation_history.append({"role": "user", "content": text})
-            self.conversation_history.append({"role": "assistant", "content": assistant_message})
-            
-            return assistant_message
-            
+            ):
+                spoken = True
+                yield sentence
         except Exception as e:
-            print(f"Error with GPT processing: {e}")
-            return None
+            logger.error(f"Error with GPT streaming: {e}")
+            if not spoken:
+                yield self.error_reply
 
-    def save_conversation(self):
+    def respond_streaming(self, text, trace=NULL_TRACE):
+        """Speak the streamed response as it arrives; returns the full text"""
+        turns_before = self.context.turns
+        self.tts.speak_stream(self.stream_with_gpt(text, trace), trace=trace)
+        if self.context.turns > turns_before:
+            return self.context.recent[-1]["content"]
+        return None
+
+    def save_conversation(self, close=False):
+        """Make sure logged turns reach disk; close=True on shutdown"""
         try:
-            with open(self.conversation_file, 'w') as f:
-                json.dump({
-                    "timestamp": datetime.now().isoformat(),
-                    "conversation": self.conversation_history
-                }, f, indent=2)
+            if close:
+                self.conversation_log.close()
+            else:
+                self.conversation_log.flush()
         except Exception as e:
-            print(f"Error saving conversation: {e}")
+            logger.error(f"Error saving conversation: {e}")
 
     def run(self):
-        print("Starting voice assistant...")
-        print("Listening for wake word 'Hey Austin'...")
+        logger.info("Starting voice assistant...")
+        logger.info("Listening for wake word 'Hey Austin'...")
         
         try:
-            while True:
-                if self.wake_word_detector.listen():
-                    print("\nWake word detected! Listening to your message...")
+            self.idle.enter()
+            while self.audio_source.running:
+                if not self.wake_word_detector.listen():
+                    self.idle.tick()
+                else:
+                    self.idle.wake()
+                    logger.info("Wake word detected! Listening to your message...")
+                    # Pick up right where the wake word ended so nothing is lost
+                    record_from = self.wake_word_detector.position
                     while True:  # Continue conversation until long silence
                         try:
-                            audio = self.record_until_silence()
+                            trace = self.tracer.start_turn()
+                            audio, text = self.capture_utterance(start=record_from, trace=trace)
+                            record_from = None
                             if audio is not None:
-                                print("Recording complete. Transcribing...")
-                                text = self.stt.transcribe(audio)
                                 if text:
-                                    print(f"\nYou said: {text}")
+                                    logger.info(f"You said: {text}")
                                     
                                     # Process with GPT
-                                    print("\nProcessing with AI...")
-                                    ai_response = self.process_with_gpt(text)
-                                    if ai_response:
-                                        print(f"\nAI Response: {ai_response}")
-                                        # Convert response to speech using Coqui TTS
-                                        print("Converting to speech...")
-                                        self.tts.speak(ai_response)
-                                        self.save_conversation()  # Save after each response
+                                    logger.debug("Processing with AI...")
+                                    if self.config.get("stream_responses"):
+                                        # Speech starts with the first complete sentence
+                                        ai_response = self.respond_streaming(text, trace)
+                                        if ai_response:
+                                            logger.info(f"AI Response: {ai_response}")
+                                            self.save_conversation()
+                                    else:
+                                        ai_response = self.process_with_gpt(text, trace)
+                                        if ai_response:
+                                            logger.info(f"AI Response: {ai_response}")
+                                            # Convert response to speech using Coqui TTS
+                                            logger.debug("Converting to speech...")
+                                            self.tts.speak(ai_response, trace=trace)
+                                            self.save_conversation()  # Save after each response
+                                    trace.finish()
                                     
-                                    print("\nListening for your next message... (or wait for timeout)")
+                                    logger.info("Listening for your next message... (or wait for timeout)")
                                 else:
-                                    print("No speech detected, returning to wake word mode...")
+                                    logger.info("No speech detected, returning to wake word mode...")
                                     break
                             else:
-                                print("Conversation ended due to silence")
+                                logger.info("Conversation ended due to silence")
                                 break
                         except Exception as e:
-                            print(f"Error processing audio: {e}")
+                            logger.error(f"Error processing audio: {e}")
                             break
                     
-                    print("\nListening for wake word 'Hey Austin'...")
-                
+                    self.wake_word_detector.resume()
+                    self.idle.enter()
+                    logger.info("Listening for wake word 'Hey Austin'...")
+
         except KeyboardInterrupt:
-            print("\nSaving conversation and stopping...")
-            self.save_conversation()
+            logger.info("Saving conversation and stopping...")
         except Exception as e:
-            print(f"Error: {e}")
-            self.save_conversation()
-
-    def record_until_silence(self, sample_rate=16000, silence_duration=1.25):
-        print("Recording started...")
-        silence_threshold = 500  # Adjust this value based on testing
-        silence_frames = 0
-        max_silence_frames = int(silence_duration * sample_rate)
-        
-        # Initialize an empty array for storing audio
-        audio_chunks = []
-        
+            logger.error(f"Error: {e}")
+        finally:
+            self.save_conversation(close=True)
+            self.tracer.close()
+            self.audio_source.stop()
+            self.close_audio_output()
+            logger.info(f"Idle: {self.idle.stats()}")
+            if self.response_cache is not None:
+                logger.info(f"Response cache: {self.response_cache.stats()}")
+
+    def close_audio_output(self):
+        if self.components["tts"].ready:
+            logger.info(f"Audio output: {self.tts.output.stats()}")
+            self.tts.output.stop()
+
+    def capture_utterance(self, start=None, trace=NULL_TRACE):
+        """Record one utterance and transcribe it; returns (audio, text).
+
+        With stt.streaming enabled, Whisper decodes while the user is still
+        talking, so only the last unstable stretch is left once silence is
+        detected. audio is None when nobody spoke.
+        """
+        if not self.config.get("stt", {}).get("streaming"):
+            with trace.span("capture"):
+                audio = self.record_until_silence(start=start, trace=trace)
+            if audio is None:
+                return None, ""
+            logger.debug("Recording complete. Transcribing...")
+            with trace.span("stt"):
+                return audio, self.stt.transcribe(audio)
+
+        transcriber = StreamingTranscriber(
+            self.stt,
+            sample_rate=self.audio_source.sample_rate,
+            step=self.config["stt"].get("step_seconds", 1.0)
+        ).start()
+        with trace.span("capture"):
+            audio = self.record_until_silence(start=start, on_frame=transcriber.feed, trace=trace)
+        if audio is None:
+            transcriber.cancel()
+            return None, ""
+        logger.debug("Recording complete. Finishing transcription...")
+        # Only the time after end of speech is on the critical path
+        with trace.span("stt"):
+            return audio, transcriber.finish()
+
+    def record_until_silence(self, start=None, silence_duration=0.5, start_timeout=3.0,
+                             max_duration=30.0, preroll=0.3, on_frame=None, trace=NULL_TRACE):
+        """Record one utterance from the shared audio source.
+
+        Recording begins at the absolute sample position start (defaults to
+        now) and ends once the VAD has heard silence_duration of quiet. Every
+        frame is also passed to on_frame, if given, as it is read.
+        Returns None if nobody starts speaking within start_timeout.
+        """
+        logger.debug("Recording started...")
+        source = self.audio_source
+        sample_rate = source.sample_rate
+        vad = VoiceActivityDetector(sample_rate=sample_rate)
+        endpoint = EndpointDetector(
+            vad,
+            silence_duration=silence_duration,
+            start_timeout=start_timeout,
+            max_duration=max_duration
+        )
+        frame_length = vad.frame_length
+        reader = source.reader(start)
+        reader.seek(reader.position - int(preroll * sample_rate))
+        origin = reader.position
+
         try:
-            with sd.InputStream(samplerate=sample_rate, channels=1, dtype=np.int16) as stream:
-                while True:
-                    audio_chunk, _ = stream.read(int(sample_rate/4))  # Read 0.25 seconds of audio
-                    audio_chunks.append(audio_chunk)
-                    
-                    # Check for silence
-                    if np.max(np.abs(audio_chunk)) < silence_threshold:
-                        silence_frames += int(sample_rate/4)
-                        print(f"Silence detected: {silence_frames/sample_rate:.1f}s")  # Debug print
-                        if silence_frames >= max_silence_frames:
-                            print("Silence threshold reached")
-                            break
-                    else:
-                        silence_frames = 0
-                        
+            while endpoint.state in (EndpointDetector.WAITING, EndpointDetector.SPEECH):
+                frame = reader.read(frame_length, timeout=1.0)
+                if frame is None:
+                    if not source.running:
+                        logger.info("Audio source stopped")
+                        return None
+                    continue
+                endpoint.process(frame)
+                if on_frame is not None:
+                    on_frame(frame)
+
         except Exception as e:
-            print(f"Error recording audio: {e}")
+            logger.error(f"Error recording audio: {e}")
             return None
-            
-        if not audio_chunks:
+
+        if endpoint.state == EndpointDetector.TIMEOUT:
+            logger.info("No speech started")
             return None
-            
-        # Combine all audio chunks
-        audio = np.concatenate(audio_chunks)
-        print("Recording finished.")
-        return audio
+
+        # How long after the last voiced frame the endpoint fired
+        trace.add_duration("vad_end", (endpoint.frames - endpoint.speech_end_frame) * frame_length / sample_rate)
+
+        # Keep a little audio from before the confirmed onset
+        speech_start = origin + endpoint.speech_start_frame * frame_length
+        begin = max(origin, speech_start - int(preroll * sample_rate), source.ring.oldest)
+        logger.debug(f"Recording finished ({(reader.position - begin) / sample_rate:.1f}s).")
+        # The shared buffer keeps moving, so hand back a copy
+        return source.ring.read(begin, reader.position).copy()
 
 if __name__ == "__main__":
     assistant = VoiceAssistant()
@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-size sample buffer addressed by absolute sample position.
+
+    A single writer (usually the audio callback) appends with write(); readers
+    keep their own absolute positions and fetch ranges with read()/views(). No
+    memory is allocated after construction unless a read spans the wrap point.
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=dtype)
+        self.write_pos = 0
+
+    @property
+    def oldest(self):
+        """Absolute position of the oldest sample still held"""
+        return max(0, self.write_pos - self.capacity)
+
+    def reset(self):
+        self.write_pos = 0
+
+    def write(self, samples):
+        samples = samples.reshape(-1)
+        n = len(samples)
+        if n >= self.capacity:
+            samples = samples[-self.capacity:]
+            start = (self.write_pos + n - self.capacity) % self.capacity
+            first = self.capacity - start
+            self.data[start:] = samples[:first]
+            self.data[:start] = samples[first:]
+        else:
+            start = self.write_pos % self.capacity
+            first = min(n, self.capacity - start)
+            self.data[start:start + first] = samples[:first]
+            self.data[:n - first] = samples[first:]
+        # Publish the new position only after the samples are in place
+        self.write_pos += n
+
+    def views(self, start, end):
+        """Zero-copy views covering [start, end); one view, or two if the range wraps"""
+        start = max(start, self.oldest)
+        end = min(end, self.write_pos)
+        if end <= start:
+            return (self.data[:0],)
+        a = start % self.capacity
+        b = a + (end - start)
+        if b <= self.capacity:
+            return (self.data[a:b],)
+        return (self.data[a:], self.data[:b - self.capacity])
+
+    def read(self, start, end):
+        """Samples in [start, end): a view when contiguous, otherwise a single joined copy"""
+        parts = self.views(start, end)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def latest(self, count):
+        return self.read(self.write_pos - count, self.write_pos)
@@ -0,0 +1,302 @@
+import logging
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+def resample(audio, source_rate, target_rate):
+    """Resample float32 mono audio; soxr when installed, else linear interpolation"""
+    if source_rate == target_rate or not len(audio):
+        return audio
+    try:
+        import soxr
+        return soxr.resample(audio, source_rate, target_rate).astype(np.float32, copy=False)
+    except ImportError:
+        duration = len(audio) / source_rate
+        positions = np.arange(int(round(duration * target_rate))) * (source_rate / target_rate)
+        return np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+
+
+class AudioOutput:
+    """One long-lived output stream fed with PCM chunks.
+
+    play() resamples a chunk to the device rate and appends it to a deque;
+    the device callback pops from it without locking (the condition is only
+    touched at chunk boundaries, to wake waiters), so consecutive chunks
+    play back to back with no gap. drain() waits until everything
+    queued has been heard and cancel() drops it all within one block. When
+    a clocked sink's queue runs dry while more audio is expected (play()
+    called, drain() not yet), the block is padded with silence and counted
+    as an underrun.
+    """
+
+    def __init__(self, sample_rate=48000, blocksize=960, channels=1, max_queued_seconds=10.0):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.max_queued_frames = int(max_queued_seconds * sample_rate)
+
+        self.chunks = deque()
+        self.current = None
+        self.offset = 0
+        # Each counter has a single writer: queued by play(), played by the callback
+        self.queued_frames = 0
+        self.played_frames = 0
+        self.expecting = False  # audio was queued and drain() hasn't been called since
+        self.starved = False  # currently in an underrun
+        self.cancel_requested = False
+        self.progress = threading.Condition()
+        self.running = False
+
+        self.underruns = 0
+        self.underrun_frames = 0
+        self.device_underflows = 0
+
+    @property
+    def pending_frames(self):
+        return self.queued_frames - self.played_frames
+
+    def play(self, audio, sample_rate):
+        """Queue float32 mono audio recorded at sample_rate; waits only if the queue is full"""
+        audio = resample(np.asarray(audio, dtype=np.float32).reshape(-1), sample_rate, self.sample_rate)
+        if not len(audio):
+            return
+        with self.progress:
+            while self.running and self.pending_frames > self.max_queued_frames:
+                self.progress.wait(timeout=0.1)
+            self.expecting = True
+            self.chunks.append(audio)
+            self.queued_frames += len(audio)
+            # Wakes a sink that isn't paced by a clock and is waiting for audio
+            self.progress.notify_all()
+
+    def drain(self, timeout=None):
+        """Wait until all queued audio has played (or was cancelled); False on timeout"""
+        self.expecting = False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.progress:
+            while self.running and self.pending_frames > 0:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.progress.wait(timeout=0.1 if remaining is None else min(remaining, 0.1))
+        return True
+
+    def cancel(self):
+        """Stop playback now and drop everything queued"""
+        self.expecting = False
+        if not self.running:
+            self.clear()
+            return
+        # The callback owns the read side, so it does the clearing on its next block
+        self.cancel_requested = True
+        with self.progress:
+            self.progress.notify_all()
+            while self.running and self.cancel_requested:
+                self.progress.wait(timeout=0.1)
+
+    def clear(self):
+        dropped = 0 if self.current is None else len(self.current) - self.offset
+        self.current = None
+        self.offset = 0
+        while self.chunks:
+            dropped += len(self.chunks.popleft())
+        self.played_frames += dropped
+        self.cancel_requested = False
+
+    def fill(self, out, pad=True):
+        """Fill out (frames x channels) from the queue; returns how many frames of audio it holds.
+
+        The rest of out is zeroed. With pad (a sink paced by a clock) that
+        silence is played, so a shortfall while audio is expected counts as
+        an underrun; without it the caller only uses the frames returned.
+        """
+        frames = len(out)
+        if self.cancel_requested:
+            self.clear()
+            out.fill(0)
+            with self.progress:
+                self.progress.notify_all()
+            return 0
+
+        written = 0
+        finished_chunk = False
+        while written < frames:
+            if self.current is None:
+                if not self.chunks:
+                    break
+                self.current = self.chunks.popleft()
+                self.offset = 0
+            count = min(frames - written, len(self.current) - self.offset)
+            out[written:written + count] = self.current[self.offset:self.offset + count, None]
+            written += count
+            self.offset += count
+            if self.offset == len(self.current):
+                self.current = None
+                finished_chunk = True
+        out[written:] = 0
+        self.played_frames += written
+
+        if written < frames and self.expecting and pad:
+            # Ran dry mid-reply: synthesis isn't keeping up
+            if not self.starved:
+                self.underruns += 1
+                self.starved = True
+            self.underrun_frames += frames - written
+        elif written:
+            self.starved = False
+        if finished_chunk or (written and self.pending_frames == 0):
+            with self.progress:
+                self.progress.notify_all()
+        return written
+
+    def callback(self, outdata, frames, time_info, status):
+        if status and status.output_underflow:
+            self.device_underflows += 1
+        self.fill(outdata)
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        self.clear()
+        with self.progress:
+            self.progress.notify_all()
+
+    def stats(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "played_seconds": round(self.played_frames / self.sample_rate, 3),
+            "pending_seconds": round(self.pending_frames / self.sample_rate, 3),
+            "underruns": self.underruns,
+            "underrun_seconds": round(self.underrun_frames / self.sample_rate, 3),
+            "device_underflows": self.device_underflows,
+        }
+
+
+class SoundDeviceOutput(AudioOutput):
+    """Plays through a sounddevice OutputStream opened once at start()"""
+
+    def __init__(self, sample_rate=None, blocksize=None, channels=1, device=None, latency="low",
+                 max_queued_seconds=10.0):
+        import sounddevice as sd
+        self.sd = sd
+        if sample_rate is None:
+            # The device's native rate spares PortAudio/the OS a second resampling step
+            sample_rate = int(sd.query_devices(device, "output")["default_samplerate"])
+        # 20 ms blocks unless configured
+        super().__init__(sample_rate, blocksize or sample_rate // 50, channels, max_queued_seconds)
+        self.device = device
+        self.latency = latency
+        self.stream = None
+
+    def start(self):
+        super().start()
+        self.stream = self.sd.OutputStream(
+            samplerate=self.sample_rate,
+            blocksize=self.blocksize,
+            channels=self.channels,
+            dtype="float32",
+            device=self.device,
+            latency=self.latency,
+            callback=self.callback
+        )
+        self.stream.start()
+        logger.debug(f"Audio output started at {self.sample_rate}Hz")
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        super().stop()
+
+
+class NullOutput(AudioOutput):
+    """Headless output: a thread consumes blocks at real-time pace and hands
+    what was played to write(). With realtime=False it writes queued audio as
+    fast as possible and only that: no silence between chunks, no underruns."""
+
+    def __init__(self, sample_rate=24000, blocksize=None, channels=1, realtime=True, max_queued_seconds=10.0):
+        super().__init__(sample_rate, blocksize or sample_rate // 50, channels, max_queued_seconds)
+        self.realtime = realtime
+        self.thread = None
+
+    def start(self):
+        super().start()
+        self.thread = threading.Thread(target=self.run, name="audio-output", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        block = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+        block_seconds = self.blocksize / self.sample_rate
+        next_time = time.monotonic()
+        while self.running:
+            if not self.realtime:
+                written = self.fill(block, pad=False)
+                if written:
+                    self.write(block[:written])
+                    continue
+                with self.progress:
+                    # Idle until play(), cancel() or stop(); the timeout only guards against a missed wake-up
+                    if self.running and not self.chunks and not self.cancel_requested:
+                        self.progress.wait(timeout=0.5)
+                continue
+            if self.fill(block) or self.expecting:
+                self.write(block)
+            next_time += block_seconds
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    def write(self, block):
+        pass
+
+    def stop(self):
+        super().stop()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+class WavFileOutput(NullOutput):
+    """Records everything that would have been played to a 16-bit WAV file"""
+
+    def __init__(self, path, sample_rate=24000, blocksize=None, channels=1, realtime=False, max_queued_seconds=10.0):
+        super().__init__(sample_rate, blocksize, channels, realtime, max_queued_seconds)
+        self.path = path
+        self.wav = None
+
+    def start(self):
+        self.wav = wave.open(self.path, "wb")
+        self.wav.setnchannels(self.channels)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(self.sample_rate)
+        super().start()
+
+    def write(self, block):
+        self.wav.writeframes((np.clip(block, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+
+    def stop(self):
+        super().stop()
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
+
+
+def create_audio_output(config=None):
+    """Build the output from the "audio_output" config section"""
+    config = dict(config or {})
+    output_type = config.pop("type", "device")
+    if output_type == "device":
+        return SoundDeviceOutput(**config)
+    if output_type == "null":
+        return NullOutput(**config)
+    if output_type == "wav":
+        return WavFileOutput(**config)
+    raise ValueError(f"Unknown audio output type '{output_type}'")
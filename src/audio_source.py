@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+import wave
+
+import numpy as np
+
+from .audio_buffer import RingBuffer
+
+
+logger = logging.getLogger(__name__)
+
+class AudioSource:
+    """Owns the input device (or a stand-in) and fans audio out to readers.
+
+    Every block is written once into a shared RingBuffer; consumers such as the
+    wake-word detector and the utterance recorder each hold an AudioReader with
+    their own position and get views into that buffer instead of opening their
+    own streams.
+    """
+
+    def __init__(self, sample_rate=16000, blocksize=512, buffer_seconds=60):
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        # A whole number of blocks keeps block-sized reads from straddling the wrap point
+        blocks = int(buffer_seconds * sample_rate) // blocksize
+        self.ring = RingBuffer(blocks * blocksize, dtype=np.int16)
+        self.data_ready = threading.Condition()
+        self.running = False
+
+    @property
+    def position(self):
+        """Absolute sample position of the newest audio"""
+        return self.ring.write_pos
+
+    def push(self, samples):
+        self.ring.write(samples)
+        with self.data_ready:
+            self.data_ready.notify_all()
+
+    def wait_for(self, position, timeout=None):
+        """Block until audio up to position has arrived; False on timeout or stop"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.data_ready:
+            while self.ring.write_pos < position:
+                if not self.running:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.data_ready.wait(timeout=remaining if remaining is not None else 0.5)
+        return True
+
+    def reader(self, start=None):
+        """New reader positioned at start (absolute), or at the newest audio"""
+        return AudioReader(self, self.position if start is None else start)
+
+    def start(self):
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        with self.data_ready:
+            self.data_ready.notify_all()
+
+
+class AudioReader:
+    """Independent cursor into an AudioSource's shared buffer"""
+
+    def __init__(self, source, position):
+        self.source = source
+        self.position = position
+        self.overruns = 0
+
+    def seek(self, position):
+        self.position = max(position, self.source.ring.oldest)
+
+    def skip_to_latest(self, keep=0):
+        """Drop stale audio, optionally keeping the last keep samples"""
+        self.seek(self.source.position - keep)
+
+    def read(self, count, timeout=None):
+        """Next count samples (a view into the shared buffer), or None on timeout/stop"""
+        if self.position < self.source.ring.oldest:
+            # Fell more than a buffer behind; the oldest audio is gone
+            self.overruns += 1
+            self.position = self.source.ring.oldest
+        if not self.source.wait_for(self.position + count, timeout):
+            return None
+        samples = self.source.ring.read(self.position, self.position + count)
+        self.position += count
+        return samples
+
+
+class MicrophoneSource(AudioSource):
+    def __init__(self, sample_rate=16000, blocksize=512, buffer_seconds=60, device=None):
+        super().__init__(sample_rate, blocksize, buffer_seconds)
+        self.device = device
+        self.stream = None
+
+    def callback(self, indata, frames, time_info, status):
+        self.push(indata[:, 0])
+
+    def start(self):
+        import sounddevice as sd
+        super().start()
+        self.stream = sd.InputStream(
+            samplerate=self.sample_rate,
+            blocksize=self.blocksize,
+            channels=1,
+            dtype=np.int16,
+            device=self.device,
+            callback=self.callback
+        )
+        self.stream.start()
+        logger.debug("Audio stream started")
+
+    def stop(self):
+        super().stop()
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+class ArraySource(AudioSource):
+    """Plays a fixed int16 signal into the buffer on a thread, then pads with silence"""
+
+    def __init__(self, samples, sample_rate=16000, blocksize=512, buffer_seconds=60,
+                 realtime=True, loop=False):
+        super().__init__(sample_rate, blocksize, buffer_seconds)
+        self.samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+        self.realtime = realtime
+        self.loop = loop
+        self.finished = threading.Event()
+        self.thread = None
+
+    def start(self):
+        super().start()
+        self.thread = threading.Thread(target=self.feed, daemon=True)
+        self.thread.start()
+
+    def feed(self):
+        silence = np.zeros(self.blocksize, dtype=np.int16)
+        block_seconds = self.blocksize / self.sample_rate
+        next_time = time.monotonic()
+        offset = 0
+        while self.running:
+            if offset < len(self.samples):
+                block = self.samples[offset:offset + self.blocksize]
+                offset += self.blocksize
+                if offset >= len(self.samples) and self.loop:
+                    offset = 0
+            else:
+                self.finished.set()
+                block = silence
+            self.push(block)
+            if self.realtime:
+                next_time += block_seconds
+                time.sleep(max(0.0, next_time - time.monotonic()))
+            elif self.finished.is_set():
+                # Nothing left to deliver faster than real time
+                self.realtime = True
+                next_time = time.monotonic()
+
+
+class WavFileSource(ArraySource):
+    def __init__(self, path, blocksize=512, buffer_seconds=60, realtime=True, loop=False):
+        samples, sample_rate = load_wav(path)
+        super().__init__(samples, sample_rate, blocksize, buffer_seconds, realtime, loop)
+
+
+class SyntheticSource(ArraySource):
+    """Silence, optionally with a tone burst; handy for smoke tests without hardware"""
+
+    def __init__(self, seconds=5.0, tone_hz=None, tone_start=1.0, tone_seconds=1.0,
+                 sample_rate=16000, **kwargs):
+        samples = np.zeros(int(seconds * sample_rate), dtype=np.float32)
+        if tone_hz:
+            t = np.arange(int(tone_seconds * sample_rate)) / sample_rate
+            start = int(tone_start * sample_rate)
+            samples[start:start + len(t)] = 8000 * np.sin(2 * np.pi * tone_hz * t)[:len(samples) - start]
+        super().__init__(samples.astype(np.int16), sample_rate, **kwargs)
+
+
+def load_wav(path):
+    """Read a 16-bit WAV file; returns (mono int16 samples, sample rate)"""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit samples")
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        channels = wav.getnchannels()
+        if channels > 1:
+            samples = samples.reshape(-1, channels)[:, 0]
+        return samples, wav.getframerate()
+
+
+def create_audio_source(config=None):
+    """Build the input source from the "audio_input" config section"""
+    config = dict(config or {})
+    source_type = config.pop("type", "microphone")
+    if source_type == "microphone":
+        return MicrophoneSource(**config)
+    if source_type == "wav":
+        return WavFileSource(**config)
+    if source_type == "synthetic":
+        return SyntheticSource(**config)
+    raise ValueError(f"Unknown audio input type '{source_type}'")
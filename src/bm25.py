@@ -0,0 +1,96 @@
+import math
+import re
+from collections import Counter
+
+
+TOKEN = re.compile(r"\w+")
+
+# Function words carry no lexical signal and would dilute the confidence estimate
+STOPWORDS = frozenset("""
+a an and are as at be but by can could did do does for from had has have he her him his how i
+if in into is it its me my of on or our she so than that the their them then there these they
+this to us was we were what when where which who why will with would you your about just
+""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring.
+
+    Documents are added and removed by id; postings are updated in place so
+    the index can follow the vector store incrementally.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.lengths = {}  # doc_id -> token count
+        self.doc_terms = {}  # doc_id -> its terms, so remove() needn't scan the vocabulary
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.lengths
+
+    def add(self, doc_id, text):
+        if doc_id in self.lengths:
+            self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        length = sum(counts.values())
+        self.lengths[doc_id] = length
+        self.total_length += length
+        self.doc_terms[doc_id] = list(counts)
+
+    def remove(self, doc_id):
+        if doc_id not in self.lengths:
+            return
+        for term in self.doc_terms.pop(doc_id):
+            docs = self.postings[term]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id)
+
+    def idf(self, term):
+        n = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.lengths) - n + 0.5) / (n + 0.5))
+
+    def search(self, query, k=3):
+        """Top k (doc_id, score, coverage) for query.
+
+        coverage is the share of the query's total IDF that the document
+        matches: 1.0 means every informative query term occurs in it.
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.lengths:
+            return []
+        average = self.total_length / len(self.lengths)
+        weights = {term: self.idf(term) for term in terms}
+        query_weight = sum(weights.values())
+        scores = {}
+        matched = {}
+        for term in terms:
+            idf = weights[term]
+            for doc_id, tf in self.postings.get(term, {}).items():
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+                matched[doc_id] = matched.get(doc_id, 0.0) + idf
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(doc_id, score, matched[doc_id] / query_weight) for doc_id, score in ranked]
+
+
+def reciprocal_rank_fusion(*rankings, k=60):
+    """Merge ranked id lists; ids ranked high in any list float to the top"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
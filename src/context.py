@@ -0,0 +1,172 @@
+import logging
+import threading
+from collections import deque
+from functools import lru_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message framing cost in chat requests (role, separators)
+MESSAGE_OVERHEAD = 4
+
+
+class TokenCounter:
+    """Counts tokens with tiktoken when it's available, else ~4 characters per token"""
+
+    def __init__(self, model="gpt-4"):
+        self.encoding = None
+        try:
+            import tiktoken
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # Not installed, or the vocabulary can't be fetched offline
+            logger.debug(f"tiktoken unavailable, estimating tokens from length: {e}")
+        self.count = lru_cache(maxsize=4096)(self.count_uncached)
+
+    def count_uncached(self, text):
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+
+    def message(self, message):
+        return self.count(message["content"]) + MESSAGE_OVERHEAD
+
+
+class ContextBuilder:
+    """Assembles each chat request within a token budget.
+
+    The request is the system prompt, a rolling summary of older turns,
+    retrieved history and as many of the last recent_turns exchanges as fit,
+    followed by the new utterance. Turns that fall out of the recent window
+    are folded into the summary on a background thread, so memory stays
+    bounded and no summarization call sits on the critical path.
+    """
+
+    def __init__(self, system_prompt, config=None, summarize=None, model="gpt-4"):
+        config = config or {}
+        self.system_prompt = system_prompt
+        self.max_prompt_tokens = config.get("max_prompt_tokens", 2000)
+        self.recent_turns = config.get("recent_turns", 6)
+        self.retrieval_tokens = config.get("retrieval_tokens", 600)
+        self.summary_tokens = config.get("summary_tokens", 250)
+        self.summarize_every = config.get("summarize_every", 4)
+        # summarize(previous_summary, messages) -> new summary text
+        self.summarize = summarize
+        self.tokens = TokenCounter(model)
+
+        self.recent = deque()
+        self.pending = []  # evicted messages not yet folded into the summary
+        self.in_flight = 0  # how many of pending's first messages a running summary covers
+        self.summary = ""
+        self.turns = 0
+        self.lock = threading.Lock()
+        self.summarizing = False
+
+    def add_exchange(self, user_text, assistant_text):
+        with self.lock:
+            self.recent.append({"role": "user", "content": user_text})
+            self.recent.append({"role": "assistant", "content": assistant_text})
+            self.turns += 1
+            while len(self.recent) > self.recent_turns * 2:
+                self.pending.append(self.recent.popleft())
+            # If summaries keep failing, forget the oldest turns rather than grow
+            limit = self.summarize_every * 2 * 4
+            if len(self.pending) > limit:
+                dropped = len(self.pending) - limit
+                logger.warning(f"Dropping {dropped} unsummarized messages")
+                del self.pending[:dropped]
+                self.in_flight = max(0, self.in_flight - dropped)
+            start_summary = (
+                self.summarize is not None
+                and not self.summarizing
+                and len(self.pending) >= self.summarize_every * 2
+            )
+            if start_summary:
+                self.summarizing = True
+                batch = list(self.pending)
+                self.in_flight = len(batch)
+        if start_summary:
+            threading.Thread(target=self.refresh_summary, args=(batch,), daemon=True).start()
+
+    def refresh_summary(self, batch):
+        try:
+            summary = self.summarize(self.summary, batch)
+            if summary:
+                with self.lock:
+                    self.summary = self.truncate(summary.strip(), self.summary_tokens)
+                    # Messages trimmed from the front meanwhile are no longer there
+                    del self.pending[:self.in_flight]
+                logger.debug(f"Conversation summary refreshed ({self.tokens.count(self.summary)} tokens)")
+        except Exception as e:
+            logger.error(f"Error summarizing conversation: {e}")
+        finally:
+            with self.lock:
+                self.summarizing = False
+                self.in_flight = 0
+
+    def truncate(self, text, max_tokens):
+        """Cut text down to about max_tokens, keeping the start"""
+        if self.tokens.count(text) <= max_tokens:
+            return text
+        if self.tokens.encoding is not None:
+            return self.tokens.encoding.decode(self.tokens.encoding.encode(text, disallowed_special=())[:max_tokens])
+        return text[:max_tokens * 4]
+
+    def build(self, text, relevant_history=None):
+        """Messages for a request about text; returns (messages, prompt token estimate)"""
+        with self.lock:
+            recent = list(self.recent)
+            summary = self.summary
+
+        user_message = {"role": "user", "content": text}
+        used = self.tokens.message(self.system_prompt) + self.tokens.message(user_message)
+        budget = self.max_prompt_tokens
+
+        # Newest turns first: they matter most for follow-up questions
+        history = []
+        for message in reversed(recent):
+            cost = self.tokens.message(message)
+            if used + cost > budget:
+                break
+            history.insert(0, message)
+            used += cost
+        # Never start the window on a dangling assistant reply
+        if history and history[0]["role"] == "assistant":
+            used -= self.tokens.message(history.pop(0))
+
+        summary_message = None
+        if summary:
+            candidate = {"role": "system", "content": "Summary of the earlier conversation:\n" + summary}
+            cost = self.tokens.message(candidate)
+            if used + cost <= budget:
+                summary_message = candidate
+                used += cost
+
+        context_message = None
+        if relevant_history:
+            # Skip chunks (single messages or question/answer pairs) already in the window
+            lines = [f"[{m['role']}]: {m['content']}" for m in history]
+            in_window = set(lines) | {"\n".join(lines[i:i + 2]) for i in range(len(lines) - 1)}
+            header = "Relevant conversation history:\n"
+            allowance = min(self.retrieval_tokens, budget - used) - self.tokens.count(header) - MESSAGE_OVERHEAD
+            chunks = []
+            for chunk in relevant_history:
+                if chunk in in_window:
+                    continue
+                cost = self.tokens.count(chunk) + 1
+                if cost > allowance:
+                    break
+                chunks.append(chunk)
+                allowance -= cost
+            if chunks:
+                context_message = {"role": "system", "content": header + "\n".join(chunks)}
+                used += self.tokens.message(context_message)
+
+        messages = [self.system_prompt]
+        messages += [m for m in (summary_message, context_message) if m is not None]
+        messages += history
+        messages.append(user_message)
+        return messages, used
@@ -0,0 +1,171 @@
+import logging
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+class ConversationLog:
+    """Append-only JSONL turn log written by a background thread.
+
+    append() only enqueues, so the caller never waits on disk. The writer
+    flushes every line and fsyncs in batches (every fsync_every records or
+    fsync_interval seconds, whichever comes first). A crash can at worst leave
+    a partial last line, which readers skip.
+
+    The file is only created once the first message is appended; header
+    (e.g. the system prompt) is written just before it, so a session with
+    no turns leaves nothing behind.
+    """
+
+    def __init__(self, path, fsync_every=16, fsync_interval=1.0, header=None):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.header = None
+        if header is not None:
+            self.header = dict(header)
+            self.header.setdefault("timestamp", datetime.now().isoformat())
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.pending = queue.Queue()
+        self.closed = False
+        self.writer = threading.Thread(target=self.write_loop, name="conversation-log", daemon=True)
+        self.writer.start()
+
+    def append(self, message):
+        """Queue a message dict for writing; a timestamp is added if missing"""
+        if self.closed:
+            raise ValueError("Conversation log is closed")
+        record = dict(message)
+        record.setdefault("timestamp", datetime.now().isoformat())
+        self.pending.put(record)
+
+    def flush(self, wait=False):
+        """Ask the writer to fsync now; optionally block until it has"""
+        done = threading.Event()
+        self.pending.put(done)
+        if wait:
+            done.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.put(None)
+        self.writer.join()
+
+    def write_loop(self):
+        f = None
+        unsynced = 0
+        last_sync = time.monotonic()
+        try:
+            while True:
+                try:
+                    item = self.pending.get(timeout=self.fsync_interval)
+                except queue.Empty:
+                    item = False
+
+                if isinstance(item, dict):
+                    try:
+                        if f is None:
+                            f = open(self.path, "a", encoding="utf-8")
+                            if self.header is not None:
+                                f.write(json.dumps(self.header, ensure_ascii=False) + "\n")
+                        f.write(json.dumps(item, ensure_ascii=False) + "\n")
+                        f.flush()
+                        unsynced += 1
+                    except Exception as e:
+                        logger.error(f"Error writing conversation log: {e}")
+
+                sync_due = unsynced and (
+                    unsynced >= self.fsync_every
+                    or time.monotonic() - last_sync >= self.fsync_interval
+                    or not isinstance(item, dict)
+                )
+                if sync_due:
+                    os.fsync(f.fileno())
+                    unsynced = 0
+                    last_sync = time.monotonic()
+
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is None:
+                    return
+        finally:
+            if f is not None:
+                f.close()
+
+
+def read_log(path, offset=0):
+    """Stream (message, next_offset) pairs from a JSONL log starting at a byte offset.
+
+    Only complete lines are returned, so a reader can remember next_offset
+    and resume later to pick up turns appended since.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Partial line from a writer still (or never) finishing it
+                break
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line), offset
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping corrupt line in {path}: {e}")
+
+
+def migrate_json_history(history_dir="history", keep_originals=True):
+    """Convert legacy history/*.json sessions into .jsonl logs (one-time, idempotent).
+
+    Originals are renamed to *.json.migrated (or deleted with keep_originals=False)
+    so nothing is indexed twice.
+    """
+    migrated = 0
+    if not os.path.isdir(history_dir):
+        return migrated
+    for filename in sorted(os.listdir(history_dir)):
+        if not filename.endswith(".json"):
+            continue
+        source = os.path.join(history_dir, filename)
+        target = source[:-len(".json")] + ".jsonl"
+        try:
+            with open(source, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            timestamp = data.get("timestamp")
+            tmp_path = target + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for message in data.get("conversation", []):
+                    record = dict(message)
+                    if timestamp:
+                        record.setdefault("timestamp", timestamp)
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, target)
+            if keep_originals:
+                os.replace(source, source + ".migrated")
+            else:
+                os.remove(source)
+            migrated += 1
+        except Exception as e:
+            logger.error(f"Error migrating {filename}: {e}")
+    if migrated:
+        logger.info(f"Migrated {migrated} conversation files to JSONL")
+    return migrated
+
+
+if __name__ == "__main__":
+    # python -m src.conversation_log migrate [history_dir]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        migrate_json_history(sys.argv[2] if len(sys.argv) > 2 else "history")
+    else:
+        print("usage: python -m src.conversation_log migrate [history_dir]")
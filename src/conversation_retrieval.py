@@ -1,110 +1,541 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import OpenAIEmbeddings
+from .embeddings import create_embeddings
+from .conversation_log import read_log
+from .tracing import NULL_TRACE
+from .bm25 import BM25Index, reciprocal_rank_fusion
+from .vector_store import ShardedVectorStore
+from .ingest import IngestPipeline
+import logging
+import hashlib
 import json
 import os
 import shutil
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 3
+
+
+def split_text(text, chunk_size=1000, chunk_overlap=200):
+    """Split text into chunks of at most chunk_size characters, preferring
+    line, sentence and word boundaries, with chunk_overlap characters shared
+    between neighbours"""
+    chunks = []
+    start = 0
+    while len(text) - start > chunk_size:
+        window = text[start:start + chunk_size]
+        cut = -1
+        for separator in ("\n", ". ", " "):
+            cut = window.rfind(separator)
+            if cut > chunk_overlap:
+                cut += len(separator)
+                break
+        if cut <= chunk_overlap:
+            cut = chunk_size
+        chunks.append(window[:cut].strip())
+        next_start = start + cut - chunk_overlap
+        # Begin the overlap on a word boundary
+        space = text.find(" ", next_start, start + cut)
+        start = space + 1 if space != -1 else start + cut
+    tail = text[start:].strip()
+    if tail:
+        chunks.append(tail)
+    return chunks
+
+
+class DocumentLog:
+    """Chunk texts behind the lexical index, as an append-only JSONL log.
+
+    An added chunk is a {"id", "text", "session", "timestamp"} record and a
+    removed one an {"id", "deleted": true} tombstone; replaying the log gives
+    the current documents. Changes are buffered until flush(), so a save only
+    writes what changed since the last one. Once dead records outnumber the
+    live ones the log is rewritten from the live documents.
+    """
+
+    def __init__(self, path, min_compact=1000):
+        self.path = path
+        self.min_compact = min_compact
+        self.pending = []
+        self.records = 0  # lines in the file, live or dead
+
+    def load(self):
+        """Replay the log into {chunk id: document}; None if there is no log"""
+        if not os.path.exists(self.path):
+            return None
+        documents = {}
+        self.records = 0
+        end = 0
+        for record, end in read_log(self.path):
+            self.records += 1
+            chunk_id = record.pop("id")
+            if record.get("deleted"):
+                documents.pop(chunk_id, None)
+            else:
+                documents[chunk_id] = record
+        if os.path.getsize(self.path) > end:
+            # A save cut short leaves a partial line; drop it so appends start clean
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+        self.pending = []
+        return documents
+
+    def add(self, chunk_id, document):
+        self.pending.append(dict(document, id=chunk_id))
+
+    def remove(self, chunk_id):
+        self.pending.append({"id": chunk_id, "deleted": True})
+
+    def flush(self, documents):
+        """Write buffered changes; documents (the live set) is used when compacting"""
+        if self.records + len(self.pending) - len(documents) > max(self.min_compact, len(documents)):
+            self.rewrite(documents)
+            return
+        if not self.pending:
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for record in self.pending:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.records += len(self.pending)
+        self.pending = []
+
+    def rewrite(self, documents):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for chunk_id, document in documents.items():
+                f.write(json.dumps(dict(document, id=chunk_id), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.records = len(documents)
+        self.pending = []
+
+
 class ConversationRetrieval:
-    def __init__(self, history_dir="history"):
+    def __init__(self, history_dir="history", persist_directory="./chroma_db", embedding_config=None,
+                 retrieval_config=None, refresh=True, embeddings=None):
+        retrieval_config = retrieval_config or {}
         self.history_dir = history_dir
-        self.embeddings = OpenAIEmbeddings()
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
-        
+        self.persist_directory = persist_directory
+        self.manifest_path = os.path.join(self.persist_directory, "index_manifest.json")
+        self.document_log = DocumentLog(os.path.join(self.persist_directory, "documents.jsonl"))
+        # An embeddings instance can be shared between retrievers (one per client in server mode)
+        self.embeddings = embeddings or create_embeddings(embedding_config)
+        # Lexical hits this confident (share of query IDF matched, lead over the
+        # runner-up) are returned without embedding the query at all
+        self.lexical_confidence = retrieval_config.get("lexical_confidence", 0.75)
+        self.lexical_margin = retrieval_config.get("lexical_margin", 1.5)
+        self.candidates = retrieval_config.get("candidates", 8)
+        # "sharded" is the built-in memory-mapped index; "chroma" goes through langchain
+        self.vector_backend = retrieval_config.get("vector_backend", "chroma")
+        self.vector_index_config = retrieval_config.get("vector_index", {})
+        self.ingest_config = retrieval_config.get("ingest", {})
+        # chunk id -> {"text", "session", "timestamp"}; mirrors the vector store
+        self.documents = {}
+        self.lexical = BM25Index()
         # Ensure history directory exists
         os.makedirs(self.history_dir, exist_ok=True)
-        
+
         # Initialize vector store
-        self.refresh_vector_store()
-        print("Conversation retrieval initialized!")
+        if refresh:
+            self.refresh_vector_store()
+        logger.info("Conversation retrieval initialized!")
+
+    @staticmethod
+    def is_history_file(filename):
+        return filename.endswith('.jsonl') or filename.endswith('.json')
+
+    @staticmethod
+    def group_turns(records, final=False):
+        """Pair each user message with the replies that follow it.
+
+        records are (message, byte offset where it starts) pairs. Returns
+        (turns, start offset of a trailing question that has no answer yet, or
+        None); each turn is {"text", "timestamp"} with one "[role]: content"
+        line per message. With final=True a trailing question is kept as is.
+        """
+        turns = []
+        current = None
+        for msg, start in records:
+            role = msg.get('role')
+            if role in (None, 'system'):
+                continue
+            line = f"[{role}]: {msg['content']}"
+            if role == 'user' or current is None:
+                if current is not None:
+                    turns.append(current)
+                current = {"lines": [line], "timestamp": msg.get('timestamp', ''), "start": start, "answered": False}
+            else:
+                current["lines"].append(line)
+                current["answered"] = True
+
+        pending_from = None
+        if current is not None:
+            if final or current["answered"] or current["lines"][0].startswith("[assistant]"):
+                turns.append(current)
+            else:
+                pending_from = current["start"]
+        turns = [{"text": "\n".join(turn["lines"]), "timestamp": turn["timestamp"]} for turn in turns]
+        return turns, pending_from
+
+    def load_conversation_file(self, file_path, offset=0):
+        """Load question/answer turns from a session file.
+
+        JSONL logs are read from the byte offset onward so appended turns can
+        be tailed; a trailing question whose answer hasn't been written yet is
+        left for the next read. Returns (turns, offset to resume from).
+        """
+        if file_path.endswith('.jsonl'):
+            records = []
+            start = offset
+            for msg, offset in read_log(file_path, offset):
+                records.append((msg, start))
+                start = offset
+            turns, pending_from = self.group_turns(records)
+            return turns, offset if pending_from is None else pending_from
+
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        timestamp = data.get('timestamp', '')
+        records = [(dict(msg, timestamp=msg.get('timestamp', timestamp)), 0) for msg in data.get('conversation', [])]
+        turns, _ = self.group_turns(records, final=True)
+        return turns, os.path.getsize(file_path)
 
     def load_conversation_files(self):
-        """Load all conversations from JSON files"""
+        """Load all conversations from the history directory"""
         conversations = []
         try:
             for filename in os.listdir(self.history_dir):
-                if filename.endswith('.json'):
+                if self.is_history_file(filename):
                     file_path = os.path.join(self.history_dir, filename)
                     try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            for msg in data.get('conversation', []):
-                                if msg['role'] != 'system':
-                                    formatted_msg = f"[{msg['role']}]: {msg['content']}"
-                                    conversations.append(formatted_msg)
+                        turns, _ = self.load_conversation_file(file_path)
+                        conversations.extend(turn["text"] for turn in turns)
                     except Exception as e:
-                        print(f"Error reading file {filename}: {e}")
+                        logger.error(f"Error reading file {filename}: {e}")
                         continue
-            
-            print(f"Loaded {len(conversations)} messages from {len(os.listdir(self.history_dir))} files")
+
+            logger.info(f"Loaded {len(conversations)} turns from {len(os.listdir(self.history_dir))} files")
             return conversations
-            
+
         except Exception as e:
-            print(f"Error loading conversation files: {e}")
+            logger.error(f"Error loading conversation files: {e}")
             return []
 
-    def refresh_vector_store(self):
-        """Create new vector store from current history"""
+    @staticmethod
+    def message_keys(messages, seen=None):
+        """Content hash per message, suffixed with its occurrence count so repeats stay distinct.
+
+        seen carries occurrence counts over from messages that were already keyed.
+        """
+        seen = {} if seen is None else seen
+        keys = []
+        for message in messages:
+            digest = hashlib.sha256(message.encode('utf-8')).hexdigest()[:32]
+            seen[digest] = seen.get(digest, 0) + 1
+            keys.append(f"{digest}:{seen[digest]}")
+        return keys
+
+    def load_manifest(self):
+        """Load the record of which files and messages are already embedded"""
         try:
-            # Remove old vector store if exists
-            if os.path.exists("./chroma_db"):
-                shutil.rmtree("./chroma_db")
-                print("Cleared previous vector store")
-
-            # Load conversations
-            conversations = self.load_conversation_files()
-            if not conversations:
-                print("No conversations found in history")
-                self.vector_store = None
-                return
-
-            # Create new vector store
-            print("Creating new vector store...")
-            docs = self.text_splitter.create_documents(conversations)
-            self.vector_store = Chroma.from_documents(
-                documents=docs,
-                embedding=self.embeddings,
-                persist_directory="./chroma_db"
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            # Vectors from a different embedding model (or chunking) can't share an index
+            if (manifest.get("version") == MANIFEST_VERSION
+                    and manifest.get("embedding_model") == self.embeddings.model_name
+                    and manifest.get("vector_backend") == self.vector_backend):
+                return manifest
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error reading index manifest, rebuilding: {e}")
+        return None
+
+    def save_manifest(self, manifest):
+        """Write the chunk texts added or removed since the last save, then the index manifest"""
+        # Chunk texts first: the manifest never refers to chunks the log lacks
+        self.document_log.flush(self.documents)
+
+        manifest["updated"] = datetime.now().isoformat()
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def load_documents(self):
+        """Load chunk texts saved with the manifest and rebuild the BM25 index; False if missing"""
+        try:
+            documents = self.document_log.load()
+            if documents is None:
+                documents = self.migrate_lexical_index()
+        except Exception as e:
+            logger.error(f"Error reading lexical index, rebuilding: {e}")
+            return False
+        if documents is None:
+            return False
+        self.documents = documents
+        self.lexical = BM25Index()
+        for chunk_id, document in self.documents.items():
+            self.lexical.add(chunk_id, document["text"])
+        return True
+
+    def migrate_lexical_index(self):
+        """Convert a lexical_index.json from before the document log; None if there is none"""
+        legacy_path = os.path.join(self.persist_directory, "lexical_index.json")
+        if not os.path.exists(legacy_path):
+            return None
+        with open(legacy_path, 'r', encoding='utf-8') as f:
+            documents = json.load(f)
+        self.document_log.rewrite(documents)
+        os.remove(legacy_path)
+        return documents
+
+    def add_document(self, chunk_id, text, session, timestamp):
+        self.documents[chunk_id] = {"text": text, "session": session, "timestamp": timestamp}
+        self.document_log.add(chunk_id, self.documents[chunk_id])
+        self.lexical.add(chunk_id, text)
+
+    def remove_document(self, chunk_id):
+        if self.documents.pop(chunk_id, None) is not None:
+            self.document_log.remove(chunk_id)
+        self.lexical.remove(chunk_id)
+
+    def open_index(self, rebuild=False):
+        """Open the vector store and return its manifest, starting over if it can't be trusted"""
+        manifest = None if rebuild else self.load_manifest()
+        if manifest is not None and not self.load_documents():
+            manifest = None
+        if manifest is None:
+            self.documents = {}
+            self.lexical = BM25Index()
+            self.document_log = DocumentLog(self.document_log.path)
+        if manifest is None and os.path.exists(self.persist_directory):
+            # No usable manifest means we can't tell what the index holds
+            shutil.rmtree(self.persist_directory)
+            logger.info("Cleared previous vector store")
+        if manifest is None:
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "embedding_model": self.embeddings.model_name,
+                "vector_backend": self.vector_backend,
+                "files": {}
+            }
+        os.makedirs(self.persist_directory, exist_ok=True)
+        self.vector_store = self.open_vector_store()
+        return manifest
+
+    def drop_chunks(self, chunk_ids):
+        if not chunk_ids:
+            return
+        self.vector_store.delete(ids=chunk_ids)
+        for chunk_id in chunk_ids:
+            self.remove_document(chunk_id)
+        logger.info(f"Removed {len(chunk_ids)} stale chunks")
+
+    def changed_files(self, manifest):
+        """Diff the history directory against the manifest, one file at a time.
+
+        Chunks from deleted files and from turns edited out of a file are
+        removed right away. For each new or changed file, yields (filename,
+        chunks to embed, {"mtime", "size", "offset"} to record once they are
+        all stored). Until then the file's entry lists only the turns already
+        indexed, so an interrupted run re-reads the file and skips those.
+        """
+        indexed_files = manifest["files"]
+        current_files = {
+            filename for filename in os.listdir(self.history_dir)
+            if self.is_history_file(filename)
+        }
+
+        # Drop everything that came from files which no longer exist
+        stale_ids = []
+        for filename in set(indexed_files) - current_files:
+            for chunk_ids in indexed_files.pop(filename)["turns"].values():
+                stale_ids.extend(chunk_ids)
+        self.drop_chunks(stale_ids)
+
+        for filename in sorted(current_files):
+            file_path = os.path.join(self.history_dir, filename)
+            stat = os.stat(file_path)
+            entry = indexed_files.get(filename)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                continue
+
+            # A log that only grew can be tailed from where we stopped last time
+            tail = (
+                entry is not None
+                and filename.endswith('.jsonl')
+                and "offset" in entry
+                and stat.st_size >= entry["size"]
             )
-            print(f"Vector store created with {len(docs)} chunks")
+            try:
+                turns, offset = self.load_conversation_file(
+                    file_path, entry["offset"] if tail else 0
+                )
+            except Exception as e:
+                logger.error(f"Error reading file {filename}: {e}")
+                continue
+
+            if tail:
+                file_turns = entry["turns"]
+                indexed_turns = {}
+                seen = {}
+                for key in file_turns:
+                    digest, count = key.rsplit(":", 1)
+                    seen[digest] = max(seen.get(digest, 0), int(count))
+            else:
+                file_turns = {}
+                indexed_turns = entry["turns"] if entry else {}
+                seen = None
+            session = os.path.splitext(filename)[0]
+            keys = self.message_keys([turn["text"] for turn in turns], seen)
+            new_chunks = []
+            for key, turn in zip(keys, turns):
+                if key in indexed_turns:
+                    file_turns[key] = indexed_turns.pop(key)
+                    continue
+                # A question and its answer stay together unless the pair is very long
+                chunks = split_text(turn["text"])
+                for i, chunk in enumerate(chunks):
+                    new_chunks.append({
+                        "chunk_id": hashlib.sha256(f"{filename}|{key}|{i}".encode('utf-8')).hexdigest(),
+                        "text": chunk,
+                        "session": session,
+                        "timestamp": turn["timestamp"] or "",
+                        "turn": key
+                    })
+
+            # Whatever is left was edited out of the file
+            self.drop_chunks([chunk_id for chunk_ids in indexed_turns.values() for chunk_id in chunk_ids])
+            state = {"mtime": stat.st_mtime, "size": stat.st_size, "offset": offset}
+            if not new_chunks:
+                indexed_files[filename] = dict(state, turns=file_turns)
+                continue
+            # No offset: a partially indexed file is always re-read in full
+            indexed_files[filename] = {"mtime": None, "size": None, "turns": file_turns}
+            yield filename, new_chunks, state
 
+    def refresh_vector_store(self, rebuild=False):
+        """Bring the persistent vector store up to date with the history directory.
+
+        Only turns from new or changed files are embedded; entries whose
+        source files (or turns) are gone are removed. Embedded batches are
+        committed as they finish, so a failed or interrupted refresh keeps
+        its progress and the next one resumes. Pass rebuild=True to start
+        over from an empty index. Returns the ingest stats, or None on error.
+        """
+        try:
+            manifest = self.open_index(rebuild)
         except Exception as e:
-            print(f"Error creating vector store: {e}")
+            logger.error(f"Error opening vector store: {e}")
             self.vector_store = None
+            return None
+
+        try:
+            stats = IngestPipeline(self, self.ingest_config).run(manifest)
+            if isinstance(self.vector_store, ShardedVectorStore):
+                self.vector_store.compact()
+        except Exception as e:
+            # Committed batches stay searchable; the rest is picked up next time
+            logger.error(f"Error updating vector store, keeping {len(self.documents)} indexed chunks: {e}")
+            return None
+
+        indexed_files = manifest["files"]
+        total_chunks = sum(
+            len(chunk_ids)
+            for entry in indexed_files.values()
+            for chunk_ids in entry["turns"].values()
+        )
+        logger.info(f"Vector store ready with {total_chunks} chunks from {len(indexed_files)} files")
+        logger.debug(f"Embedding cache: {self.embeddings.stats()}")
+        return stats
 
-    def get_relevant_history(self, query, k=3):
-        """Get relevant conversation chunks"""
+    def open_vector_store(self):
+        if self.vector_backend == "sharded":
+            return ShardedVectorStore(
+                self.embeddings,
+                os.path.join(self.persist_directory, "vectors"),
+                **self.vector_index_config
+            )
+        if self.vector_backend != "chroma":
+            raise ValueError(f"Unknown vector backend '{self.vector_backend}', expected chroma or sharded")
+        # langchain is only imported when Chroma is actually used
+        from langchain_community.vectorstores import Chroma
+        return Chroma(
+            embedding_function=self.embeddings,
+            persist_directory=self.persist_directory
+        )
+
+    def lexically_confident(self, hits):
+        """True when the best BM25 hit covers the query and clearly beats the runner-up"""
+        if not hits or hits[0][2] < self.lexical_confidence:
+            return False
+        return len(hits) == 1 or hits[0][1] >= self.lexical_margin * hits[1][1]
+
+    def get_relevant_history(self, query, k=3, trace=NULL_TRACE, query_vector=None, embed=None):
+        """Get relevant conversation turns: BM25 first, fused with vector search when needed.
+
+        Pass query_vector if the caller already embedded the query, or embed
+        (a callable returning the vector) to embed it the caller's way only if
+        the lexical index isn't confident (e.g. to share it with the response
+        cache).
+        """
         try:
             if not hasattr(self, 'vector_store') or self.vector_store is None:
-                print("No vector store available")
+                logger.info("No vector store available")
                 return []
 
-            results = self.vector_store.similarity_search(query, k=k)
-            return [doc.page_content for doc in results]
+            with trace.span("lexical_search"):
+                hits = self.lexical.search(query, k=self.candidates)
+            if self.lexically_confident(hits):
+                # Names, dates and other exact terms: no embedding round-trip needed
+                logger.debug(f"Lexical hit (coverage {hits[0][2]:.2f}), skipping embedding")
+                return [self.documents[doc_id]["text"] for doc_id, _, _ in hits[:k]]
+
+            # Embed and search separately so each shows up in the turn trace
+            if query_vector is None and embed is not None:
+                query_vector = embed()
+            if query_vector is None:
+                with trace.span("embedding"):
+                    query_vector = self.embeddings.embed_query(query)
+            with trace.span("vector_search"):
+                results = self.vector_store.similarity_search_by_vector(query_vector, k=self.candidates)
+            texts = {}
+            vector_ranking = []
+            for doc in results:
+                doc_id = doc.metadata.get("chunk_id", doc.page_content) if doc.metadata else doc.page_content
+                texts[doc_id] = doc.page_content
+                vector_ranking.append(doc_id)
+            for doc_id, _, _ in hits:
+                texts.setdefault(doc_id, self.documents[doc_id]["text"])
+            fused = reciprocal_rank_fusion(vector_ranking, [doc_id for doc_id, _, _ in hits])
+            return [texts[doc_id] for doc_id in fused[:k]]
 
         except Exception as e:
-            print(f"Error retrieving history: {e}")
+            logger.error(f"Error retrieving history: {e}")
             return []
 
     def clear_history(self, delete_files=False):
-        """Clear vector store and optionally delete JSON files"""
+        """Clear vector store and optionally delete conversation files"""
         try:
-            # Always clear vector store
-            if os.path.exists("./chroma_db"):
-                shutil.rmtree("./chroma_db")
-                print("Cleared vector store")
+            # Always clear vector store (the manifest lives inside it)
+            self.vector_store = None
+            self.documents = {}
+            self.lexical = BM25Index()
+            self.document_log = DocumentLog(self.document_log.path)
+            if os.path.exists(self.persist_directory):
+                shutil.rmtree(self.persist_directory)
+                logger.info("Cleared vector store")
 
             # Optionally delete JSON files
             if delete_files:
                 for file in os.listdir(self.history_dir):
-                    if file.endswith('.json'):
+                    if self.is_history_file(file):
                         os.remove(os.path.join(self.history_dir, file))
-                print("Deleted conversation files")
+                logger.info("Deleted conversation files")
 
         except Exception as e:
-            print(f"Error clearing history: {e}")
+            logger.error(f"Error clearing history: {e}")
@@ -0,0 +1,225 @@
+import logging
+import numpy as np
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBackend:
+    """Turns a batch of texts into vectors. Subclasses set model_name."""
+    model_name = None
+
+    def embed(self, texts):
+        raise NotImplementedError
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, model="text-embedding-ada-002", **options):
+        from langchain_community.embeddings import OpenAIEmbeddings
+        self.model_name = f"openai/{model}"
+        # options pass straight through, e.g. openai_api_base or check_embedding_ctx_length
+        self.client = OpenAIEmbeddings(model=model, **options)
+
+    def embed(self, texts):
+        return self.client.embed_documents(texts)
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """Sentence embeddings from a small transformer run on CPU (mean pooled)"""
+
+    def __init__(self, model="sentence-transformers/all-MiniLM-L6-v2", batch_size=32):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        logger.info(f"Loading local embedding model {model}...")
+        self.torch = torch
+        self.model_name = f"local/{model}"
+        self.batch_size = batch_size
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.model = AutoModel.from_pretrained(model)
+        self.model.eval()
+
+    def embed(self, texts):
+        vectors = []
+        with self.torch.no_grad():
+            for start in range(0, len(texts), self.batch_size):
+                batch = self.tokenizer(
+                    texts[start:start + self.batch_size],
+                    padding=True,
+                    truncation=True,
+                    return_tensors="pt"
+                )
+                output = self.model(**batch).last_hidden_state
+                mask = batch["attention_mask"].unsqueeze(-1).to(output.dtype)
+                pooled = (output * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                pooled = self.torch.nn.functional.normalize(pooled, dim=1)
+                vectors.extend(pooled.numpy().tolist())
+        return vectors
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Dependency-free bag-of-words feature hashing. Useful offline and in benchmarks."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+        self.model_name = f"hashing/{dim}"
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+                value = int.from_bytes(digest, 'little')
+                vectors[row, value % self.dim] += 1.0 if value & (1 << 63) else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.maximum(norms, 1e-9)
+        return vectors.tolist()
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by hash(model, text) with LRU eviction"""
+
+    def __init__(self, path="cache/embeddings.sqlite3", max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings(last_used)")
+        self.db.commit()
+
+    @staticmethod
+    def make_key(model_name, text):
+        return hashlib.sha256(f"{model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: vector} for the keys that are cached, refreshing their LRU stamp"""
+        found = {}
+        with self.lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self.db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self.db.commit()
+        return found
+
+    def put_many(self, items):
+        """Store (key, vector) pairs and evict least recently used entries over the cap"""
+        now = time.time()
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+            )
+            count = self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self.db.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM embeddings")
+            self.db.commit()
+
+
+class CachedEmbeddings:
+    """LangChain-compatible embeddings (embed_documents/embed_query) that consult
+    the cache before calling the backend"""
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache
+        self.model_name = backend.model_name
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        if self.cache is None:
+            self.misses += len(texts)
+            return self.backend.embed(list(texts))
+
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        cached = self.cache.get_many(list(set(keys)))
+
+        # Embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = self.backend.embed(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+
+BACKENDS = {
+    "openai": OpenAIEmbeddingBackend,
+    "local": LocalEmbeddingBackend,
+    "hashing": HashingEmbeddingBackend,
+}
+
+
+def create_embeddings(config=None):
+    """Build cached embeddings from the "embeddings" section of the assistant config.
+
+    Options for the backend live in a sub-section named after it, e.g.
+    {"backend": "local", "local": {"model": ...}}, so switching backends
+    never hands one backend another's options.
+    """
+    config = config or {}
+    backend_name = config.get("backend", "openai")
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend_name}', expected one of {sorted(BACKENDS)}")
+    ignored = set(config) - {"backend", "cache_path", "cache_max_entries"} - set(BACKENDS)
+    if ignored:
+        logger.warning(f"Ignoring embeddings options {sorted(ignored)}; backend options go under \"{backend_name}\"")
+
+    backend = BACKENDS[backend_name](**config.get(backend_name, {}))
+    cache_path = config.get("cache_path", "cache/embeddings.sqlite3")
+    max_entries = config.get("cache_max_entries", 100000)
+    cache = EmbeddingCache(cache_path, max_entries=max_entries) if cache_path else None
+    return CachedEmbeddings(backend, cache)
@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdleMonitor:
+    """Tracks the time spent waiting for the wake word and pages models out meanwhile.
+
+    enter() marks the start of an idle stretch, tick() is called from the
+    listen loop and unloads the page_out components once the assistant has
+    been idle for page_out_after_seconds (None keeps them resident), and
+    wake() reports the stretch (CPU %, share of frames the wake word engine
+    actually ran on) and reloads what was paged out in the background,
+    logging how long it took to be ready again.
+    """
+
+    def __init__(self, components, detector, config=None):
+        config = config or {}
+        self.components = components
+        self.detector = detector
+        self.page_out_after = config.get("page_out_after_seconds")
+        self.page_out = config.get("page_out", ["stt", "tts"])
+
+        self.started = None
+        self.cpu_started = None
+        self.frames_started = None
+        self.paged = []
+        self.lock = threading.Lock()
+
+        self.idle_seconds = 0.0
+        self.idle_cpu_seconds = 0.0
+        self.page_outs = 0
+        self.last_wake_to_ready = None
+
+    def enter(self):
+        self.started = time.monotonic()
+        self.cpu_started = time.process_time()
+        self.frames_started = self.detector.stats()
+
+    def tick(self):
+        """Page the configured components out once idle long enough"""
+        if self.started is None or self.page_out_after is None or self.paged:
+            return
+        if time.monotonic() - self.started < self.page_out_after:
+            return
+        for name in self.page_out:
+            component = self.components.get(name)
+            if component is not None and component.loaded:
+                component.unload()
+                self.paged.append(name)
+        if self.paged:
+            self.page_outs += 1
+            logger.info(f"Idle for {self.page_out_after:.0f}s: paged out {', '.join(self.paged)}")
+
+    def wake(self):
+        """End the idle stretch: log it and bring paged-out components back"""
+        if self.started is None:
+            return
+        now = time.monotonic()
+        idle = now - self.started
+        cpu = time.process_time() - self.cpu_started
+        frames = self.detector.stats()
+        processed = frames["frames_processed"] - self.frames_started["frames_processed"]
+        gated = frames["frames_gated"] - self.frames_started["frames_gated"]
+        self.started = None
+        with self.lock:
+            self.idle_seconds += idle
+            self.idle_cpu_seconds += cpu
+        logger.info(
+            f"Idle {idle:.1f}s at {100 * cpu / max(idle, 1e-9):.1f}% CPU; "
+            f"wake word engine ran on {processed}/{processed + gated} frames"
+        )
+
+        paged, self.paged = self.paged, []
+        if paged:
+            futures = [self.components[name].reload() for name in paged]
+            threading.Thread(target=self.wait_ready, args=(paged, futures, now), daemon=True).start()
+
+    def wait_ready(self, names, futures, woke):
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error reloading after idle: {e}")
+        seconds = time.monotonic() - woke
+        with self.lock:
+            self.last_wake_to_ready = seconds
+        logger.info(f"Wake to ready: {seconds:.2f}s (reloaded {', '.join(names)})")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "idle_seconds": round(self.idle_seconds, 1),
+                "idle_cpu_percent": round(100 * self.idle_cpu_seconds / max(self.idle_seconds, 1e-9), 2),
+                "page_outs": self.page_outs,
+                "wake_to_ready_seconds": (
+                    None if self.last_wake_to_ready is None else round(self.last_wake_to_ready, 2)
+                ),
+                "detector": self.detector.stats(),
+            }
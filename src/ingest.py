@@ -0,0 +1,260 @@
+import argparse
+import json
+import logging
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .context import TokenCounter
+from .llm_client import RETRYABLE_STATUS
+
+
+logger = logging.getLogger(__name__)
+
+
+def status_of(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def rate_limited(error):
+    return status_of(error) == 429 or "rate limit" in str(error).lower()
+
+
+def retryable(error):
+    """Rate limits, server errors and connection trouble; not bad requests or auth"""
+    status = status_of(error)
+    return status is None or status in RETRYABLE_STATUS or status >= 500
+
+
+def retry_after(error):
+    """Seconds from a Retry-After header on the error's response, if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def store_vectors(vector_store, chunks, vectors):
+    """Add precomputed embeddings to the store; ids already present are replaced"""
+    texts = [chunk["text"] for chunk in chunks]
+    ids = [chunk["chunk_id"] for chunk in chunks]
+    metadatas = [
+        {"chunk_id": chunk["chunk_id"], "session": chunk["session"], "timestamp": chunk["timestamp"]}
+        for chunk in chunks
+    ]
+    if hasattr(vector_store, "add_embeddings"):
+        vector_store.add_embeddings(texts, vectors, metadatas, ids)
+    else:
+        # langchain's Chroma wrapper only stores what it embeds itself, so go to its collection
+        vector_store._collection.upsert(
+            ids=ids,
+            embeddings=[[float(x) for x in vector] for vector in vectors],
+            documents=texts,
+            metadatas=metadatas
+        )
+
+
+class IngestPipeline:
+    """Embeds new history chunks in concurrent batches and commits each batch as it lands.
+
+    Chunks stream in file by file from ConversationRetrieval.changed_files()
+    and are grouped into batches of at most max_batch_tokens tokens and
+    max_batch_size chunks, never splitting a turn, so a turn is either
+    stored whole or not at all. Up to concurrency batches are embedded at
+    once; a rate limit halves that (and pauses for Retry-After or a jittered
+    backoff), and it creeps back up one step per window of clean batches.
+    A finished batch goes straight into the vector store and its turns into
+    the manifest, which is saved every commit_interval_seconds and on exit,
+    so an interrupted run loses at most the batches still in flight.
+    """
+
+    def __init__(self, retrieval, config=None):
+        config = config or {}
+        self.retrieval = retrieval
+        self.max_batch_tokens = config.get("max_batch_tokens", 8000)
+        self.max_batch_size = config.get("max_batch_size", 256)
+        self.concurrency = config.get("concurrency", 4)
+        self.max_retries = config.get("max_retries", 6)
+        self.backoff_base = config.get("backoff_base_seconds", 1.0)
+        self.backoff_max = config.get("backoff_max_seconds", 60.0)
+        self.commit_interval = config.get("commit_interval_seconds", 5.0)
+        self.tokens = TokenCounter(config.get("tokenizer_model", "text-embedding-ada-002"))
+
+        self.files = {}  # filename -> progress of a file whose turns aren't all stored yet
+        self.counts = {"chunks": 0, "batches": 0, "files": 0, "retries": 0, "rate_limited": 0}
+
+    def batches(self, manifest):
+        """Token-bounded batches of whole turns, registering each file's progress as it is read"""
+        batch, batch_tokens = [], 0
+        for filename, chunks, state in self.retrieval.changed_files(manifest):
+            turns = {}
+            for chunk in chunks:
+                chunk["file"] = filename
+                turns.setdefault(chunk["turn"], []).append(chunk)
+            self.files[filename] = {"state": state, "pending": len(turns)}
+            for turn in turns.values():
+                cost = sum(self.tokens.count(chunk["text"]) for chunk in turn)
+                full = batch_tokens + cost > self.max_batch_tokens or len(batch) + len(turn) > self.max_batch_size
+                if batch and full:
+                    yield batch
+                    batch, batch_tokens = [], 0
+                batch.extend(turn)
+                batch_tokens += cost
+        if batch:
+            yield batch
+
+    def embed(self, batch):
+        return self.retrieval.embeddings.embed_documents([chunk["text"] for chunk in batch])
+
+    def commit(self, manifest, batch, vectors):
+        store_vectors(self.retrieval.vector_store, batch, vectors)
+        turns = {}
+        for chunk in batch:
+            self.retrieval.add_document(chunk["chunk_id"], chunk["text"], chunk["session"], chunk["timestamp"])
+            turns.setdefault((chunk["file"], chunk["turn"]), []).append(chunk["chunk_id"])
+
+        indexed_files = manifest["files"]
+        for (filename, key), chunk_ids in turns.items():
+            indexed_files[filename]["turns"][key] = chunk_ids
+            progress = self.files[filename]
+            progress["pending"] -= 1
+            if progress["pending"] == 0:
+                # Every turn is stored: record the file as up to date
+                indexed_files[filename] = dict(progress["state"], turns=indexed_files[filename]["turns"])
+                del self.files[filename]
+                self.counts["files"] += 1
+        self.counts["chunks"] += len(batch)
+        self.counts["batches"] += 1
+
+    def backoff(self, error, attempt):
+        delay = retry_after(error)
+        if delay is None:
+            # Full jitter so concurrent batches don't come back in lockstep
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return delay
+
+    def run(self, manifest):
+        """Embed and store everything changed_files() reports; returns counts and timing"""
+        start = time.monotonic()
+        last_save = start
+        batches = self.batches(manifest)
+        exhausted = False
+        retry = deque()  # (batch, attempt) waiting to go again
+        in_flight = {}  # future -> (batch, attempt)
+        limit = self.concurrency
+        clean = 0  # batches since the last failure
+        not_before = 0.0  # no new requests before this (monotonic) time
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest")
+        try:
+            while True:
+                while len(in_flight) < limit and time.monotonic() >= not_before:
+                    if retry:
+                        batch, attempt = retry.popleft()
+                    elif not exhausted:
+                        batch, attempt = next(batches, None), 0
+                        if batch is None:
+                            exhausted = True
+                            break
+                    else:
+                        break
+                    in_flight[executor.submit(self.embed, batch)] = (batch, attempt)
+
+                if not in_flight:
+                    if exhausted and not retry:
+                        break
+                    time.sleep(max(0.0, not_before - time.monotonic()))
+                    continue
+
+                paused = not_before - time.monotonic()
+                done, _ = wait(in_flight, timeout=paused if paused > 0 else None, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch, attempt = in_flight.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        if attempt >= self.max_retries or not retryable(e):
+                            raise
+                        delay = self.backoff(e, attempt)
+                        if rate_limited(e):
+                            limit = max(1, limit // 2)
+                            self.counts["rate_limited"] += 1
+                            logger.warning(f"Embedding rate limited; concurrency {limit}, pausing {delay:.1f}s")
+                        else:
+                            logger.warning(f"Embedding batch failed ({e}); retrying in {delay:.1f}s")
+                        self.counts["retries"] += 1
+                        not_before = max(not_before, time.monotonic() + delay)
+                        retry.append((batch, attempt + 1))
+                        clean = 0
+                        continue
+
+                    self.commit(manifest, batch, vectors)
+                    clean += 1
+                    if limit < self.concurrency and clean >= limit * 4:
+                        limit += 1
+                        clean = 0
+
+                if time.monotonic() - last_save >= self.commit_interval:
+                    self.retrieval.save_manifest(manifest)
+                    last_save = time.monotonic()
+                    elapsed = last_save - start
+                    logger.info(
+                        f"Embedded {self.counts['chunks']} chunks in {self.counts['batches']} batches "
+                        f"({self.counts['chunks'] / elapsed:.0f}/s, concurrency {limit})"
+                    )
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.retrieval.save_manifest(manifest)
+
+        stats = dict(self.counts, seconds=round(time.monotonic() - start, 2))
+        if stats["chunks"]:
+            logger.info(f"Ingested {stats['chunks']} chunks from {stats['files']} files in {stats['seconds']}s")
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the conversation history for retrieval")
+    parser.add_argument("--config", default="config/assistant_config.json")
+    parser.add_argument("--history-dir", default="history")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--rebuild", action="store_true", help="discard the index and embed everything again")
+    parser.add_argument("--concurrency", type=int)
+    parser.add_argument("--max-batch-tokens", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    from dotenv import load_dotenv
+    from .conversation_retrieval import ConversationRetrieval
+    load_dotenv()
+    with open(args.config, "r") as f:
+        config = json.load(f)
+
+    retrieval_config = dict(config.get("retrieval", {}))
+    ingest_config = dict(retrieval_config.get("ingest", {}))
+    if args.concurrency is not None:
+        ingest_config["concurrency"] = args.concurrency
+    if args.max_batch_tokens is not None:
+        ingest_config["max_batch_tokens"] = args.max_batch_tokens
+    retrieval_config["ingest"] = ingest_config
+
+    retrieval = ConversationRetrieval(
+        history_dir=args.history_dir,
+        persist_directory=args.persist_directory,
+        embedding_config=config.get("embeddings"),
+        retrieval_config=retrieval_config,
+        refresh=False
+    )
+    stats = retrieval.refresh_vector_store(rebuild=args.rebuild)
+    if stats is None:
+        raise SystemExit(1)
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    # python -m src.ingest [--rebuild] [--concurrency 4]
+    main()
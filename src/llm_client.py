@@ -0,0 +1,235 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+
+from .tracing import percentile
+
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth another try: timeouts, conflicts, rate limits, server errors
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class PrefetchedStream:
+    """A streamed completion whose first chunk has already arrived"""
+
+    def __init__(self, first, chunks, response):
+        self.first = first
+        self.chunks = chunks
+        self.response = response
+
+    def __iter__(self):
+        try:
+            if self.first is not None:
+                yield self.first
+            yield from self.chunks
+        finally:
+            self.close()
+
+    def close(self):
+        # Closing the SDK stream releases the pooled connection
+        close = getattr(self.response, "close", None)
+        if close is not None:
+            close()
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies, for choosing the hedge delay"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self.lock:
+            values = sorted(self.samples)
+        return percentile(values, fraction), len(values)
+
+
+class ResilientChatClient:
+    """Drop-in for OpenAI().chat.completions.create with deadlines, retries, hedging and fallback.
+
+    Requests share a keep-alive connection pool. Each call gets a deadline
+    (timeout_seconds overall; first_token_seconds until a stream starts
+    producing), retryable failures are retried with full-jitter exponential
+    backoff inside that deadline, and with hedging on, a second identical
+    (or hedge_model) request is fired once the first has taken longer than
+    the recent p95; whichever answers first wins. If the primary model still
+    fails or runs out of time, the request is retried once on fallback_model
+    with whatever is left of the deadline (skipped if nothing is).
+    """
+
+    def __init__(self, config=None, api_key=None, base_url=None):
+        import httpx
+        import openai
+        config = config or {}
+        pool = config.get("pool", {})
+        hedge = config.get("hedge", {})
+        self.timeout = config.get("timeout_seconds", 30.0)
+        self.connect_timeout = config.get("connect_timeout_seconds", 3.0)
+        self.first_token_timeout = config.get("first_token_seconds", 10.0)
+        self.max_retries = config.get("max_retries", 2)
+        self.backoff_base = config.get("backoff_base_seconds", 0.25)
+        self.backoff_max = config.get("backoff_max_seconds", 2.0)
+        self.fallback_model = config.get("fallback_model")
+        self.hedge_enabled = hedge.get("enabled", False)
+        self.hedge_percentile = hedge.get("percentile", 0.95)
+        self.hedge_min_delay = hedge.get("min_delay_seconds", 0.3)
+        self.hedge_default_delay = hedge.get("default_delay_seconds", 1.5)
+        self.hedge_min_samples = hedge.get("min_samples", 20)
+        self.hedge_model = hedge.get("model")
+
+        self.httpx = httpx
+        self.errors = openai
+        # The SDK's own retries are off; this class owns the retry policy
+        self.client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            max_retries=0,
+            http_client=httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=pool.get("max_connections", 10),
+                    max_keepalive_connections=pool.get("max_keepalive_connections", 5),
+                    keepalive_expiry=pool.get("keepalive_expiry_seconds", 60.0)
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            )
+        )
+        self.executor = ThreadPoolExecutor(max_workers=pool.get("max_connections", 10), thread_name_prefix="llm")
+        self.latency = {True: LatencyTracker(), False: LatencyTracker()}  # keyed by stream
+        self.counts = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0, "failures": 0}
+        self.lock = threading.Lock()
+
+        # Same shape as the OpenAI client, so callers don't change
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def create(self, stream=False, **request):
+        self.count("requests")
+        # One budget for the whole call, fallback included
+        deadline = time.monotonic() + self.timeout
+        try:
+            return self.with_retries(stream, request, deadline)
+        except Exception as e:
+            no_time_left = time.monotonic() >= deadline
+            if not self.fallback_model or request.get("model") == self.fallback_model or no_time_left:
+                self.count("failures")
+                raise
+            logger.warning(f"{request.get('model')} failed ({e}); falling back to {self.fallback_model}")
+            self.count("fallbacks")
+            try:
+                fallback = dict(request, model=self.fallback_model)
+                return self.attempt(stream, fallback, deadline)
+            except Exception:
+                self.count("failures")
+                raise
+
+    def retryable(self, error):
+        if isinstance(error, (self.errors.APITimeoutError, self.errors.APIConnectionError)):
+            return True
+        if isinstance(error, self.errors.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+        return False
+
+    def with_retries(self, stream, request, deadline):
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self.hedge_enabled:
+                    return self.hedged(stream, request, deadline)
+                return self.attempt(stream, request, deadline)
+            except Exception as e:
+                if attempt == self.max_retries or not self.retryable(e):
+                    raise
+                # Full jitter keeps a burst of clients from retrying in lockstep
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning(f"LLM request failed ({e}); retrying in {delay:.2f}s")
+                self.count("retries")
+                time.sleep(delay)
+
+    def attempt(self, stream, request, deadline):
+        """One request within the deadline; streams are returned once their first chunk is in"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("LLM request deadline exceeded")
+        start = time.monotonic()
+        if not stream:
+            timeout = self.httpx.Timeout(remaining, connect=min(self.connect_timeout, remaining))
+            response = self.client.chat.completions.create(timeout=timeout, **request)
+            self.latency[False].record(time.monotonic() - start)
+            return response
+
+        # httpx's read timeout bounds the wait for each chunk, the first one included
+        first_wait = min(self.first_token_timeout, remaining)
+        timeout = self.httpx.Timeout(first_wait, connect=min(self.connect_timeout, first_wait))
+        response = self.client.chat.completions.create(stream=True, timeout=timeout, **request)
+        chunks = iter(response)
+        try:
+            first = next(chunks)
+        except StopIteration:
+            first = None
+        self.latency[True].record(time.monotonic() - start)
+        return PrefetchedStream(first, chunks, response)
+
+    def hedge_delay(self, stream):
+        value, samples = self.latency[stream].percentile(self.hedge_percentile)
+        if samples < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, value)
+
+    def hedged(self, stream, request, deadline):
+        delay = self.hedge_delay(stream)
+        if deadline - time.monotonic() <= delay:
+            return self.attempt(stream, request, deadline)
+
+        primary = self.executor.submit(self.attempt, stream, request, deadline)
+        futures = [primary]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            hedge_request = dict(request, model=self.hedge_model) if self.hedge_model else request
+            futures.append(self.executor.submit(self.attempt, stream, hedge_request, deadline))
+            self.count("hedges")
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                # Whichever loses is closed as soon as it connects
+                for other in pending:
+                    other.add_done_callback(self.discard)
+                if future is not primary:
+                    self.count("hedge_wins")
+                return future.result()
+        raise error
+
+    @staticmethod
+    def discard(future):
+        if future.exception() is None and isinstance(future.result(), PrefetchedStream):
+            future.result().close()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts)
+        for stream, name in ((True, "first_token"), (False, "completion")):
+            p50, samples = self.latency[stream].percentile(0.50)
+            if samples:
+                stats[f"{name}_p50_s"] = round(p50, 3)
+                stats[f"{name}_p95_s"] = round(self.latency[stream].percentile(0.95)[0], 3)
+        return stats
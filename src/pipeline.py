@@ -0,0 +1,321 @@
+import logging
+import asyncio
+import concurrent.futures
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .streaming import SentenceSplitter, stream_completion_sentences
+from .vad import VoiceActivityDetector
+
+
+logger = logging.getLogger(__name__)
+
+class TurnInterrupted(Exception):
+    pass
+
+
+async def put_end_marker(queue, interrupted):
+    """Signal end-of-stream. On a normal finish this waits for room like any
+    other item; once the turn is interrupted the consumer may already be gone,
+    so it never blocks."""
+    if not interrupted.is_set():
+        await queue.put(None)
+        return
+    try:
+        queue.put_nowait(None)
+    except asyncio.QueueFull:
+        pass
+
+
+class AsyncVoicePipeline:
+    """Asyncio engine that runs a VoiceAssistant's stages concurrently.
+
+    Capture, transcription, retrieval, the LLM stream, synthesis and playback
+    each run as their own stage connected by bounded queues. Blocking work
+    (Whisper, TTS, audio I/O, HTTP) runs on dedicated executors so stages
+    overlap: sentence N plays while N+1 is synthesized and the LLM is still
+    generating N+2, and history is written in the background. With barge_in
+    enabled, speech detected during playback cancels the rest of the reply and
+    becomes the next utterance.
+    """
+
+    def __init__(self, assistant, queue_size=2, barge_in=False, barge_in_margin_db=20.0):
+        self.assistant = assistant
+        self.queue_size = queue_size
+        self.barge_in = barge_in
+        self.barge_in_margin_db = barge_in_margin_db
+
+        # Separate pools so a long synthesis never blocks capture or the LLM stream.
+        # Transcription happens on the capture pool as part of capture_utterance()
+        # (streamed alongside recording when stt.streaming is on).
+        self.capture_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="capture")
+        self.io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="io")
+        self.tts_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts")
+        self.playback_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playback")
+
+        self.barge_in_position = None
+
+    def run(self):
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            logger.info("Saving conversation and stopping...")
+        finally:
+            self.assistant.save_conversation(close=True)
+            self.assistant.tracer.close()
+            self.assistant.audio_source.stop()
+            self.assistant.close_audio_output()
+            logger.info(f"Idle: {self.assistant.idle.stats()}")
+            for executor in (self.capture_executor, self.io_executor,
+                             self.tts_executor, self.playback_executor):
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        detector = self.assistant.wake_word_detector
+        logger.info("Starting voice assistant (async pipeline)...")
+
+        while self.assistant.audio_source.running:
+            logger.info("Listening for wake word 'Hey Austin'...")
+            detector.resume()
+            self.assistant.idle.enter()
+            try:
+                await loop.run_in_executor(self.capture_executor, self.wait_for_wake_word)
+            except RuntimeError:
+                logger.info("Audio source stopped")
+                break
+            self.assistant.idle.wake()
+            logger.info("Wake word detected! Listening to your message...")
+
+            record_from = detector.position
+            while True:
+                trace = self.assistant.tracer.start_turn()
+                audio, text = await loop.run_in_executor(
+                    self.capture_executor, self.assistant.capture_utterance, record_from, trace
+                )
+                if audio is None:
+                    logger.info("Conversation ended due to silence")
+                    break
+
+                self.barge_in_position = None
+                keep_talking = await self.process_turn(audio, text, trace)
+                trace.finish(barge_in=self.barge_in_position is not None)
+                if not keep_talking:
+                    logger.info("No speech detected, returning to wake word mode...")
+                    break
+                # After a barge-in, the interrupting speech is the next utterance
+                record_from = self.barge_in_position
+                logger.info("Listening for your next message... (or wait for timeout)")
+
+    def wait_for_wake_word(self):
+        detector = self.assistant.wake_word_detector
+        while not detector.listen():
+            if not self.assistant.audio_source.running:
+                raise RuntimeError("Audio source stopped")
+            self.assistant.idle.tick()
+
+    async def process_turn(self, audio, text, trace):
+        """Run one utterance through retrieval, LLM and TTS; False if nothing was said"""
+        assistant = self.assistant
+        loop = asyncio.get_running_loop()
+
+        if not text:
+            return False
+        logger.info(f"You said: {text}")
+
+        # Retrieval (with the response cache lookup) only needs the transcript,
+        # so it runs on the io pool while the rest of the turn gets going: the
+        # synthesis and playback stages start, barge-in listening begins, and
+        # the LLM client and TTS model are made ready off the event loop (they
+        # may still be loading, or reloading after an idle page-out). A
+        # response cache hit skips the LLM entirely.
+        context = loop.run_in_executor(self.io_executor, lambda: assistant.gather_context(text, trace))
+        llm_ready = loop.run_in_executor(self.io_executor, lambda: assistant.client)
+        tts_ready = loop.run_in_executor(self.io_executor, lambda: assistant.tts)
+
+        interrupted = threading.Event()
+        sentences = asyncio.Queue(maxsize=self.queue_size)
+        audio_chunks = asyncio.Queue(maxsize=self.queue_size)
+        reply = {}
+
+        stages = [
+            asyncio.create_task(self.produce(text, context, llm_ready, sentences, reply, interrupted, trace)),
+            asyncio.create_task(self.synthesize(tts_ready, sentences, audio_chunks, interrupted, trace)),
+            asyncio.create_task(self.play(tts_ready, audio_chunks, interrupted, trace)),
+        ]
+        monitor = None
+        if self.barge_in:
+            monitor = asyncio.create_task(self.watch_for_barge_in(interrupted))
+
+        try:
+            await asyncio.gather(*stages)
+        except TurnInterrupted:
+            logger.info("Barge-in: stopping playback")
+            interrupted.set()
+            for stage in stages:
+                stage.cancel()
+        except Exception as e:
+            logger.error(f"Error processing turn: {e}")
+            interrupted.set()
+            for stage in stages:
+                stage.cancel()
+        finally:
+            interrupted.set()
+            if monitor is not None:
+                await monitor
+            # A cache hit never needs the LLM client (nor a silent turn the TTS);
+            # don't leave a failed load's error unretrieved
+            for future in (llm_ready, tts_ready):
+                future.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+        if "text" in reply:
+            logger.info(f"AI Response: {reply['text']}")
+            assistant.record_exchange(text, reply["text"])
+            if reply["cached"] is None:
+                assistant.cache_response(text, reply["cache_key"], reply["text"], reply["llm_seconds"])
+            self.save_in_background()
+        return True
+
+    async def produce(self, text, context, llm_ready, sentences, reply, interrupted, trace):
+        """First stage: the cached answer, or the LLM stream once retrieval is done"""
+        cached, relevant_history, cache_key = await context
+        reply.update(cached=cached, cache_key=cache_key)
+        if interrupted.is_set():
+            await put_end_marker(sentences, interrupted)
+        elif cached is not None:
+            await self.replay(cached, sentences, reply, interrupted)
+        else:
+            messages = self.assistant.build_messages(text, relevant_history=relevant_history)
+            await self.generate(messages, llm_ready, sentences, reply, interrupted, trace)
+
+    async def replay(self, answer, sentences, reply, interrupted):
+        """Stand-in for the LLM stage on a response cache hit"""
+        try:
+            splitter = SentenceSplitter()
+            for sentence in splitter.feed(answer) + splitter.flush():
+                if interrupted.is_set():
+                    break
+                await sentences.put(sentence)
+            reply["text"] = answer
+        finally:
+            await put_end_marker(sentences, interrupted)
+
+    async def generate(self, messages, llm_ready, sentences, reply, interrupted, trace):
+        """LLM stage: pump streamed sentences from a worker thread into the queue"""
+        loop = asyncio.get_running_loop()
+        start = None
+
+        def on_complete(message):
+            reply["text"] = message
+            reply["llm_seconds"] = time.monotonic() - start
+
+        def pump(client):
+            stream = stream_completion_sentences(
+                client,
+                on_complete=on_complete,
+                trace=trace,
+                model=self.assistant.config["model"],
+                messages=messages,
+                temperature=self.assistant.config["temperature"]
+            )
+
+            def offer(sentence):
+                # Waits while the queue is full, which throttles the stream,
+                # but gives up as soon as the turn is interrupted
+                queued = asyncio.run_coroutine_threadsafe(sentences.put(sentence), loop)
+                while not interrupted.is_set():
+                    try:
+                        queued.result(timeout=0.1)
+                        return True
+                    except concurrent.futures.TimeoutError:
+                        continue
+                queued.cancel()
+                return False
+
+            spoken = False
+            try:
+                for sentence in stream:
+                    if not offer(sentence):
+                        break
+                    spoken = True
+            except Exception as e:
+                logger.error(f"Error with GPT streaming: {e}")
+                # Say something rather than go silent
+                if not spoken:
+                    offer(self.assistant.error_reply)
+            finally:
+                stream.close()
+
+        try:
+            client = await llm_ready
+            start = time.monotonic()
+            await loop.run_in_executor(self.io_executor, lambda: pump(client))
+        finally:
+            await put_end_marker(sentences, interrupted)
+
+    async def synthesize(self, tts_ready, sentences, audio_chunks, interrupted, trace):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                text = await sentences.get()
+                if text is None or interrupted.is_set():
+                    break
+                tts = await tts_ready
+                audio = await loop.run_in_executor(self.tts_executor, lambda: tts.synthesize(text, trace))
+                await audio_chunks.put(audio)
+        finally:
+            await put_end_marker(audio_chunks, interrupted)
+
+    async def play(self, tts_ready, audio_chunks, interrupted, trace):
+        loop = asyncio.get_running_loop()
+        tts = None
+        started = None
+        try:
+            while True:
+                audio = await audio_chunks.get()
+                if audio is None or interrupted.is_set():
+                    break
+                tts = await tts_ready
+                if started is None:
+                    started = time.monotonic()
+                # Returns as soon as the chunk is queued, so the next one follows without a gap
+                await loop.run_in_executor(self.playback_executor, lambda: tts.enqueue(audio))
+            if tts is not None:
+                await loop.run_in_executor(self.playback_executor, tts.drain)
+        except asyncio.CancelledError:
+            # The turn failed elsewhere; don't leave the rest of the reply playing
+            if tts is not None:
+                tts.stop()
+            raise
+        finally:
+            if started is not None:
+                trace.add("playback", started, time.monotonic())
+        if interrupted.is_set():
+            raise TurnInterrupted()
+
+    async def watch_for_barge_in(self, interrupted):
+        """Listen during the reply; on speech, stop playback and remember where it began"""
+        loop = asyncio.get_running_loop()
+        source = self.assistant.audio_source
+        vad = VoiceActivityDetector(sample_rate=source.sample_rate, margin_db=self.barge_in_margin_db)
+        reader = source.reader()
+
+        def listen():
+            while not interrupted.is_set():
+                frame = reader.read(vad.frame_length, timeout=0.2)
+                if frame is not None and vad.process(frame):
+                    # Back up to roughly where the confirmed speech started
+                    return reader.position - vad.onset_frames * vad.frame_length
+            return None
+
+        position = await loop.run_in_executor(self.capture_executor, listen)
+        if position is not None and not interrupted.is_set():
+            self.barge_in_position = position
+            interrupted.set()
+            if self.assistant.components["tts"].ready:
+                self.assistant.tts.stop()
+
+    def save_in_background(self):
+        # The conversation log writes on its own thread; this just requests an fsync
+        self.assistant.save_conversation()
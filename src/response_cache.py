@@ -0,0 +1,135 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Answers to these go stale within minutes, so they are never served from the cache
+TIME_SENSITIVE = [
+    r"\b(today|tonight|tomorrow|yesterday|now|currently|right now|this (morning|afternoon|evening|week))\b",
+    r"\b(time|date|day is it|weather|forecast|temperature|news|latest|score|price|stock)\b",
+    r"\b(remind|reminder|timer|alarm|schedule)\b",
+]
+
+# Mid-conversation, these lean on earlier turns ("and in Paris?", "how old is he"),
+# so the same words can need a different answer
+FOLLOW_UP = [
+    r"^(and|but|so|also|then|what about|how about|why not)\b",
+    r"\b(it|its|that|this|those|these|they|them|their|he|him|his|she|her|there|one|ones|same|else|more)\b",
+]
+
+
+def normalize_query(text):
+    """Lowercase, drop punctuation and collapse whitespace before embedding"""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s']", " ", text.lower())).strip()
+
+
+class SemanticResponseCache:
+    """Answers to past questions, looked up by embedding similarity.
+
+    Entries expire after ttl_seconds and the least recently used are evicted
+    beyond max_entries. Lookups are a dot product against a matrix of
+    normalized query vectors, so they cost microseconds next to an LLM call.
+    """
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.threshold = config.get("similarity_threshold", 0.95)
+        self.ttl_seconds = config.get("ttl_seconds", 24 * 3600)
+        self.max_entries = config.get("max_entries", 1000)
+        self.min_words = config.get("min_words", 3)
+        self.bypass = [re.compile(p) for p in config.get("bypass_patterns", TIME_SENSITIVE)]
+        self.follow_up = [re.compile(p) for p in config.get("follow_up_patterns", FOLLOW_UP)]
+
+        self.entries = OrderedDict()  # normalized query -> entry dict
+        self.matrix = None
+        self.keys = []
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.seconds_saved = 0.0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def cacheable(self, text, in_conversation=False):
+        """False for time-sensitive or too-short queries, and, in_conversation
+        (earlier turns in the prompt), for ones that look like follow-ups"""
+        query = normalize_query(text)
+        bypass = self.bypass + self.follow_up if in_conversation else self.bypass
+        if len(query.split()) < self.min_words or any(p.search(query) for p in bypass):
+            with self.lock:
+                self.bypassed += 1
+            return False
+        return True
+
+    @staticmethod
+    def unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-9)
+
+    def expire(self, now):
+        """Drop expired entries (lock held)"""
+        expired = [key for key, entry in self.entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self.matrix = None
+
+    def get(self, vector):
+        """Cached answer for the nearest past query above the threshold, or None"""
+        now = time.time()
+        with self.lock:
+            self.expire(now)
+            if self.entries and self.matrix is None:
+                self.keys = list(self.entries)
+                self.matrix = np.stack([self.entries[key]["vector"] for key in self.keys])
+            if not self.entries:
+                self.misses += 1
+                return None
+            similarities = self.matrix @ self.unit(vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            key = self.keys[best]
+            entry = self.entries[key]
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.seconds_saved += entry["llm_seconds"]
+            logger.debug(f"Response cache hit ({similarities[best]:.3f}) for {key!r}")
+            return entry["answer"]
+
+    def put(self, text, vector, answer, llm_seconds=0.0):
+        if not answer:
+            return
+        with self.lock:
+            self.entries[normalize_query(text)] = {
+                "vector": self.unit(vector),
+                "answer": answer,
+                "created": time.time(),
+                "llm_seconds": llm_seconds,
+            }
+            self.entries.move_to_end(normalize_query(text))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.matrix = None
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "seconds_saved": round(self.seconds_saved, 3),
+            }
@@ -0,0 +1,456 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from .agent import VoiceAssistant
+from .audio_output import NullOutput
+from .conversation_retrieval import ConversationRetrieval
+from .embeddings import create_embeddings
+from .llm_client import ResilientChatClient
+from .startup import ComponentLoader
+from .stt import LanguagePin, SpeechToText
+from .tracing import Tracer
+from .tts import TextToSpeech
+from .vad import EndpointDetector, VoiceActivityDetector
+
+
+logger = logging.getLogger(__name__)
+
+CLIENT_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class MicroBatcher:
+    """Groups concurrent requests to one shared model into batches.
+
+    submit() returns a Future. A worker takes the oldest waiting request,
+    waits until max_wait_ms after it arrived for up to max_batch requests in
+    total, and runs them through process_batch(items) -> results in one
+    call. Under load the wait is already over by the time a worker is free,
+    so batching costs latency only when the model is idle.
+    """
+
+    def __init__(self, name, process_batch, max_batch=8, max_wait_ms=20, workers=1):
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.pending = deque()  # (item, future, arrival time)
+        self.ready = threading.Condition()
+        self.running = True
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self.threads = [
+            threading.Thread(target=self.run, name=f"{name}-batcher-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, item):
+        future = Future()
+        with self.ready:
+            self.pending.append((item, future, time.monotonic()))
+            self.ready.notify()
+        return future
+
+    def take(self):
+        """The next batch, or None once stopped"""
+        with self.ready:
+            while self.running and not self.pending:
+                self.ready.wait()
+            if not self.running:
+                return None
+            deadline = self.pending[0][2] + self.max_wait
+            while self.running and len(self.pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.ready.wait(remaining)
+            count = min(self.max_batch, len(self.pending))
+            return [self.pending.popleft() for _ in range(count)]
+
+    def run(self):
+        while True:
+            batch = self.take()
+            if batch is None:
+                return
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            self.batches += 1
+            self.items += len(batch)
+            self.largest = max(self.largest, len(batch))
+
+    def stop(self):
+        with self.ready:
+            self.running = False
+            self.ready.notify_all()
+            while self.pending:
+                self.pending.popleft()[1].cancel()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest,
+        }
+
+
+def synthesize_batch(tts, texts):
+    """TTS batch: each distinct text is synthesized once (and served from the synthesis cache when it can)"""
+    audio = {}
+    for text in texts:
+        if text not in audio:
+            audio[text] = tts.synthesize(text)
+    return [audio[text] for text in texts]
+
+
+class ClientSession(VoiceAssistant):
+    """One client's conversation, reusing the assistant's turn logic.
+
+    Context, conversation log, history retrieval, response cache and spoken
+    language belong to the client; the LLM client, Whisper, TTS and
+    embeddings come from the server and are shared. The assistant's
+    constructor (microphone, wake word, model loading) is deliberately not
+    run; the per-conversation state comes from the same start_conversation().
+    """
+
+    def __init__(self, server, client_id):
+        self.config = server.config
+        self.client_id = client_id
+        self.history_dir = os.path.join(server.history_dir, client_id)
+        os.makedirs(self.history_dir, exist_ok=True)
+        self.components = {
+            "openai": server.components["openai"],
+            "stt": server.components["stt"],
+            "tts": server.components["tts"],
+            "retriever": server.loader.load(f"retriever:{client_id}", lambda: server.retriever_factory(self)),
+        }
+        # Context, log and response cache per client, so one user's cached answers are never replayed to another
+        self.start_conversation(self.history_dir)
+        # Whisper is shared, so the language detected for this client is pinned here
+        self.languages = LanguagePin(self.config.get("stt", {}).get("language"))
+        self.tracer = server.tracer
+        # One turn at a time, however many connections the client has open
+        self.turn_lock = asyncio.Lock()
+        self.connections = 0
+
+    def close(self):
+        self.save_conversation(close=True)
+
+
+class AssistantServer:
+    """Serves many clients over WebSocket from one set of models.
+
+    A client connects, sends {"type": "hello", "client_id": ...} and then
+    streams 16 kHz mono int16 PCM as binary messages. The server endpoints
+    each utterance with the VAD, transcribes it through a shared Whisper
+    micro-batcher and answers with {"type": "transcript"}, then one
+    {"type": "audio", "sample_rate", "text"} message followed by binary
+    int16 PCM per spoken sentence, and finally {"type": "reply_end"}. A
+    reply that fails partway sends {"type": "error"} before its reply_end.
+    Audio that arrives while a reply is being produced is ignored.
+    Sentences are synthesized through a shared TTS queue, so the next one
+    is being synthesized while the current one is sent.
+    """
+
+    def __init__(self, config_path="config/assistant_config.json", overrides=None):
+        """overrides (component name -> factory; "retriever" gets the ClientSession)
+        let benchmarks swap in stand-ins for the models."""
+        overrides = dict(overrides or {})
+        with open(config_path, "r") as f:
+            self.config = json.load(f)
+        server_config = self.config.get("server", {})
+        self.host = server_config.get("host", "127.0.0.1")
+        self.port = server_config.get("port", 8765)
+        self.history_dir = server_config.get("history_dir", "history/clients")
+        self.index_dir = server_config.get("index_dir", "chroma_db/clients")
+        self.max_clients = server_config.get("max_clients", 32)
+        self.silence_duration = server_config.get("silence_duration", 0.5)
+        self.stt_batch = server_config.get("stt_batch", 8)
+        self.stt_batch_wait_ms = server_config.get("stt_batch_wait_ms", 30)
+        self.tts_batch = server_config.get("tts_batch", 4)
+        self.tts_batch_wait_ms = server_config.get("tts_batch_wait_ms", 5)
+
+        self.loader = ComponentLoader()
+        factories = {
+            "openai": lambda: ResilientChatClient(self.config.get("llm"), api_key=os.getenv("OPENAI_API_KEY")),
+            "stt": lambda: SpeechToText(self.config.get("stt")),
+            # Nothing is played on the server; audio goes back to the clients
+            "tts": lambda: TextToSpeech(self.config.get("tts"), output=NullOutput(realtime=False)),
+            "embeddings": lambda: create_embeddings(self.config.get("embeddings")),
+        }
+        self.retriever_factory = overrides.pop("retriever", self.create_retriever)
+        factories.update(overrides)
+        self.components = {name: self.loader.load(name, factory) for name, factory in factories.items()}
+
+        self.tracer = Tracer(path=self.config.get("tracing", {}).get("path"))
+        self.sessions = {}
+        # LLM streaming and turn bookkeeping block, so they run off the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=server_config.get("llm_workers", 16), thread_name_prefix="server"
+        )
+        self.stt_batcher = None
+        self.tts_batcher = None
+        self.turns = 0
+
+    def create_retriever(self, session):
+        """History retrieval over the client's own history, with the shared embeddings"""
+        return ConversationRetrieval(
+            history_dir=session.history_dir,
+            persist_directory=os.path.join(self.index_dir, session.client_id),
+            retrieval_config=self.config.get("retrieval"),
+            embeddings=self.components["embeddings"].get()
+        )
+
+    def start_batchers(self):
+        stt = self.components["stt"].get()
+        tts = self.components["tts"].get()
+        self.tts_sample_rate = tts.sample_rate
+        self.stt_batcher = MicroBatcher(
+            "stt", lambda items: stt.transcribe_batch(*zip(*items)), self.stt_batch, self.stt_batch_wait_ms
+        )
+        self.tts_batcher = MicroBatcher(
+            "tts", lambda texts: synthesize_batch(tts, texts), self.tts_batch, self.tts_batch_wait_ms
+        )
+
+    def open_session(self, client_id):
+        session = self.sessions.get(client_id)
+        if session is None:
+            session = self.sessions[client_id] = ClientSession(self, client_id)
+            logger.info(f"Client {client_id} connected ({len(self.sessions)} active)")
+        session.connections += 1
+        return session
+
+    def release_session(self, session):
+        session.connections -= 1
+        if session.connections == 0:
+            del self.sessions[session.client_id]
+            session.close()
+            logger.info(f"Client {session.client_id} disconnected ({len(self.sessions)} active)")
+
+    async def handle(self, websocket):
+        try:
+            hello = json.loads(await websocket.recv())
+        except (ValueError, TypeError):
+            hello = None
+        if not isinstance(hello, dict):
+            await websocket.close(1003, "expected a hello message")
+            return
+        client_id = str(hello.get("client_id", ""))
+        if hello.get("type") != "hello" or not CLIENT_ID.match(client_id):
+            await websocket.close(1008, "hello needs a client_id of letters, digits, _ or -")
+            return
+        if client_id not in self.sessions and len(self.sessions) >= self.max_clients:
+            await websocket.close(1013, "server full")
+            return
+        if hello.get("sample_rate", 16000) != 16000:
+            await websocket.close(1003, "audio must be 16 kHz mono int16")
+            return
+
+        session = self.open_session(client_id)
+        try:
+            await websocket.send(json.dumps({"type": "ready", "sample_rate": self.tts_sample_rate}))
+            await self.listen(websocket, session)
+        finally:
+            self.release_session(session)
+
+    async def listen(self, websocket, session):
+        """Endpoint the client's audio and answer each utterance"""
+        vad = VoiceActivityDetector(sample_rate=16000)
+        endpoint = EndpointDetector(vad, silence_duration=self.silence_duration, start_timeout=3.0)
+        frame_length = vad.frame_length
+        preroll_frames = int(0.3 * 16000) // frame_length
+        frames = []  # since the endpoint detector was last reset
+        leftover = np.zeros(0, dtype=np.int16)
+        reply = None
+
+        async for message in websocket:
+            if isinstance(message, str):
+                # Control messages are reserved; nothing but hello is defined yet
+                continue
+            if reply is not None:
+                if not reply.done():
+                    continue
+                reply = None
+            samples = np.concatenate([leftover, np.frombuffer(message, dtype=np.int16)])
+            usable = len(samples) - len(samples) % frame_length
+            leftover = samples[usable:].copy()
+            for frame in samples[:usable].reshape(-1, frame_length):
+                frames.append(frame)
+                state = endpoint.process(frame)
+                if state == EndpointDetector.TIMEOUT:
+                    # Nobody spoke: start over, keeping only the pre-roll
+                    frames = frames[-preroll_frames:]
+                    endpoint.reset()
+                elif state == EndpointDetector.DONE:
+                    begin = max(0, endpoint.speech_start_frame - preroll_frames)
+                    audio = np.concatenate(frames[begin:])
+                    end_delay = (endpoint.frames - endpoint.speech_end_frame) * frame_length / 16000
+                    frames = []
+                    endpoint.reset()
+                    reply = asyncio.ensure_future(self.respond(websocket, session, audio, end_delay))
+                    leftover = np.zeros(0, dtype=np.int16)
+                    break
+        if reply is not None:
+            await reply
+
+    async def respond(self, websocket, session, audio, end_delay):
+        try:
+            async with session.turn_lock:
+                await self.answer(websocket, session, audio, end_delay)
+        except Exception as e:
+            logger.error(f"Error answering {session.client_id}: {e}")
+            try:
+                await websocket.send(json.dumps({"type": "error", "message": "the reply failed"}))
+                await websocket.send(json.dumps({"type": "reply_end", "text": ""}))
+            except Exception:
+                # The connection itself is what failed
+                pass
+
+    async def answer(self, websocket, session, audio, end_delay):
+        loop = asyncio.get_running_loop()
+        trace = session.tracer.start_turn()
+        trace.add_duration("vad_end", end_delay)
+        with trace.span("stt"):
+            item = (audio, session.languages.current)
+            text, language = await asyncio.wrap_future(self.stt_batcher.submit(item))
+        session.languages.observe(language, audio.size)
+        await websocket.send(json.dumps({"type": "transcript", "text": text}))
+        if not text.strip():
+            await websocket.send(json.dumps({"type": "reply_end", "text": ""}))
+            return
+
+        # LLM sentences (on a worker thread) -> TTS queue -> this coroutine, in order
+        sentences = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            stream = session.stream_with_gpt(text, trace)
+            try:
+                for sentence in stream:
+                    if cancelled.is_set():
+                        break
+                    future = self.tts_batcher.submit(sentence)
+                    loop.call_soon_threadsafe(sentences.put_nowait, (sentence, future))
+            finally:
+                # Closes the LLM stream as well when the reply is abandoned
+                stream.close()
+                loop.call_soon_threadsafe(sentences.put_nowait, None)
+
+        turns_before = session.context.turns
+        producer = loop.run_in_executor(self.executor, produce)
+        first_audio = None
+        try:
+            while True:
+                item = await sentences.get()
+                if item is None:
+                    break
+                sentence, future = item
+                start = time.monotonic()
+                samples = await asyncio.wrap_future(future)
+                trace.add("tts_synthesis", start, time.monotonic())
+                if first_audio is None:
+                    first_audio = time.monotonic()
+                pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+                await websocket.send(json.dumps({"type": "audio", "sample_rate": self.tts_sample_rate,
+                                                 "text": sentence}))
+                await websocket.send(pcm)
+        except BaseException:
+            # A failed synthesis or send: stop generating and drop what is still queued for TTS
+            cancelled.set()
+            await asyncio.gather(producer, return_exceptions=True)
+            while not sentences.empty():
+                item = sentences.get_nowait()
+                if item is not None:
+                    item[1].cancel()
+            raise
+        await producer
+        if first_audio is not None:
+            # "playback" here is handing the first audio to the client
+            trace.add("playback", first_audio, time.monotonic())
+
+        reply_text = session.context.recent[-1]["content"] if session.context.turns > turns_before else ""
+        await websocket.send(json.dumps({"type": "reply_end", "text": reply_text}))
+        await loop.run_in_executor(self.executor, session.save_conversation)
+        trace.finish(client=session.client_id)
+        self.turns += 1
+
+    def stats(self):
+        return {
+            "turns": self.turns,
+            "clients": len(self.sessions),
+            "stt": self.stt_batcher.stats() if self.stt_batcher else None,
+            "tts": self.tts_batcher.stats() if self.tts_batcher else None,
+        }
+
+    async def serve(self, host=None, port=None, ready=None):
+        """Run until cancelled; ready (an asyncio.Event) is set once clients can connect"""
+        from websockets.asyncio.server import serve
+        loop = asyncio.get_running_loop()
+        # Clients are accepted only once Whisper and TTS are up
+        await loop.run_in_executor(None, self.start_batchers)
+        logger.info(self.loader.report())
+        async with serve(self.handle, host or self.host, port or self.port, max_size=2 ** 22) as server:
+            self.bound_port = server.sockets[0].getsockname()[1]
+            logger.info(f"Serving on ws://{host or self.host}:{self.bound_port}")
+            if ready is not None:
+                ready.set()
+            try:
+                await asyncio.Future()
+            finally:
+                self.close()
+
+    def close(self):
+        for session in list(self.sessions.values()):
+            session.close()
+        self.sessions.clear()
+        for batcher in (self.stt_batcher, self.tts_batcher):
+            if batcher is not None:
+                batcher.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.tracer.close()
+        logger.info(f"Server: {self.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the assistant to several clients over WebSocket")
+    parser.add_argument("--config", default="config/assistant_config.json")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    from dotenv import load_dotenv
+    load_dotenv()
+    server = AssistantServer(args.config)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info("Shutting down server...")
+
+
+if __name__ == "__main__":
+    # python -m src.server [--port 8765]
+    main()
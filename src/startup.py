@@ -0,0 +1,152 @@
+import ctypes
+import gc
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+def release_memory():
+    """Collect garbage and hand freed heap pages back to the OS where glibc allows it"""
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class LazyComponent:
+    """A component being built on a background thread; get() blocks until it's ready.
+
+    unload() drops it to free memory; the next get() (or reload()) builds
+    it again from the same factory.
+    """
+
+    def __init__(self, name, factory, loader):
+        self.name = name
+        self.factory = factory
+        self.loader = loader
+        self.future = None
+        self.lock = threading.Lock()
+        self.reload()
+
+    @property
+    def ready(self):
+        future = self.future
+        return future is not None and future.done()
+
+    @property
+    def loaded(self):
+        return self.future is not None
+
+    def reload(self):
+        """Start building again in the background if unloaded; no-op otherwise"""
+        with self.lock:
+            if self.future is None:
+                self.future = self.loader.submit(self.name, self.factory)
+            return self.future
+
+    def unload(self):
+        """Drop the component (closing it if it has close()) and release its memory"""
+        with self.lock:
+            future, self.future = self.future, None
+        if future is None:
+            return
+        try:
+            component = future.result()
+        except Exception:
+            component = None
+        close = getattr(component, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Error closing {self.name}: {e}")
+        del component, close, future
+        release_memory()
+        logger.info(f"Unloaded {self.name}")
+
+    def get(self):
+        future = self.future or self.reload()
+        if not future.done():
+            start = time.monotonic()
+            logger.info(f"Waiting for {self.name} to finish loading...")
+            result = future.result()
+            self.loader.record_wait(self.name, time.monotonic() - start)
+            return result
+        return future.result()
+
+
+class ComponentLoader:
+    """Loads heavy components in parallel and keeps a per-phase startup timeline"""
+
+    def __init__(self, max_workers=4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="loader")
+        self.started = time.monotonic()
+        self.phases = []  # (name, start offset, end offset, thread)
+        self.waits = {}
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.all_loaded = threading.Event()
+        self.all_loaded.set()
+
+    def record_phase(self, name, start, end):
+        with self.lock:
+            self.phases.append((name, start - self.started, end - self.started, threading.current_thread().name))
+
+    def record_wait(self, name, seconds):
+        with self.lock:
+            self.waits[name] = self.waits.get(name, 0.0) + seconds
+
+    def phase(self, name):
+        """Context manager timing a synchronous startup step"""
+        loader = self
+
+        class Phase:
+            def __enter__(self):
+                self.start = time.monotonic()
+
+            def __exit__(self, *exc):
+                loader.record_phase(name, self.start, time.monotonic())
+                return False
+
+        return Phase()
+
+    def load(self, name, factory):
+        """Start building a component in the background; returns a LazyComponent"""
+        return LazyComponent(name, factory, self)
+
+    def submit(self, name, factory):
+        """Run factory on the loader pool, timing it as a phase; returns the future"""
+        with self.lock:
+            self.pending += 1
+            self.all_loaded.clear()
+
+        def build():
+            start = time.monotonic()
+            try:
+                return factory()
+            finally:
+                self.record_phase(name, start, time.monotonic())
+                with self.lock:
+                    self.pending -= 1
+                    if self.pending == 0:
+                        self.all_loaded.set()
+
+        return self.executor.submit(build)
+
+    def report(self):
+        """Human-readable breakdown of the cold start"""
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+            waits = dict(self.waits)
+        lines = ["Startup timing:"]
+        for name, start, end, thread in phases:
+            lines.append(f"  {name:<20} {start:7.2f}s -> {end:7.2f}s  ({end - start:6.2f}s on {thread})")
+        if phases:
+            lines.append(f"  {'total':<20} {max(end for _, _, end, _ in phases):7.2f}s")
+        for name, seconds in waits.items():
+            lines.append(f"  first use blocked on {name} for {seconds:.2f}s")
+        return "\n".join(lines)
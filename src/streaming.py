@@ -0,0 +1,121 @@
+import queue
+import re
+import threading
+import time
+
+from .tracing import NULL_TRACE
+
+# A sentence ends at terminal punctuation (optionally followed by closing
+# quotes/brackets) and whitespace, or at a line break.
+SENTENCE_END = re.compile(r'([.!?]+["\')\]]*)\s+|\n+')
+
+
+class SentenceSplitter:
+    """Accumulates streamed text and hands back complete sentences"""
+
+    def __init__(self, min_chars=20):
+        # Short fragments ("Sure." / "Mr.") are merged with what follows so
+        # TTS isn't called for a single word.
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            end = match.end()
+            candidate = self.buffer[start:end].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = end
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return [rest] if rest else []
+
+
+def stream_completion_sentences(client, on_complete=None, trace=NULL_TRACE, **request):
+    """Yield sentences from a streamed chat completion as soon as each one is complete.
+
+    on_complete is called with the full response text once the stream ends.
+    """
+    splitter = SentenceSplitter()
+    parts = []
+    start = time.monotonic()
+    stream = client.chat.completions.create(stream=True, **request)
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        if not parts:
+            trace.add("llm_ttft", start, time.monotonic())
+        parts.append(delta)
+        for sentence in splitter.feed(delta):
+            yield sentence
+    for sentence in splitter.flush():
+        yield sentence
+    # Includes any time the consumer held the generator between sentences
+    trace.add("llm_total", start, time.monotonic())
+    if on_complete is not None:
+        on_complete("".join(parts))
+
+
+def play_pipelined(chunks, synthesize, play, max_ahead=2):
+    """Synthesize chunks on a worker thread while earlier ones are playing.
+
+    chunks may be any iterable (including a generator still waiting on the
+    LLM); at most max_ahead synthesized chunks are buffered ahead of playback.
+    If playback fails the worker stops and closes chunks before the error
+    propagates.
+    """
+    ready = queue.Queue(maxsize=max_ahead)
+    done = object()
+    errors = []
+    stop = threading.Event()
+
+    def put(item):
+        # Waits while playback is behind, but gives up once the consumer has gone
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def producer():
+        try:
+            for text in chunks:
+                if stop.is_set():
+                    break
+                audio = synthesize(text)
+                if audio is not None:
+                    put(audio)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            # A generator can only be closed from the thread that runs it
+            if hasattr(chunks, "close"):
+                chunks.close()
+            put(done)
+
+    worker = threading.Thread(target=producer, daemon=True)
+    worker.start()
+    try:
+        while True:
+            audio = ready.get()
+            if audio is done:
+                break
+            play(audio)
+    finally:
+        stop.set()
+        while not ready.empty():
+            ready.get_nowait()
+        worker.join()
+    if errors:
+        raise errors[0]
@@ -1,18 +1,365 @@
-import whisper
+import logging
 import numpy as np
+import re
+import threading
+import time
+
+from .audio_buffer import RingBuffer
+
+logger = logging.getLogger(__name__)
+
+# Shorter clips detect their language too unreliably to pin it
+MIN_DETECTION_SECONDS = 2.0
+# Whisper's window: longer clips can't share a padded batch
+MAX_BATCH_SECONDS = 30.0
+
+
+class WhisperBackend:
+    """openai-whisper on PyTorch"""
+
+    def __init__(self, model="base", device="cpu", threads=None):
+        # Imported here so importing this module doesn't pull in torch
+        import torch
+        import whisper
+        if threads:
+            torch.set_num_threads(threads)
+        self.model_name = f"whisper/{model}"
+        self.fp16 = device != "cpu"
+        self.model = whisper.load_model(model, device=device)
+
+    def decode(self, audio, language=None, prompt=None, word_timestamps=False,
+               condition_on_previous_text=True, **options):
+        """float32 audio -> (text, [(word, start, end)], language)"""
+        result = self.model.transcribe(
+            audio,
+            fp16=self.fp16,
+            language=language,
+            initial_prompt=prompt or None,
+            word_timestamps=word_timestamps,
+            condition_on_previous_text=condition_on_previous_text,
+            **options
+        )
+        words = [
+            (word["word"], word["start"], word["end"])
+            for segment in result["segments"]
+            for word in segment.get("words", [])
+        ]
+        return result["text"], words, result.get("language")
+
+    def decode_batch(self, audios, language=None, beam_size=1):
+        """Several float32 clips (each up to 30s) as one padded batch -> [(text, language)]"""
+        import torch
+        import whisper
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels)
+            for audio in audios
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(
+            language=language, beam_size=beam_size, fp16=self.fp16, without_timestamps=True
+        )
+        return [(result.text, result.language) for result in whisper.decode(self.model, mels, options)]
+
+
+class FasterWhisperBackend:
+    """Whisper on CTranslate2 (faster-whisper); compute_type "int8" quantizes the weights for CPU"""
+
+    def __init__(self, model="base", device="cpu", compute_type="int8", threads=None, num_workers=1):
+        from faster_whisper import WhisperModel
+        self.model_name = f"faster-whisper/{model}-{compute_type}"
+        self.model = WhisperModel(
+            model,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=threads or 0,
+            num_workers=num_workers
+        )
+
+    def decode(self, audio, language=None, prompt=None, word_timestamps=False,
+               condition_on_previous_text=True, **options):
+        segments, info = self.model.transcribe(
+            audio,
+            language=language,
+            initial_prompt=prompt or None,
+            word_timestamps=word_timestamps,
+            condition_on_previous_text=condition_on_previous_text,
+            **options
+        )
+        # Segments are decoded lazily as the generator is consumed
+        segments = list(segments)
+        words = [(word.word, word.start, word.end) for segment in segments for word in segment.words or []]
+        return "".join(segment.text for segment in segments), words, info.language
+
+    def decode_batch(self, audios, language=None, beam_size=1):
+        """Several float32 clips (each up to 30s) encoded and generated together -> [(text, language)]"""
+        from faster_whisper.audio import pad_or_trim
+        from faster_whisper.tokenizer import Tokenizer
+        features = np.stack([pad_or_trim(self.model.feature_extractor(audio)) for audio in audios])
+        encoded = self.model.encode(features)
+        if language is None:
+            # Top language token per clip, e.g. "<|en|>"
+            languages = [scores[0][0][2:-2] for scores in self.model.model.detect_language(encoded)]
+        else:
+            languages = [language] * len(audios)
+        tokenizers = [
+            Tokenizer(self.model.hf_tokenizer, self.model.model.is_multilingual, task="transcribe", language=lang)
+            for lang in languages
+        ]
+        results = self.model.model.generate(
+            encoded,
+            [[*tokenizer.sot_sequence, tokenizer.no_timestamps] for tokenizer in tokenizers],
+            beam_size=beam_size,
+            max_length=self.model.max_length,
+            suppress_blank=True,
+            suppress_tokens=[-1]
+        )
+        return [
+            (tokenizer.decode(result.sequences_ids[0]), lang)
+            for tokenizer, result, lang in zip(tokenizers, results, languages)
+        ]
+
+
+STT_BACKENDS = {
+    "whisper": WhisperBackend,
+    "faster-whisper": FasterWhisperBackend,
+}
+
+
+class LanguagePin:
+    """The language to decode a speaker in.
+
+    A configured language is always used and "auto" detects it on every
+    clip. Left unset (None), the language detected on the first long
+    enough clip is pinned and reused from then on.
+    """
+
+    def __init__(self, configured=None, sample_rate=16000):
+        self.configured = configured
+        self.sample_rate = sample_rate
+        self.detected = None
+
+    @property
+    def current(self):
+        """Language for the next decode; None means detect it"""
+        return None if self.configured == "auto" else self.configured or self.detected
+
+    def observe(self, detected, samples):
+        """Pin detected if nothing is pinned yet and the clip was long enough to trust it"""
+        if (self.configured is None and self.detected is None and detected
+                and samples >= MIN_DETECTION_SECONDS * self.sample_rate):
+            self.detected = detected
+            logger.info(f"Detected language '{detected}', using it from now on")
+
 
 class SpeechToText:
-    def __init__(self, model_name="base"):
-        print("Loading Whisper model...")
-        self.model = whisper.load_model(model_name)
-        print("Whisper model loaded")
+    """Whisper transcription through a pluggable backend, built from the "stt" config section.
+
+    Options for the backend (model, device, threads, compute_type...) live
+    in a sub-section named after it, e.g. {"backend": "faster-whisper",
+    "faster-whisper": {"compute_type": "int8"}}, so switching backends never
+    hands one backend another's options. language pins the spoken language;
+    left unset it is detected on the first long enough utterance and then
+    reused, and "auto" detects it on every call. decode_options (beam_size,
+    temperature...) are passed to every decode. The model is warmed up on
+    warmup_seconds of noise at load so the first turn isn't slower.
+    """
+
+    def __init__(self, config=None, sample_rate=16000):
+        config = config or {}
+        backend_name = config.get("backend", "whisper")
+        if backend_name not in STT_BACKENDS:
+            raise ValueError(f"Unknown STT backend '{backend_name}', expected one of {sorted(STT_BACKENDS)}")
+        self.language = config.get("language")
+        self.languages = LanguagePin(self.language, sample_rate)
+        self.decode_options = config.get("decode_options", {})
+        warmup_seconds = config.get("warmup_seconds", 1.0)
+        # streaming and step_seconds are recording options that share the "stt" section
+        shared = {"backend", "language", "decode_options", "warmup_seconds", "streaming", "step_seconds"}
+        ignored = set(config) - shared - set(STT_BACKENDS)
+        if ignored:
+            logger.warning(f"Ignoring stt options {sorted(ignored)}; backend options go under \"{backend_name}\"")
+
+        self.sample_rate = sample_rate
+        logger.debug("Loading Whisper model...")
+        self.backend = STT_BACKENDS[backend_name](**config.get(backend_name, {}))
+        logger.debug(f"Whisper model {self.backend.model_name} loaded")
+        if warmup_seconds:
+            self.warm_up(warmup_seconds)
+
+    def warm_up(self, seconds):
+        start = time.monotonic()
+        # Quiet noise rather than silence so the decoder actually runs
+        audio = (np.random.default_rng(0).standard_normal(int(seconds * self.sample_rate)) * 0.01).astype(np.float32)
+        # A fixed language, so nothing gets detected from the noise
+        language = self.language if self.language not in (None, "auto") else "en"
+        self.backend.decode(audio, language=language, **self.decode_options)
+        logger.debug(f"Whisper warm-up took {time.monotonic() - start:.2f}s")
+
+    def decode(self, audio, **kwargs):
+        """int16 audio -> (text, words), pinning the language after the first detection"""
+        audio = audio.flatten().astype(np.float32) / 32768.0
+        options = dict(self.decode_options, **kwargs)
+        text, words, detected = self.backend.decode(audio, language=self.languages.current, **options)
+        self.languages.observe(detected, len(audio))
+        return text, words
 
     def transcribe(self, audio):
         try:
-            # Convert audio to float32 and normalize
-            audio = audio.flatten().astype(np.float32) / 32768.0
-            result = self.model.transcribe(audio, fp16=False)
-            return result["text"]
+            return self.decode(audio)[0]
         except Exception as e:
-            print(f"Transcription error: {e}")
-            return ""
\ No newline at end of file
+            logger.error(f"Transcription error: {e}")
+            return ""
+
+    def transcribe_batch(self, audios, languages):
+        """Transcribe int16 clips, clip i in languages[i] (None detects it); [(text, detected language)]
+
+        Nothing is pinned on this instance, so a caller serving several
+        speakers keeps a LanguagePin per speaker. Clips that share a
+        language go to the backend in one call when it can batch them.
+        """
+        clips = [audio.flatten().astype(np.float32) / 32768.0 for audio in audios]
+        batchable = hasattr(self.backend, "decode_batch") and all(
+            len(clip) <= MAX_BATCH_SECONDS * self.sample_rate for clip in clips
+        )
+        groups = {}
+        for i, language in enumerate(languages):
+            groups.setdefault(language, []).append(i)
+        results = [None] * len(clips)
+        for language, indices in groups.items():
+            if len(indices) >= 2 and batchable:
+                try:
+                    # Batched decoding is plain beam search: no prompts, timestamps or temperature fallback
+                    decoded = self.backend.decode_batch(
+                        [clips[i] for i in indices], language=language,
+                        beam_size=self.decode_options.get("beam_size", 1)
+                    )
+                    for i, result in zip(indices, decoded):
+                        results[i] = result
+                    continue
+                except Exception as e:
+                    logger.error(f"Batched transcription failed ({e}), decoding one by one")
+            for i in indices:
+                try:
+                    text, _, detected = self.backend.decode(clips[i], language=language, **self.decode_options)
+                    results[i] = (text, detected)
+                except Exception as e:
+                    logger.error(f"Transcription error: {e}")
+                    results[i] = ("", None)
+        return results
+
+    def transcribe_words(self, audio, prompt=None):
+        """Decode int16 audio into [(word, start_seconds, end_seconds), ...]"""
+        return self.decode(audio, prompt=prompt, word_timestamps=True, condition_on_previous_text=False)[1]
+
+
+def normalize_word(word):
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+class StreamingTranscriber:
+    """Transcribes an utterance while it is still being recorded.
+
+    Audio is fed in as it arrives; a worker thread re-decodes the uncommitted
+    window every step seconds. Words on which two consecutive hypotheses agree
+    are committed (local agreement) and the window start moves past them, so
+    each decode only covers the unstable tail. finish() decodes whatever tail
+    is left once the recorder detects silence.
+    """
+
+    def __init__(self, stt, sample_rate=16000, step=1.0, max_window=20.0, max_seconds=60.0):
+        self.stt = stt
+        self.sample_rate = sample_rate
+        self.step_samples = int(step * sample_rate)
+        self.max_window_samples = int(max_window * sample_rate)
+        self.buffer = RingBuffer(int(max_seconds * sample_rate), dtype=np.int16)
+        self.committed = []  # (word, start, end) in seconds from the first fed sample
+        self.window_start = 0
+        self.hypothesis = []
+        self.decoded_until = 0
+        self.decodes = 0
+        self.lock = threading.Lock()
+        self.new_audio = threading.Event()
+        self.stopped = threading.Event()
+        self.worker = None
+
+    def start(self):
+        self.worker = threading.Thread(target=self.run, name="streaming-stt", daemon=True)
+        self.worker.start()
+        return self
+
+    def feed(self, samples):
+        self.buffer.write(samples)
+        if self.buffer.write_pos - self.decoded_until >= self.step_samples:
+            self.new_audio.set()
+
+    def run(self):
+        while not self.stopped.is_set():
+            if not self.new_audio.wait(timeout=0.1):
+                continue
+            self.new_audio.clear()
+            try:
+                with self.lock:
+                    if not self.stopped.is_set():
+                        self.decode_window(final=False)
+            except Exception as e:
+                # finish() will still decode everything that wasn't committed
+                logger.error(f"Streaming transcription error: {e}")
+
+    def decode_window(self, final):
+        end = self.buffer.write_pos
+        # Forget audio that slid out of the buffer (only on very long utterances)
+        self.window_start = max(self.window_start, self.buffer.oldest)
+        if end - self.window_start < self.sample_rate // 10:
+            return []
+        offset = self.window_start / self.sample_rate
+        prompt = "".join(word for word, _, _ in self.committed[-50:]).strip()
+        words = [
+            (word, start + offset, end_time + offset)
+            for word, start, end_time in self.stt.transcribe_words(
+                self.buffer.read(self.window_start, end), prompt=prompt
+            )
+        ]
+        self.decodes += 1
+        self.decoded_until = end
+        if final:
+            return words
+
+        # Commit the longest prefix both hypotheses agree on
+        agreed = 0
+        for old, new in zip(self.hypothesis, words):
+            if normalize_word(old[0]) != normalize_word(new[0]):
+                break
+            agreed += 1
+        # If the window grows too long without agreement, commit everything
+        # that ends well before the newest audio
+        if agreed == 0 and end - self.window_start > self.max_window_samples:
+            cutoff = end / self.sample_rate - 2.0
+            while agreed < len(words) and words[agreed][2] <= cutoff:
+                agreed += 1
+
+        if agreed:
+            self.committed.extend(words[:agreed])
+            self.window_start = max(self.window_start, int(words[agreed - 1][2] * self.sample_rate))
+        self.hypothesis = words[agreed:]
+        return words
+
+    def finish(self):
+        """Stop streaming, decode the remaining tail and return the full transcript"""
+        self.stopped.set()
+        if self.worker is not None:
+            self.worker.join()
+        try:
+            with self.lock:
+                if self.decoded_until == self.buffer.write_pos:
+                    # Nothing arrived since the last decode; its hypothesis is current
+                    tail = self.hypothesis
+                else:
+                    tail = self.decode_window(final=True)
+            return "".join(word for word, _, _ in self.committed + tail).strip()
+        except Exception as e:
+            logger.error(f"Streaming transcription error: {e}")
+            return ""
+
+    def cancel(self):
+        self.stopped.set()
+        if self.worker is not None:
+            self.worker.join()
@@ -0,0 +1,194 @@
+import itertools
+import json
+import logging
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+from .conversation_log import ConversationLog
+
+logger = logging.getLogger(__name__)
+
+# Stages in the order they happen within a turn
+STAGES = [
+    "capture",
+    "vad_end",
+    "stt",
+    "lexical_search",
+    "embedding",
+    "vector_search",
+    "llm_ttft",
+    "llm_total",
+    "tts_synthesis",
+    "playback",
+]
+
+
+class TurnTrace:
+    """Spans for one conversational turn, on the monotonic clock"""
+
+    def __init__(self, tracer, turn_id):
+        self.tracer = tracer
+        self.turn_id = turn_id
+        self.origin = time.monotonic()
+        self.spans = []
+        self.fields = {}
+        self.finished = False
+
+    @contextmanager
+    def span(self, stage):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(stage, start, time.monotonic())
+
+    def add(self, stage, start, end):
+        """Record a span from monotonic start/end timestamps (may repeat per stage)"""
+        self.spans.append((stage, start, end))
+
+    def add_duration(self, stage, seconds, end=None):
+        """Record a span known only by its length, ending at end (default: now)"""
+        end = time.monotonic() if end is None else end
+        self.spans.append((stage, end - seconds, end))
+
+    def annotate(self, **fields):
+        """Extra fields for the exported record (e.g. cache_hit=True)"""
+        self.fields.update(fields)
+
+    def stage_totals(self):
+        """Milliseconds per stage, summing repeated spans (e.g. one per sentence)"""
+        totals = {}
+        for stage, start, end in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + (end - start) * 1000
+        return totals
+
+    def finish(self, **fields):
+        if self.finished:
+            return
+        self.finished = True
+        self.tracer.emit(self, dict(self.fields, **fields))
+
+
+class NullTrace:
+    """Stand-in when nobody is tracing; every call is a no-op"""
+    turn_id = None
+
+    @contextmanager
+    def span(self, stage):
+        yield
+
+    def add(self, stage, start, end):
+        pass
+
+    def add_duration(self, stage, seconds, end=None):
+        pass
+
+    def annotate(self, **fields):
+        pass
+
+    def finish(self, **fields):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class Tracer:
+    """Hands out per-turn traces and exports them to the log and, optionally, JSONL"""
+
+    def __init__(self, path=None, session_id=None):
+        self.session_id = session_id or uuid.uuid4().hex[:8]
+        self.counter = itertools.count(1)
+        # Reuses the conversation log's background writer so exporting never blocks a turn
+        self.writer = ConversationLog(path) if path else None
+
+    def start_turn(self):
+        return TurnTrace(self, f"{self.session_id}-{next(self.counter)}")
+
+    def emit(self, trace, fields):
+        record = {
+            "turn_id": trace.turn_id,
+            "session": self.session_id,
+            "origin": trace.origin,
+            "stages": {stage: round(ms, 2) for stage, ms in trace.stage_totals().items()},
+            "spans": [
+                {
+                    "stage": stage,
+                    "start_ms": round((start - trace.origin) * 1000, 2),
+                    "end_ms": round((end - trace.origin) * 1000, 2),
+                }
+                for stage, start, end in trace.spans
+            ],
+        }
+        record.update(fields)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("turn %s %s", trace.turn_id, record["stages"])
+        if self.writer is not None:
+            self.writer.append(record)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def load_traces(path):
+    """Turn records from a JSONL trace file, skipping blank or corrupt lines"""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def stage_percentiles(records):
+    """{stage: {"n", "p50", "p95", "p99"}} in milliseconds, stages in pipeline order"""
+    per_stage = {}
+    for record in records:
+        for stage, ms in record.get("stages", {}).items():
+            per_stage.setdefault(stage, []).append(ms)
+    ordered = [stage for stage in STAGES if stage in per_stage]
+    ordered += sorted(stage for stage in per_stage if stage not in STAGES)
+    summary = {}
+    for stage in ordered:
+        values = sorted(per_stage[stage])
+        summary[stage] = {
+            "n": len(values),
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+        }
+    return summary
+
+
+def summarize(path):
+    """p50/p95/p99 per stage over a JSONL trace file"""
+    records = load_traces(path)
+    lines = [f"{len(records)} turns from {path}", f"{'stage':<15} {'n':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"]
+    for stage, stats in stage_percentiles(records).items():
+        lines.append(
+            f"{stage:<15} {stats['n']:>6} {stats['p50']:>10.1f} "
+            f"{stats['p95']:>10.1f} {stats['p99']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python -m src.tracing summary traces/turns.jsonl
+    if len(sys.argv) == 3 and sys.argv[1] == "summary":
+        print(summarize(sys.argv[2]))
+    else:
+        print("usage: python -m src.tracing summary <trace.jsonl>")
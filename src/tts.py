@@ -1,46 +1,143 @@
 import os
 import logging
-from TTS.api import TTS
-import sounddevice as sd
 import numpy as np
+import threading
+import time
+from .audio_output import create_audio_output
+from .streaming import play_pipelined
+from .tts_cache import SynthesisCache
+from .tracing import NULL_TRACE
+
+logger = logging.getLogger(__name__)
 
 class TextToSpeech:
-    def __init__(self):
+    def __init__(self, config=None, output=None):
+        # Imported here so importing this module doesn't pull in torch
+        from TTS.api import TTS
+        config = config or {}
         # Suppress TTS initialization messages
         logging.getLogger('TTS').setLevel(logging.ERROR)
         os.environ['TTS_VERBOSE'] = '0'
         
-        print("Initializing TTS...")
+        logger.debug("Initializing TTS...")
         # Male voice options:
         # 1. "tts_models/en/vctk/vits" - Multiple speakers including male voices
         # 2. "tts_models/en/ljspeech/glow-tts" - Deeper voice
         # 3. "tts_models/en/sam/tacotron-DDC" - Clear male voice
+        self.model_name = "tts_models/en/vctk/vits"
         self.tts = TTS(
-            model_name="tts_models/en/vctk/vits",
+            model_name=self.model_name,
             progress_bar=True
         )
+        # The model isn't thread-safe; prewarm, the pipeline and the server's batcher all call it
+        self.model_lock = threading.Lock()
+        # Audio is resampled from this rate to the output device's
+        self.sample_rate = self.tts.synthesizer.output_sample_rate
         # Set male speaker (VCTK has multiple speakers)
         self.speaker = "p226"  # Male speaker code | can use p225 for a deeper voice | p224 for a higher pitch 
-        print("TTS ready!")
+        self.speed = 2.0  # Increased speed from 1.8 to 2.0
 
-    def speak(self, text):
-        try:
-            print("Generating speech...")
-            # Generate audio wave with increased speed and male voice
+        # Repeated phrases (greetings, confirmations) are served from the cache
+        cache_config = config.get("cache", {})
+        self.cache = None
+        if cache_config.get("enabled", True):
+            self.cache = SynthesisCache(
+                directory=cache_config.get("directory", "cache/tts"),
+                memory_bytes=int(cache_config.get("memory_mb", 64) * 1024 * 1024),
+                disk_bytes=int(cache_config.get("disk_mb", 512) * 1024 * 1024)
+            )
+            phrases = config.get("prewarm_phrases", [])
+            if phrases:
+                threading.Thread(target=self.prewarm, args=(phrases,), daemon=True).start()
+        # One persistent stream for every reply
+        self.output = output or create_audio_output()
+        self.output.start()
+        logger.info("TTS ready!")
+
+    def prewarm(self, phrases):
+        """Synthesize phrases into the cache ahead of time"""
+        for phrase in phrases:
+            try:
+                self.synthesize(phrase)
+            except Exception as e:
+                logger.error(f"Error pre-warming TTS cache for {phrase!r}: {e}")
+        logger.info(f"TTS cache pre-warmed: {self.cache.stats()}")
+
+    def synthesize(self, text, trace=NULL_TRACE):
+        """Generate normalized float32 audio for text (served from the cache when possible)"""
+        with trace.span("tts_synthesis"):
+            return self.synthesize_uncached(text) if self.cache is None else self.synthesize_cached(text)
+
+    def synthesize_cached(self, text):
+        key = SynthesisCache.make_key(text, self.model_name, self.speaker, self.speed)
+        audio_data = self.cache.get(key)
+        if audio_data is None:
+            audio_data = self.synthesize_uncached(text)
+            self.cache.put(key, audio_data)
+        return audio_data
+
+    def synthesize_uncached(self, text):
+        # Generate audio wave with increased speed and male voice
+        with self.model_lock:
             wav = self.tts.tts(
                 text=text,
                 speaker=self.speaker,  # Specify male speaker
-                speed=2.0  # Increased speed from 1.8 to 2.0
+                speed=self.speed
             )
-            
-            # Convert to float32 and normalize
-            audio_data = np.array(wav, dtype=np.float32)
-            audio_data = audio_data / np.max(np.abs(audio_data))
-            
-            # Play the audio with higher sample rate for clarity
-            print("Playing audio...")
-            sd.play(audio_data, samplerate=24000)  # Increased from 22050
-            sd.wait()
-            
+
+        # Convert to float32 and normalize
+        audio_data = np.array(wav, dtype=np.float32)
+        peak = np.max(np.abs(audio_data)) if audio_data.size else 0.0
+        if peak > 0:
+            audio_data = audio_data / peak
+        return audio_data
+
+    def play(self, audio_data, trace=NULL_TRACE):
+        """Play audio_data and wait until it has been heard"""
+        with trace.span("playback"):
+            self.enqueue(audio_data)
+            self.drain()
+
+    def enqueue(self, audio_data):
+        """Queue audio_data right behind whatever is playing and return"""
+        self.output.play(audio_data, self.sample_rate)
+
+    def drain(self):
+        """Wait for everything queued to finish playing (returns early on stop())"""
+        self.output.drain()
+
+    def stop(self):
+        """Cut off whatever is currently playing"""
+        self.output.cancel()
+
+    def close(self):
+        """Release the output stream (the model goes with the object)"""
+        self.output.stop()
+
+    def speak(self, text, trace=NULL_TRACE):
+        try:
+            logger.debug("Generating speech...")
+            audio_data = self.synthesize(text, trace)
+            logger.debug("Playing audio...")
+            self.play(audio_data, trace)
+
+        except Exception as e:
+            logger.error(f"Error in TTS: {e}")
+
+    def speak_stream(self, sentences, trace=NULL_TRACE):
+        """Speak sentences as they arrive, synthesizing the next one while the current one plays"""
+        started = []
+
+        def enqueue(audio_data):
+            if not started:
+                started.append(time.monotonic())
+            self.enqueue(audio_data)
+
+        try:
+            play_pipelined(sentences, lambda text: self.synthesize(text, trace), enqueue)
         except Exception as e:
-            print(f"Error in TTS: {e}")
\ No newline at end of file
+            logger.error(f"Error in streaming TTS: {e}")
+        finally:
+            self.drain()
+            if started:
+                trace.add("playback", started[0], time.monotonic())
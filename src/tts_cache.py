@@ -0,0 +1,139 @@
+import logging
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text):
+    """Collapse whitespace and case so trivially different strings share an entry"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class SynthesisCache:
+    """Cache of synthesized float32 PCM keyed by (normalized text, model, speaker, speed).
+
+    Recent clips live in an in-memory LRU bounded by memory_bytes; every clip
+    is also spilled to disk as a .npy file (loaded back memory-mapped) within
+    disk_bytes, evicting the least recently used files first.
+    """
+
+    def __init__(self, directory="cache/tts", memory_bytes=64 * 1024 * 1024, disk_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # key -> (size, last use) for what's already on disk
+        self.disk = {}
+        self.disk_used = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            for filename in os.listdir(directory):
+                if filename.endswith(".npy"):
+                    stat = os.stat(os.path.join(directory, filename))
+                    self.disk[filename[:-4]] = (stat.st_size, stat.st_mtime)
+                    self.disk_used += stat.st_size
+
+    @staticmethod
+    def make_key(text, model, speaker, speed):
+        raw = f"{normalize_text(text)}\0{model}\0{speaker}\0{speed}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def get(self, key):
+        with self.lock:
+            audio = self.memory.get(key)
+            if audio is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return audio
+            on_disk = key in self.disk
+
+        if on_disk:
+            try:
+                audio = np.load(self.path_for(key), mmap_mode="r")
+                os.utime(self.path_for(key))
+                with self.lock:
+                    self.disk[key] = (self.disk[key][0], os.path.getmtime(self.path_for(key)))
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self.remember(key, audio)
+                return audio
+            except Exception as e:
+                logger.error(f"Error reading TTS cache entry: {e}")
+                with self.lock:
+                    self.forget_file(key)
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, audio):
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        with self.lock:
+            self.remember(key, audio)
+        if not self.directory or key in self.disk:
+            return
+        try:
+            path = self.path_for(key)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, audio)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+            with self.lock:
+                self.disk[key] = (size, os.path.getmtime(path))
+                self.disk_used += size
+                while self.disk_used > self.disk_bytes and len(self.disk) > 1:
+                    oldest = min(self.disk, key=lambda k: self.disk[k][1])
+                    self.forget_file(oldest)
+        except Exception as e:
+            logger.error(f"Error writing TTS cache entry: {e}")
+
+    def remember(self, key, audio):
+        """Insert into the memory LRU (lock held); memory-mapped clips count by size too,
+        since playing them pages them in"""
+        if audio.nbytes > self.memory_bytes:
+            return
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_used -= previous.nbytes
+        self.memory[key] = audio
+        self.memory_used += audio.nbytes
+        while self.memory_used > self.memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_used -= evicted.nbytes
+
+    def forget_file(self, key):
+        """Drop a disk entry (lock held)"""
+        size, _ = self.disk.pop(key, (0, 0))
+        self.disk_used -= size
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_bytes": self.memory_used,
+            "disk_bytes": self.disk_used,
+            "entries_on_disk": len(self.disk),
+        }
@@ -0,0 +1,171 @@
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """Frame-level voice activity detection on energy and spectral shape.
+
+    A frame counts as voiced when its energy is well above an adaptive noise
+    floor and most of that energy sits in the speech band. Onset needs a few
+    consecutive voiced frames (so a single click doesn't count) and the speech
+    state is held for a hangover period after the last voiced frame.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=20, margin_db=12.0, min_energy_db=-55.0,
+                 initial_floor_db=-45.0, speech_band=(80, 4000), band_ratio=0.6,
+                 onset_ms=60, hangover_ms=200):
+        self.sample_rate = sample_rate
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.initial_floor_db = initial_floor_db
+        self.band_ratio = band_ratio
+        self.onset_frames = max(1, int(onset_ms / frame_ms))
+        self.hangover_frames = max(0, int(hangover_ms / frame_ms))
+
+        freqs = np.fft.rfftfreq(self.frame_length, 1.0 / sample_rate)
+        self.band = (freqs >= speech_band[0]) & (freqs <= speech_band[1])
+        self.window = np.hanning(self.frame_length).astype(np.float32)
+        self.scratch = np.empty(self.frame_length, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.noise_floor_db = None
+        self.voiced_run = 0
+        self.hangover = 0
+        self.is_speech = False
+
+    def frame_features(self, frame):
+        """(energy in dBFS, share of spectral energy inside the speech band)"""
+        np.multiply(frame, 1.0 / 32768.0, out=self.scratch, casting='unsafe')
+        energy = float(np.dot(self.scratch, self.scratch)) / self.frame_length
+        energy_db = 10.0 * np.log10(energy + 1e-12)
+        spectrum = np.abs(np.fft.rfft(self.scratch * self.window)) ** 2
+        total = float(spectrum.sum()) + 1e-12
+        return energy_db, float(spectrum[self.band].sum()) / total
+
+    def process(self, frame):
+        """Feed one frame of int16 samples; returns the smoothed speech state"""
+        energy_db, band_share = self.frame_features(frame)
+
+        if self.noise_floor_db is None:
+            # Don't let speech in the very first frame become the floor
+            self.noise_floor_db = min(energy_db, self.initial_floor_db)
+        voiced = (
+            energy_db > self.min_energy_db
+            and energy_db > self.noise_floor_db + self.margin_db
+            and band_share > self.band_ratio
+        )
+
+        # Track the floor quickly downward, slowly upward, and only on unvoiced frames
+        if not voiced:
+            rate = 0.2 if energy_db < self.noise_floor_db else 0.02
+            self.noise_floor_db += rate * (energy_db - self.noise_floor_db)
+
+        if voiced:
+            self.voiced_run += 1
+            if self.voiced_run >= self.onset_frames:
+                self.is_speech = True
+                self.hangover = self.hangover_frames
+        else:
+            self.voiced_run = 0
+            if self.is_speech:
+                if self.hangover > 0:
+                    self.hangover -= 1
+                else:
+                    self.is_speech = False
+        return self.is_speech
+
+
+class EndpointDetector:
+    """Decides when an utterance has started and finished from VAD output"""
+
+    WAITING, SPEECH, DONE, TIMEOUT = "waiting", "speech", "done", "timeout"
+
+    def __init__(self, vad, silence_duration=0.5, start_timeout=3.0, max_duration=30.0):
+        self.vad = vad
+        frame_seconds = vad.frame_length / vad.sample_rate
+        self.silence_frames = int(silence_duration / frame_seconds)
+        self.start_timeout_frames = int(start_timeout / frame_seconds)
+        self.max_frames = int(max_duration / frame_seconds)
+        self.reset()
+
+    def reset(self):
+        self.vad.reset()
+        self.state = self.WAITING
+        self.frames = 0
+        self.quiet_frames = 0
+        self.speech_start_frame = None
+        self.speech_end_frame = None
+
+    def process(self, frame):
+        """Feed one frame; returns the endpoint state after it"""
+        speech = self.vad.process(frame)
+        self.frames += 1
+
+        if self.state == self.WAITING:
+            if speech:
+                self.state = self.SPEECH
+                # Onset was confirmed a few frames after it actually began
+                self.speech_start_frame = max(0, self.frames - self.vad.onset_frames)
+            elif self.frames >= self.start_timeout_frames:
+                self.state = self.TIMEOUT
+        elif self.state == self.SPEECH:
+            if speech:
+                self.quiet_frames = 0
+            else:
+                if self.quiet_frames == 0:
+                    # The VAD only drops out after its hangover; speech ended before that
+                    self.speech_end_frame = max(self.speech_start_frame, self.frames - 1 - self.vad.hangover_frames)
+                self.quiet_frames += 1
+                if self.quiet_frames >= self.silence_frames:
+                    self.state = self.DONE
+            if self.frames >= self.max_frames:
+                self.speech_end_frame = self.speech_end_frame or self.frames
+                self.state = self.DONE
+        return self.state
+
+
+class EnergyGate:
+    """Cheap pre-filter that keeps the wake word engine off in a quiet room.
+
+    Opens when a frame's energy is margin_db above an adaptive noise floor
+    (and above min_energy_db) and stays open for hold_ms after the last
+    such frame. Energy only: no FFT, so it costs far less than the engine.
+    """
+
+    def __init__(self, sample_rate=16000, frame_length=512, margin_db=10.0, min_energy_db=-60.0,
+                 initial_floor_db=-50.0, hold_ms=1500):
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.initial_floor_db = initial_floor_db
+        self.hold_frames = max(1, int(hold_ms * sample_rate / 1000 / frame_length))
+        self.reset()
+
+    def reset(self):
+        self.noise_floor_db = None
+        self.hold = 0
+
+    @property
+    def is_open(self):
+        return self.hold > 0
+
+    @staticmethod
+    def energies(frames):
+        """Energy in dBFS of each row of a (frames x samples) int16 array"""
+        scaled = frames.astype(np.float32) * (1.0 / 32768.0)
+        return 10.0 * np.log10(np.einsum("ij,ij->i", scaled, scaled) / frames.shape[1] + 1e-12)
+
+    def update(self, energy_db, hold_frames=None):
+        """Feed one frame's energy; returns True while the gate is open"""
+        if self.noise_floor_db is None:
+            self.noise_floor_db = min(energy_db, self.initial_floor_db)
+        loud = energy_db > self.min_energy_db and energy_db > self.noise_floor_db + self.margin_db
+        if loud:
+            self.hold = max(self.hold, hold_frames or self.hold_frames)
+            # Creep up slowly so steady new noise (a fan switching on) becomes the floor
+            rate = 0.005
+        else:
+            rate = 0.2 if energy_db < self.noise_floor_db else 0.02
+            self.hold = max(0, self.hold - 1)
+        self.noise_floor_db += rate * (energy_db - self.noise_floor_db)
+        return self.hold > 0
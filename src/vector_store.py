@@ -0,0 +1,380 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Rows converted to float32 at a time while scoring a shard; small enough to stay in cache
+SEARCH_BLOCK = 8192
+
+
+class Document:
+    """Search result with the same attribute names as a LangChain Document"""
+
+    def __init__(self, page_content, metadata=None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+
+def month_of(timestamp):
+    """(shard name "YYYY-MM", epoch seconds) for an ISO timestamp; now if missing or invalid"""
+    try:
+        moment = datetime.fromisoformat(timestamp) if timestamp else datetime.now()
+    except (TypeError, ValueError):
+        moment = datetime.now()
+    return moment.strftime("%Y-%m"), moment.timestamp()
+
+
+class Segment:
+    """One immutable slice of a shard on disk.
+
+    vectors.npy holds unit-length embeddings as float16, or int8 with a
+    per-row scale in scales.npy; times.npy the turn times; rows.jsonl the
+    texts and metadata, located through offsets.npy so only the hits are
+    ever read. The arrays are memory-mapped, so an idle segment costs page
+    cache rather than RSS. Deletions are tombstones in deleted.npy until
+    compaction. The mmaps and the open rows file stay readable after
+    compaction removes the directory, so a search that started before it
+    still finishes on the old rows.
+    """
+
+    def __init__(self, path, count, row_ids=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.count = count
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")[:count]
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path, mmap_mode="r")[:count] if os.path.exists(scales_path) else None
+        self.times = np.load(os.path.join(path, "times.npy"), mmap_mode="r")[:count]
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")[:count + 1]
+        deleted_path = os.path.join(path, "deleted.npy")
+        self.deleted = np.load(deleted_path)[:count] if os.path.exists(deleted_path) else np.zeros(count, dtype=bool)
+        self.rows_file = open(os.path.join(path, "rows.jsonl"), "rb")
+        self.row_ids = row_ids
+
+    @property
+    def live(self):
+        return int(self.count - self.deleted.sum())
+
+    def lines(self, indices):
+        """Raw JSON lines of the given rows, read in one call"""
+        indices = np.asarray(indices, dtype=np.int64)
+        if not len(indices):
+            return []
+        starts = self.offsets[indices]
+        ends = self.offsets[indices + 1]
+        base = int(starts.min())
+        data = os.pread(self.rows_file.fileno(), int(ends.max()) - base, base)
+        return [data[start - base:end - base] for start, end in zip(starts.tolist(), ends.tolist())]
+
+    def id_list(self, indices):
+        """Ids of the given rows, from ids() where it is unambiguous"""
+        names = np.empty(self.count, dtype=object)
+        for row_id, index in self.ids().items():
+            names[index] = row_id
+        result = names[indices].tolist()
+        for i, row_id in enumerate(result):
+            if row_id is None:
+                # An id repeated within the segment: ids() only knows its last row
+                result[i] = self.rows([indices[i]])[0]["id"]
+        return result
+
+    def rows(self, indices):
+        return [json.loads(line) for line in self.lines(indices)]
+
+    def ids(self):
+        """Row id -> index, read on first use unless the segment was just written"""
+        if self.row_ids is None:
+            self.row_ids = {row["id"]: i for i, row in enumerate(self.rows(range(self.count)))}
+        return self.row_ids
+
+    def tombstone(self, indices):
+        self.deleted[indices] = True
+        tmp_path = os.path.join(self.path, "deleted.tmp.npy")
+        np.save(tmp_path, self.deleted)
+        os.replace(tmp_path, os.path.join(self.path, "deleted.npy"))
+
+    def scores(self, query):
+        """Cosine similarity of every row to the unit query vector"""
+        out = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SEARCH_BLOCK):
+            block = np.asarray(self.vectors[start:start + SEARCH_BLOCK], dtype=np.float32)
+            out[start:start + len(block)] = block @ query
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+
+class ShardedVectorStore:
+    """Local vector index partitioned by month, searched by brute-force matmul.
+
+    Exposes the subset of the Chroma API that ConversationRetrieval uses
+    (add_texts, delete, similarity_search_by_vector), plus add_embeddings
+    for vectors computed elsewhere. Adding an id that is already stored
+    replaces it. Scores get a recency
+    bonus of recency_weight * 0.5 ** (age_days / recency_half_life_days).
+
+    Each month shard is a list of segments. An add writes only its own rows
+    as a new segment, so batched ingest costs the size of each batch rather
+    than of the month so far; merge_tail() keeps the number of segments
+    logarithmic. Segments are never rewritten in place.
+    compact() merges each shard's segments into one, dropping tombstoned
+    rows, merges months older than merge_after_months into one shard per
+    year and deletes shards past retention_months.
+    """
+
+    def __init__(self, embedding_function, persist_directory, dtype="int8", recency_weight=0.05,
+                 recency_half_life_days=30.0, merge_after_months=12, retention_months=None):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported vector dtype '{dtype}', expected float16 or int8")
+        self.embedding_function = embedding_function
+        self.directory = persist_directory
+        self.dtype = dtype
+        self.recency_weight = recency_weight
+        self.recency_half_life = recency_half_life_days * 86400
+        self.merge_after_months = merge_after_months
+        self.retention_months = retention_months
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(self.directory, "shards.json")
+        os.makedirs(os.path.join(self.directory, "shards"), exist_ok=True)
+        self.shards = {}  # name -> [Segment], oldest first
+        self.next_segment = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {"dtype": self.dtype, "shards": {}}
+        if manifest.get("dtype") != self.dtype:
+            raise ValueError(f"{self.directory} holds {manifest.get('dtype')} vectors, not {self.dtype}")
+        migrated = False
+        for name, segments in manifest["shards"].items():
+            path = os.path.join(self.directory, "shards", name)
+            if isinstance(segments, int):
+                # Single-file shard from before segments: it becomes the shard's first segment
+                os.replace(path, path + ".old")
+                os.makedirs(path)
+                os.replace(path + ".old", os.path.join(path, "000000"))
+                segments = [["000000", segments]]
+                migrated = True
+            listed = {segment for segment, _ in segments}
+            for leftover in os.listdir(path):
+                # Unfinished writes, or segments a compaction had replaced when it was interrupted
+                if leftover not in listed:
+                    shutil.rmtree(os.path.join(path, leftover), ignore_errors=True)
+            self.shards[name] = [Segment(os.path.join(path, segment), count) for segment, count in segments]
+            self.next_segment = max([self.next_segment] + [int(segment) + 1 for segment in listed])
+        if migrated:
+            self.save_manifest()
+
+    def save_manifest(self):
+        manifest = {"dtype": self.dtype, "shards": {
+            name: [[segment.name, segment.count] for segment in segments]
+            for name, segments in sorted(self.shards.items())
+        }}
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def __len__(self):
+        return sum(segment.live for segments in self.shards.values() for segment in segments)
+
+    def encode(self, vectors):
+        """Unit-normalize and quantize; returns (stored vectors, per-row scales or None)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-9) / 127.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def write_segment(self, name, vectors, scales, times, lines, ids):
+        """Write a new segment of shard name from encoded rows; the caller adds it to the manifest"""
+        segment = f"{self.next_segment:06d}"
+        self.next_segment += 1
+        path = os.path.join(self.directory, "shards", name, segment)
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum([len(line) for line in lines], out=offsets[1:])
+        with open(os.path.join(tmp_path, "rows.jsonl"), "wb") as f:
+            f.write(b"".join(lines))
+        np.save(os.path.join(tmp_path, "vectors.npy"), vectors)
+        if scales is not None:
+            np.save(os.path.join(tmp_path, "scales.npy"), scales)
+        np.save(os.path.join(tmp_path, "times.npy"), np.asarray(times, dtype=np.float64))
+        np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+        os.replace(tmp_path, path)
+        return Segment(path, len(lines), {row_id: i for i, row_id in enumerate(ids)})
+
+    def merge_segments(self, name, segments):
+        """One new segment of shard name holding the live rows of segments, or None if there are none"""
+        parts = [(segment, np.flatnonzero(~segment.deleted)) for segment in segments]
+        parts = [(segment, keep) for segment, keep in parts if len(keep)]
+        if not parts:
+            return None
+        return self.write_segment(
+            name,
+            np.concatenate([np.asarray(segment.vectors[keep]) for segment, keep in parts]),
+            None if self.dtype == "float16" else np.concatenate([np.asarray(segment.scales[keep]) for segment, keep in parts]),
+            np.concatenate([np.asarray(segment.times[keep]) for segment, keep in parts]),
+            [line for segment, keep in parts for line in segment.lines(keep)],
+            [row_id for segment, keep in parts for row_id in segment.id_list(keep)]
+        )
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        """Embed and store texts; each goes to the month of its metadata["timestamp"]"""
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas, ids)
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [f"{time.time_ns()}-{i}" for i in range(len(texts))]
+        vectors, scales = self.encode(embeddings)
+
+        by_month = {}
+        for i, metadata in enumerate(metadatas):
+            month, moment = month_of(metadata.get("timestamp"))
+            by_month.setdefault(month, []).append((i, moment))
+
+        retired = []
+        with self.lock:
+            for month, members in by_month.items():
+                index = [i for i, _ in members]
+                month_ids = [ids[i] for i in index]
+                segments = self.shards.setdefault(month, [])
+                # Re-adding an id (e.g. a resumed ingest) replaces the old row
+                for segment in segments:
+                    hits = [segment.ids()[row_id] for row_id in month_ids if row_id in segment.ids()]
+                    if hits:
+                        segment.tombstone(hits)
+                lines = [
+                    (json.dumps({"id": ids[i], "text": texts[i], "metadata": metadatas[i]}, ensure_ascii=False)
+                     + "\n").encode("utf-8")
+                    for i in index
+                ]
+                segments.append(self.write_segment(
+                    month,
+                    vectors[index],
+                    None if scales is None else scales[index],
+                    [moment for _, moment in members],
+                    lines,
+                    month_ids
+                ))
+                retired.extend(self.merge_tail(month))
+            self.save_manifest()
+            for path in retired:
+                shutil.rmtree(path, ignore_errors=True)
+        return ids
+
+    def merge_tail(self, name):
+        """Merge the shard's newest segments while the older one is at most twice the size of the newer.
+
+        Segment sizes then grow geometrically, so a long batched ingest
+        leaves a logarithmic number of segments and copies each row a
+        logarithmic number of times. Returns the paths of the merged
+        segments, to remove once the manifest no longer lists them.
+        """
+        segments = self.shards[name]
+        retired = []
+        while len(segments) > 1 and segments[-2].count <= 2 * segments[-1].count:
+            pair = segments[-2:]
+            merged = self.merge_segments(name, pair)
+            segments[-2:] = [] if merged is None else [merged]
+            retired.extend(segment.path for segment in pair)
+        return retired
+
+    def delete(self, ids):
+        ids = set(ids)
+        with self.lock:
+            for segments in self.shards.values():
+                for segment in segments:
+                    row_ids = segment.ids()
+                    hits = [row_ids[row_id] for row_id in ids if row_id in row_ids]
+                    if hits:
+                        segment.tombstone(hits)
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-9)
+        now = time.time()
+        candidates = []
+        with self.lock:
+            segments = [segment for shard in self.shards.values() for segment in shard]
+        for segment in segments:
+            if not segment.count:
+                continue
+            scores = segment.scores(query)
+            if self.recency_weight:
+                age = np.maximum(now - np.asarray(segment.times), 0.0)
+                scores += self.recency_weight * np.exp2(-age / self.recency_half_life).astype(np.float32)
+            scores[segment.deleted] = -np.inf
+            top = min(k, segment.count)
+            best = np.argpartition(-scores, top - 1)[:top]
+            candidates.extend((float(scores[i]), segment, int(i)) for i in best if np.isfinite(scores[i]))
+
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        results = []
+        for score, segment, index in candidates[:k]:
+            row = segment.rows([index])[0]
+            results.append(Document(row["text"], dict(row["metadata"], score=score)))
+        return results
+
+    def compact(self):
+        """Merge each shard's segments, dropping deleted rows; merge old months into years; apply retention"""
+        with self.lock:
+            now = datetime.now()
+            current = now.year * 12 + now.month - 1
+            groups = {}
+            retired = []
+            for name, segments in sorted(self.shards.items()):
+                # Age in months of the newest month the shard can hold
+                if len(name) == 7:
+                    year, month = (int(part) for part in name.split("-"))
+                    end_age = current - (year * 12 + month - 1)
+                else:
+                    end_age = current - (int(name) * 12 + 11)
+                if self.retention_months is not None and end_age >= self.retention_months:
+                    logger.info(f"Dropping shard {name} (past retention)")
+                    retired.extend(segment.path for segment in self.shards.pop(name))
+                    continue
+                target = name[:4] if self.merge_after_months is not None and end_age >= self.merge_after_months else name
+                groups.setdefault(target, []).append(name)
+
+            for target, names in groups.items():
+                segments = [segment for name in names for segment in self.shards[name]]
+                needs_merge = names != [target] or len(segments) > 1
+                needs_vacuum = any(segment.deleted.any() for segment in segments)
+                if not (needs_merge or needs_vacuum):
+                    continue
+                merged = self.merge_segments(target, segments)
+                for name in names:
+                    del self.shards[name]
+                retired.extend(segment.path for segment in segments)
+                if merged is not None:
+                    self.shards[target] = [merged]
+                logger.info(f"Compacted {', '.join(names)} into {target} ({merged.count if merged else 0} rows)")
+            self.save_manifest()
+
+            # Only now that the manifest no longer lists them; open searches keep their handles
+            for path in retired:
+                shutil.rmtree(path, ignore_errors=True)
+            for name in os.listdir(os.path.join(self.directory, "shards")):
+                if name not in self.shards:
+                    shutil.rmtree(os.path.join(self.directory, "shards", name), ignore_errors=True)
@@ -1,39 +1,112 @@
-import pvporcupine
-import sounddevice as sd
-import numpy as np
+import logging
 from dotenv import load_dotenv
 import os
 
+from .vad import EnergyGate
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 PVPORCUPINE = os.getenv("PVPORCUPINE")
 
 class WakeWordDetector:
-    def __init__(self, wake_word_path="config/wake_words/Hey-Austin_en_mac_v3_0_0.ppn"):
-        print("Initializing wake word detector...")
-        self.porcupine = pvporcupine.create(
-            access_key=PVPORCUPINE,  # Replace with your actual AccessKey
-            keyword_paths=[wake_word_path]
-        )
-        print(f"Sample rate: {self.porcupine.sample_rate}")
-        print(f"Frame length: {self.porcupine.frame_length}")
-        
-        self.audio_stream = sd.InputStream(
-            channels=1,
-            samplerate=self.porcupine.sample_rate,
-            blocksize=self.porcupine.frame_length,
-            dtype=np.int16
-        )
-        self.audio_stream.start()
-        print("Audio stream started")
+    """Runs the wake word engine over the shared audio source.
+
+    With the energy gate enabled, frames are first checked for sound and
+    quiet stretches are read idle_batch_frames at a time and never reach the
+    engine. When the gate opens, the reader backs up lookback_ms in the
+    shared buffer, so the engine still hears the start of the wake word.
+    """
+
+    def __init__(self, audio_source, wake_word_path="config/wake_words/Hey-Austin_en_mac_v3_0_0.ppn",
+                 engine=None, gate=None):
+        logger.debug("Initializing wake word detector...")
+        if engine is None:
+            import pvporcupine
+            engine = pvporcupine.create(
+                access_key=PVPORCUPINE,  # Replace with your actual AccessKey
+                keyword_paths=[wake_word_path]
+            )
+        # Anything with sample_rate, frame_length and process(pcm) works here
+        self.porcupine = engine
+        logger.debug(f"Sample rate: {self.porcupine.sample_rate}")
+        logger.debug(f"Frame length: {self.porcupine.frame_length}")
+
+        if audio_source.sample_rate != self.porcupine.sample_rate:
+            raise ValueError(
+                f"Audio source runs at {audio_source.sample_rate}Hz, "
+                f"wake word engine needs {self.porcupine.sample_rate}Hz"
+            )
+        # Frames come from the shared audio source rather than our own stream
+        self.reader = audio_source.reader()
+
+        gate = gate or {}
+        frame_length = self.porcupine.frame_length
+        self.gate = None
+        if gate.get("enabled", False):
+            self.gate = EnergyGate(
+                sample_rate=self.porcupine.sample_rate,
+                frame_length=frame_length,
+                margin_db=gate.get("margin_db", 10.0),
+                min_energy_db=gate.get("min_energy_db", -60.0),
+                hold_ms=gate.get("hold_ms", 1500)
+            )
+        self.lookback_frames = int(gate.get("lookback_ms", 500) * self.porcupine.sample_rate / 1000) // frame_length
+        self.idle_batch_frames = max(1, gate.get("idle_batch_frames", 4))
+        self.frames_processed = 0
+        self.frames_gated = 0
+
+    @property
+    def position(self):
+        """Absolute sample position just after the last processed frame"""
+        return self.reader.position
+
+    def resume(self):
+        """Skip audio that piled up while we weren't listening (e.g. during a conversation)"""
+        self.reader.skip_to_latest()
+        if self.gate is not None:
+            self.gate.reset()
 
     def listen(self):
         try:
-            audio_data, _ = self.audio_stream.read(self.porcupine.frame_length)
-            pcm = audio_data.flatten()
+            frame_length = self.porcupine.frame_length
+            if self.gate is not None and not self.gate.is_open:
+                return self.wait_for_sound()
+            pcm = self.reader.read(frame_length, timeout=1.0)
+            if pcm is None:
+                return False
+            if self.gate is not None:
+                self.gate.update(float(EnergyGate.energies(pcm.reshape(1, -1))[0]))
+            self.frames_processed += 1
             keyword_index = self.porcupine.process(pcm)
             if keyword_index >= 0:
-                print("Wake word detected!")
+                logger.info("Wake word detected!")
             return keyword_index >= 0
         except Exception as e:
-            print(f"Error in listen(): {e}")
-            return False 
\ No newline at end of file
+            logger.error(f"Error in listen(): {e}")
+            return False
+
+    def wait_for_sound(self):
+        """Check a batch of frames against the gate; on sound, rewind for the engine. Always False."""
+        frame_length = self.porcupine.frame_length
+        start = self.reader.position
+        pcm = self.reader.read(frame_length * self.idle_batch_frames, timeout=1.0)
+        if pcm is None:
+            return False
+        for i, energy_db in enumerate(EnergyGate.energies(pcm.reshape(-1, frame_length))):
+            # Held long enough for the engine to work through the look-back
+            if self.gate.update(float(energy_db), self.gate.hold_frames + self.lookback_frames):
+                self.reader.seek(start + (i - self.lookback_frames) * frame_length)
+                # Frames replayed for the look-back are counted when the engine gets them
+                self.frames_gated += i - (start + i * frame_length - self.reader.position) // frame_length
+                return False
+        self.frames_gated += self.idle_batch_frames
+        return False
+
+    def stats(self):
+        total = self.frames_processed + self.frames_gated
+        return {
+            "frames_processed": self.frames_processed,
+            "frames_gated": self.frames_gated,
+            "gated_share": self.frames_gated / total if total else 0.0,
+        }
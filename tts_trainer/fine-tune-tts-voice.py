@@ -5,35 +5,29 @@ from TTS.config import load_config
 from TTS.utils.manage import ModelManager
 import torch
 
+DATASET_DIR = "tts_trainer/dataset"
+
 def prepare_dataset(voice_samples_dir):
-    """Prepare dataset metadata"""
-    metadata = []
-    for file in os.listdir(voice_samples_dir):
-        if file.endswith('.wav'):
-            # We need actual transcriptions for each audio file
-            # Current code uses placeholder text which won't work well
-            metadata.append(f"{file}|Your transcribed text here|your_voice|")
-    
-    # Save metadata
-    with open('metadata.txt', 'w', encoding='utf-8') as f:
-        for line in metadata:
-            f.write(line + '\n')
+    """Resample, featurize and transcribe the samples into DATASET_DIR (only new or changed clips)"""
+    # Run as python -m tts_trainer.fine-tune-tts-voice so the project packages import
+    from tts_trainer.preprocess import preprocess_dataset
+    return preprocess_dataset(voice_samples_dir, DATASET_DIR)
 
 def validate_audio(file_path):
-    """Validate audio files meet requirements"""
+    """Validate audio files meet requirements (reads only the header)"""
     try:
-        import soundfile as sf
-        data, samplerate = sf.read(file_path)
+        from tts_trainer.preprocess import read_header
+        samplerate, channels, frames = read_header(file_path)
         
         if samplerate != 16000:
             print(f"Warning: {file_path} sample rate is {samplerate}Hz, needs to be 16000Hz")
             return False
             
-        if len(data.shape) > 1:
+        if channels > 1:
             print(f"Warning: {file_path} is not mono")
             return False
             
-        duration = len(data) / samplerate
+        duration = frames / samplerate
         if duration < 1 or duration > 20:
             print(f"Warning: {file_path} duration ({duration}s) is not optimal")
             return False
@@ -65,7 +59,7 @@ def train_tts_model():
         "datasets": [
             {
                 "name": "your_voice_dataset",
-                "path": "path/to/your_voice_samples",
+                "path": DATASET_DIR,
                 "meta_file_train": "metadata.txt",
                 "language": "en",
                 "audio": {
@@ -0,0 +1,379 @@
+# dataset preprocessing for fine-tuning
+# validates, resamples and transcribes the clips in voice_samples, writes
+# dataset/wavs, dataset/features and dataset/metadata.txt
+# re-running only touches new or changed clips (see dataset/manifest.json)
+#
+# python -m tts_trainer.preprocess tts_trainer/voice_samples --output tts_trainer/dataset
+
+import argparse
+import hashlib
+import json
+import os
+import time
+import wave
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from src.audio_output import resample
+
+AUDIO_EXTENSIONS = (".wav", ".flac")
+MANIFEST_VERSION = 1
+
+# Output audio and log-mel features; changing any of these reprocesses every clip
+DEFAULT_SETTINGS = {
+    "sample_rate": 22050,
+    "min_seconds": 1.0,
+    "max_seconds": 20.0,
+    "n_fft": 1024,
+    "hop_length": 256,
+    "n_mels": 80,
+    "fmin": 0.0,
+    "fmax": 8000.0,
+}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def settings_key(settings):
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def read_header(path):
+    """(sample_rate, channels, frames) from the file header alone, without decoding the audio"""
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+        return info.samplerate, info.channels, info.frames
+    except ImportError:
+        with wave.open(path, "rb") as wav:
+            return wav.getframerate(), wav.getnchannels(), wav.getnframes()
+
+
+def read_audio(path):
+    """(float32 mono samples in [-1, 1], sample rate)"""
+    try:
+        import soundfile as sf
+        data, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+    except ImportError:
+        with wave.open(path, "rb") as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError("expected 16-bit samples (install soundfile for other formats)")
+            sample_rate = wav.getframerate()
+            data = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            data = data.reshape(-1, wav.getnchannels()).astype(np.float32) / 32768.0
+    return data.mean(axis=1), sample_rate
+
+
+def write_wav(path, audio, sample_rate):
+    temp_path = path + ".tmp"
+    with wave.open(temp_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+    os.replace(temp_path, path)
+
+
+def mel_filterbank(sample_rate, n_fft, n_mels, fmin, fmax):
+    """Triangular filters on the HTK mel scale, (n_mels x n_fft // 2 + 1)"""
+    mel = lambda hz: 2595.0 * np.log10(1.0 + hz / 700.0)
+    hz = lambda m: 700.0 * (10.0 ** (m / 2595.0) - 1.0)
+    edges = hz(np.linspace(mel(fmin), mel(fmax), n_mels + 2))
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bins - lower) / (center - lower)
+    falling = (upper - bins) / (upper - center)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def log_mel(audio, settings):
+    """(n_mels x frames) log-mel spectrogram of float32 audio at settings["sample_rate"]"""
+    n_fft, hop = settings["n_fft"], settings["hop_length"]
+    padded = np.pad(audio, n_fft // 2, mode="reflect")
+    frames = np.lib.stride_tricks.sliding_window_view(padded, n_fft)[::hop]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(n_fft).astype(np.float32), axis=1)) ** 2
+    filters = mel_filterbank(settings["sample_rate"], n_fft, settings["n_mels"], settings["fmin"], settings["fmax"])
+    return np.log(np.maximum(filters @ spectrum.T, 1e-10)).astype(np.float32)
+
+
+def prepare_clip(path, output_dir, settings, want_audio, transcribed_hash=None):
+    """Validate, resample and featurize one clip; runs in a worker process.
+
+    Returns the manifest entry, plus 16 kHz int16 audio for transcription
+    when want_audio is set and the content isn't the already transcribed
+    transcribed_hash.
+    """
+    stat = os.stat(path)
+    entry = {"mtime": stat.st_mtime, "size": stat.st_size}
+    try:
+        sample_rate, channels, frames = read_header(path)
+    except Exception as e:
+        return dict(entry, status="invalid", reason=f"unreadable header: {e}"), None
+    duration = frames / sample_rate
+    if not settings["min_seconds"] <= duration <= settings["max_seconds"]:
+        return dict(entry, status="invalid", reason=f"duration {duration:.1f}s"), None
+
+    name = os.path.basename(path)
+    if not name.lower().endswith(".wav"):
+        name += ".wav"
+    wav_path = os.path.join(output_dir, "wavs", name)
+    digest = file_hash(path)
+    want_audio = want_audio and digest != transcribed_hash
+    feature_path = os.path.join(output_dir, "features", f"{digest}-{settings_key(settings)}.npy")
+    entry.update(status="ok", hash=digest, duration=round(duration, 3), wav=name, channels=channels,
+                 source_rate=sample_rate)
+    if os.path.exists(feature_path) and os.path.exists(wav_path) and not want_audio:
+        # Same content as a clip processed before (touched, or renamed back)
+        return entry, None
+
+    try:
+        audio, sample_rate = read_audio(path)
+    except Exception as e:
+        return dict(entry, status="invalid", reason=f"unreadable audio: {e}"), None
+    clip = resample(audio, sample_rate, settings["sample_rate"])
+    peak = np.max(np.abs(clip)) if clip.size else 0.0
+    if peak == 0:
+        return dict(entry, status="invalid", reason="silent"), None
+    clip = clip * (0.95 / peak)
+    write_wav(wav_path, clip, settings["sample_rate"])
+    if not os.path.exists(feature_path):
+        np.save(feature_path, log_mel(clip, settings))
+
+    speech = None
+    if want_audio:
+        speech = (np.clip(resample(audio / peak * 0.95, sample_rate, 16000), -1.0, 1.0) * 32767).astype(np.int16)
+    return entry, speech
+
+
+class DatasetPreprocessor:
+    """Incremental, parallel preparation of a fine-tuning dataset.
+
+    Clips whose size and mtime match the manifest are skipped without being
+    opened. The rest are validated from their headers, then resampled,
+    normalized and turned into log-mel features in a process pool; features
+    are cached by content hash and settings. Clips without a sidecar .txt
+    transcript are transcribed with the project's SpeechToText in batches
+    of transcribe_batch clips, decoded concurrently when the backend
+    allows it (faster-whisper num_workers). The manifest is saved after
+    every batch, so an interrupted run picks up where it stopped.
+    """
+
+    def __init__(self, samples_dir, output_dir="tts_trainer/dataset", settings=None, workers=None,
+                 stt_config=None, transcribe_batch=16, transcribe_workers=2, speaker="your_voice"):
+        self.samples_dir = samples_dir
+        self.output_dir = output_dir
+        self.settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+        self.workers = workers or os.cpu_count()
+        self.stt_config = dict(stt_config or {})
+        self.transcribe_batch = transcribe_batch
+        self.transcribe_workers = transcribe_workers
+        self.speaker = speaker
+        self.manifest_path = os.path.join(output_dir, "manifest.json")
+        self.stt = None
+        self.counts = {"clips": 0, "unchanged": 0, "processed": 0, "invalid": 0, "transcribed": 0, "removed": 0}
+        for sub in ("wavs", "features"):
+            os.makedirs(os.path.join(output_dir, sub), exist_ok=True)
+
+    def load_manifest(self):
+        empty = {"version": MANIFEST_VERSION, "settings": self.settings, "files": {}, "transcripts": {}}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return empty
+        if manifest.get("version") != MANIFEST_VERSION:
+            return empty
+        if manifest.get("settings") != self.settings:
+            # Every clip needs redoing, but transcripts (by content hash) still apply
+            print("Preprocessing settings changed, reprocessing all clips")
+            return dict(empty, transcripts=manifest.get("transcripts", {}))
+        return manifest
+
+    def save_manifest(self, manifest):
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, self.manifest_path)
+
+    def sidecar_transcript(self, path):
+        transcript_path = os.path.splitext(path)[0] + ".txt"
+        if not os.path.exists(transcript_path):
+            return None
+        with open(transcript_path, "r", encoding="utf-8") as f:
+            return " ".join(f.read().split())
+
+    def scan(self, manifest):
+        """Audio files that are new or changed since the last run; forgets deleted ones"""
+        files = manifest["files"]
+        present = set()
+        changed = []
+        for dir_entry in sorted(os.scandir(self.samples_dir), key=lambda e: e.name):
+            if not dir_entry.is_file() or not dir_entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                continue
+            present.add(dir_entry.name)
+            self.counts["clips"] += 1
+            stat = dir_entry.stat()
+            entry = files.get(dir_entry.name)
+            sidecar = self.sidecar_transcript(dir_entry.path)
+            unchanged = (
+                entry is not None
+                and (entry["mtime"], entry["size"]) == (stat.st_mtime, stat.st_size)
+                and (entry["status"] != "ok" or (
+                    entry.get("transcript") is not None
+                    and (sidecar is None or entry["transcript"] == sidecar)
+                    and os.path.exists(os.path.join(self.output_dir, "wavs", entry["wav"]))
+                ))
+            )
+            if unchanged:
+                self.counts["unchanged"] += 1
+            else:
+                changed.append((dir_entry.name, dir_entry.path, sidecar))
+
+        for name in set(files) - present:
+            entry = files.pop(name)
+            if entry.get("wav"):
+                try:
+                    os.remove(os.path.join(self.output_dir, "wavs", entry["wav"]))
+                except FileNotFoundError:
+                    pass
+            self.counts["removed"] += 1
+        return changed
+
+    def load_stt(self):
+        if self.stt is None:
+            from src.stt import SpeechToText
+            config = dict(self.stt_config, streaming=False)
+            if config.get("backend", "whisper") == "faster-whisper":
+                # CTranslate2 decodes this many clips at once on separate threads
+                config["faster-whisper"] = dict(config.get("faster-whisper", {}), num_workers=self.transcribe_workers)
+            else:
+                # One PyTorch Whisper model can't be shared between threads
+                self.transcribe_workers = 1
+            print("Loading speech-to-text for transcription...")
+            self.stt = SpeechToText(config)
+        return self.stt
+
+    def transcribe(self, manifest, batch):
+        """Fill in transcripts for [(name, entry, int16 16 kHz audio)]"""
+        stt = self.load_stt()
+        with ThreadPoolExecutor(max_workers=self.transcribe_workers) as executor:
+            texts = list(executor.map(lambda item: stt.transcribe(item[2]), batch))
+        for (name, entry, _), text in zip(batch, texts):
+            entry["transcript"] = " ".join(text.split())
+            entry["transcript_source"] = "whisper"
+            manifest["transcripts"][entry["hash"]] = entry["transcript"]
+            manifest["files"][name] = entry
+        self.counts["transcribed"] += len(batch)
+        self.save_manifest(manifest)
+
+    def record(self, manifest, name, entry, sidecar, speech, pending):
+        if entry["status"] != "ok":
+            print(f"Skipping {name}: {entry['reason']}")
+            self.counts["invalid"] += 1
+            manifest["files"][name] = entry
+            return
+        self.counts["processed"] += 1
+        known = manifest["transcripts"].get(entry["hash"])
+        if sidecar is not None:
+            entry.update(transcript=sidecar, transcript_source="sidecar")
+        elif known is not None:
+            entry.update(transcript=known, transcript_source="whisper")
+        else:
+            pending.append((name, entry, speech))
+            return
+        manifest["files"][name] = entry
+
+    def write_metadata(self, manifest):
+        """LJSpeech-style metadata.txt: wav|transcript|speaker| per usable clip"""
+        lines = [
+            f"wavs/{entry['wav']}|{entry['transcript']}|{self.speaker}|"
+            for _, entry in sorted(manifest["files"].items())
+            if entry["status"] == "ok" and entry.get("transcript")
+        ]
+        path = os.path.join(self.output_dir, "metadata.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+        return len(lines)
+
+    def run(self):
+        start = time.monotonic()
+        manifest = self.load_manifest()
+        changed = self.scan(manifest)
+        pending = []  # clips waiting for a transcription batch
+        if changed:
+            print(f"{len(changed)} new or changed clips, {self.counts['unchanged']} unchanged")
+        window = self.workers * 4  # bounds decoded audio held in memory
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            in_flight = {}
+            tasks = iter(changed)
+            try:
+                while True:
+                    for name, path, sidecar in tasks:
+                        # The previous content's hash: if unchanged, its transcript is reused
+                        previous = (manifest["files"].get(name) or {}).get("hash")
+                        if previous not in manifest["transcripts"]:
+                            previous = None
+                        future = executor.submit(
+                            prepare_clip, path, self.output_dir, self.settings, sidecar is None, previous
+                        )
+                        in_flight[future] = (name, sidecar)
+                        if len(in_flight) >= window:
+                            break
+                    if not in_flight:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name, sidecar = in_flight.pop(future)
+                        entry, speech = future.result()
+                        self.record(manifest, name, entry, sidecar, speech, pending)
+                    if len(pending) >= self.transcribe_batch:
+                        self.transcribe(manifest, pending)
+                        pending = []
+                if pending:
+                    self.transcribe(manifest, pending)
+            finally:
+                self.save_manifest(manifest)
+
+        usable = self.write_metadata(manifest)
+        stats = dict(self.counts, usable=usable, seconds=round(time.monotonic() - start, 2))
+        print(f"Preprocessed dataset: {stats}")
+        return stats
+
+
+def preprocess_dataset(samples_dir, output_dir="tts_trainer/dataset", config_path="config/assistant_config.json",
+                       **kwargs):
+    """Run the pipeline with the assistant's speech-to-text settings"""
+    stt_config = {}
+    if os.path.exists(config_path):
+        with open(config_path, "r") as f:
+            stt_config = json.load(f).get("stt", {})
+    return DatasetPreprocessor(samples_dir, output_dir, stt_config=stt_config, **kwargs).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prepare voice samples for fine-tuning")
+    parser.add_argument("samples_dir", nargs="?", default="tts_trainer/voice_samples")
+    parser.add_argument("--output", default="tts_trainer/dataset")
+    parser.add_argument("--config", default="config/assistant_config.json", help="takes the stt section")
+    parser.add_argument("--workers", type=int, help="preprocessing processes (default: one per CPU)")
+    parser.add_argument("--sample-rate", type=int, default=DEFAULT_SETTINGS["sample_rate"])
+    parser.add_argument("--transcribe-batch", type=int, default=16)
+    parser.add_argument("--transcribe-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    preprocess_dataset(
+        args.samples_dir,
+        args.output,
+        config_path=args.config,
+        workers=args.workers,
+        settings={"sample_rate": args.sample_rate},
+        transcribe_batch=args.transcribe_batch,
+        transcribe_workers=args.transcribe_workers
+    )
@@ -1,48 +1,191 @@
 # voice cloning
 # clone voice from wav file
-# clones everytime you run the script
+# the speaker conditioning is computed once per reference file and cached on disk,
+# so later sentences and restarts skip straight to synthesis
+#
+# python -m tts_trainer.self_tts --reference tts_trainer/voice_samples/me.wav --text "Hello there"
 
+import argparse
+import hashlib
 import os
 import logging
-from TTS.api import TTS
-import sounddevice as sd
+import time
+
 import numpy as np
+import torch
+from TTS.api import TTS
+
+from src.audio_output import create_audio_output
+
+MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SpeakerConditioning:
+    """XTTS speaker conditioning (GPT latents + speaker embedding) per reference file.
+
+    Keyed by the reference audio's content hash, the model and the
+    conditioning settings, kept in memory and saved under directory, so
+    each voice is only analysed once even across restarts.
+    """
+
+    def __init__(self, model, model_name=MODEL_NAME, directory="tts_trainer/conditioning_cache"):
+        self.model = model
+        self.model_name = model_name
+        self.directory = directory
+        self.memory = {}
+        self.hashes = {}  # path -> (mtime, size, hash), so each sentence doesn't re-read the file
+        config = model.config
+        self.settings = {
+            "gpt_cond_len": config.gpt_cond_len,
+            "gpt_cond_chunk_len": config.gpt_cond_chunk_len,
+            "max_ref_length": config.max_ref_len,
+            "sound_norm_refs": config.sound_norm_refs,
+        }
+        os.makedirs(directory, exist_ok=True)
+
+    def hash_of(self, path):
+        stat = os.stat(path)
+        cached = self.hashes.get(path)
+        if cached is None or cached[:2] != (stat.st_mtime, stat.st_size):
+            cached = (stat.st_mtime, stat.st_size, file_hash(path))
+            self.hashes[path] = cached
+        return cached[2]
+
+    def key(self, reference_wavs):
+        parts = [self.model_name, repr(sorted(self.settings.items()))] + [self.hash_of(p) for p in reference_wavs]
+        raw = "\0".join(parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, reference_wav):
+        """(gpt_cond_latent, speaker_embedding) for a reference file (or list of files)"""
+        reference_wavs = [reference_wav] if isinstance(reference_wav, str) else list(reference_wav)
+        key = self.key(reference_wavs)
+        if key in self.memory:
+            return self.memory[key]
+
+        path = os.path.join(self.directory, key + ".pth")
+        device = next(self.model.parameters()).device
+        if os.path.exists(path):
+            saved = torch.load(path, map_location=device)
+            conditioning = (saved["gpt_cond_latent"], saved["speaker_embedding"])
+        else:
+            start = time.monotonic()
+            conditioning = self.model.get_conditioning_latents(audio_path=reference_wavs, **self.settings)
+            print(f"Computed speaker conditioning in {time.monotonic() - start:.1f}s")
+            # Written aside and renamed so a crash never leaves a truncated file behind
+            temp_path = path + ".tmp"
+            torch.save({"gpt_cond_latent": conditioning[0].cpu(), "speaker_embedding": conditioning[1].cpu()}, temp_path)
+            os.replace(temp_path, path)
+        self.memory[key] = conditioning
+        return conditioning
+
 
 class TextToSpeech:
-    def __init__(self):
+    def __init__(self, reference_wav="path/to/your_voice.wav", language="en", speed=1.8,
+                 stream_chunk_size=20, cache_dir="tts_trainer/conditioning_cache", output=None):
         # Suppress TTS initialization messages
         logging.getLogger('TTS').setLevel(logging.ERROR)
         os.environ['TTS_VERBOSE'] = '0'
-        
+
         print("Initializing TTS...")
         # You can choose from these models:
         # 1. "tts_models/en/jenny/jenny" - More natural female voice
         # 2. "tts_models/en/vctk/vits" - Multiple speaker voices
         # 3. "tts_models/multilingual/multi-dataset/xtts_v2" - More expressive, natural voice
-        self.tts = TTS(model_name="tts_models/multilingual/multi-dataset/xtts_v2")
+        # Only XTTS exposes its conditioning and streaming inference, which this class relies on
+        self.tts = TTS(model_name=MODEL_NAME)
+        self.model = self.tts.synthesizer.tts_model
+        self.sample_rate = self.tts.synthesizer.output_sample_rate
         # Reference voice file (WAV format recommended)
-        self.reference_wav = "path/to/your_voice.wav"
+        self.reference_wav = reference_wav
+        self.language = language
+        self.speed = speed
+        # GPT tokens per streamed chunk: smaller starts sooner, larger has fewer seams
+        self.stream_chunk_size = stream_chunk_size
+        self.conditioning = SpeakerConditioning(self.model, MODEL_NAME, cache_dir)
+        self.conditioning.get(self.reference_wav)
+
+        self.output = output or create_audio_output()
+        self.output.start()
         print("TTS ready!")
 
+    def synthesize(self, text):
+        """The whole sentence as normalized float32 audio"""
+        gpt_cond_latent, speaker_embedding = self.conditioning.get(self.reference_wav)
+        out = self.model.inference(
+            text,
+            self.language,
+            gpt_cond_latent,
+            speaker_embedding,
+            speed=self.speed,
+            enable_text_splitting=True
+        )
+        audio_data = np.array(out["wav"], dtype=np.float32)
+        peak = np.max(np.abs(audio_data)) if audio_data.size else 0.0
+        return audio_data / peak if peak > 0 else audio_data
+
+    def synthesize_stream(self, text):
+        """Yield float32 chunks as XTTS generates them (not normalized: the peak isn't known yet)"""
+        gpt_cond_latent, speaker_embedding = self.conditioning.get(self.reference_wav)
+        chunks = self.model.inference_stream(
+            text,
+            self.language,
+            gpt_cond_latent,
+            speaker_embedding,
+            stream_chunk_size=self.stream_chunk_size,
+            speed=self.speed,
+            enable_text_splitting=True
+        )
+        for chunk in chunks:
+            yield np.clip(chunk.cpu().numpy().astype(np.float32), -1.0, 1.0)
+
     def speak(self, text):
         try:
             print("Generating speech...")
-            # Clone voice on-the-fly
-            wav = self.tts.tts(
-                text=text,
-                speaker_wav=self.reference_wav,
-                language="en",
-                speed=1.8
-            )
-            
-            # Convert to float32 and normalize
-            audio_data = np.array(wav, dtype=np.float32)
-            audio_data = audio_data / np.max(np.abs(audio_data))
-            
-            # Play the audio
+            audio_data = self.synthesize(text)
             print("Playing audio...")
-            sd.play(audio_data, samplerate=22050)
-            sd.wait()
-            
+            self.output.play(audio_data, self.sample_rate)
+            self.output.drain()
         except Exception as e:
-            print(f"Error in TTS: {e}")
\ No newline at end of file
+            print(f"Error in TTS: {e}")
+
+    def speak_stream(self, text):
+        """Start playing as soon as the first chunk is ready"""
+        try:
+            start = time.monotonic()
+            for i, chunk in enumerate(self.synthesize_stream(text)):
+                if i == 0:
+                    print(f"First audio after {time.monotonic() - start:.2f}s")
+                self.output.play(chunk, self.sample_rate)
+            self.output.drain()
+        except Exception as e:
+            print(f"Error in streaming TTS: {e}")
+
+    def close(self):
+        self.output.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Speak with a voice cloned from a reference recording")
+    parser.add_argument("--reference", default="path/to/your_voice.wav", help="reference WAV of the voice")
+    parser.add_argument("--text", default="Hello! This is my cloned voice.")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--no-stream", action="store_true", help="synthesize the whole reply before playing")
+    args = parser.parse_args()
+
+    tts = TextToSpeech(reference_wav=args.reference, language=args.language)
+    try:
+        if args.no_stream:
+            tts.speak(args.text)
+        else:
+            tts.speak_stream(args.text)
+    finally:
+        tts.close()